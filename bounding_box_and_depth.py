@@ -3,13 +3,27 @@ import sys
 import numpy as np
 import cv2
 import pygame
-import torch
-from pygame.locals import QUIT, MOUSEBUTTONDOWN, MOUSEBUTTONUP, MOUSEWHEEL, MOUSEMOTION
-import glob
-# Removed unused import
-import json
+from pygame.locals import QUIT, MOUSEBUTTONDOWN, MOUSEBUTTONUP, MOUSEWHEEL, MOUSEMOTION, KEYDOWN, K_F3, K_F4, K_b
 from ui.button import Button
 from ui.slider import Slider
+from ui.render_cache import RenderCache
+from ui.fps_overlay import FpsOverlay
+from ui.redraw import RedrawScheduler
+from fusion.perception import (Perception, DEFAULT_WEIGHTS_DIR, OBJECT_CLASSES, PERSON_CLASS, colorize_depth,
+                               filter_detections, format_load_times)
+from fusion.fuse import fuse_detections
+from fusion.lidar_detector import detect_scene_objects
+from fusion.cache import ResultCache, DEFAULT_CACHE_DIR
+from fusion.worker import InferenceWorker
+from fusion.scene import scan_scene_files
+from fusion.pipeline import Prefetcher, load_scene_inputs
+from fusion.bev import build_scene_bev, bev_rgba
+from fusion.projection import NEAR_DISTANCE, CAUTION_DISTANCE
+from fusion.timing import span, tracer
+
+# Larger BEV overlays (extreme zoom) are skipped rather than scaled
+MAX_BEV_PIXELS = 4096
+TRACE_PATH = "./trace.json"
 
 class MapView:
     def __init__(self, x, y, width, height, parent):
@@ -25,6 +39,11 @@ class MapView:
         self.offset_adjust_x = 200  # Additional offset adjustment
         self.offset_adjust_y = 150  # Additional offset adjustment
         self.background = None
+        self.bev_grid = None
+        self.bev_image = None
+        self.bev_surface = None
+        self.show_bev = True
+        self.dirty = True
         self.load_background()
         
         # Create sliders for controlling the map view
@@ -53,10 +72,47 @@ class MapView:
         except pygame.error:
             self.background = pygame.Surface((self.width, self.height))
             self.background.fill((20, 20, 20))
-            font = pygame.font.SysFont('Arial', 16)
+            font = self.parent.render_cache.font('Arial', 16)
             text = font.render("Background image not found at ./images/scene.png", True, (200, 200, 200))
             self.background.blit(text, (10, self.height//2 - 8))
     
+    @property
+    def bounds(self):
+        return pygame.Rect(self.x, self.y, self.width, self.height)
+    
+    def set_bev(self, grid):
+        # The RGBA buffer backs the surface, so it is kept alongside it
+        self.bev_grid = grid
+        self.bev_surface = None
+        if grid is not None:
+            self.bev_image = bev_rgba(grid)
+            height, width = self.bev_image.shape[:2]
+            self.bev_surface = pygame.image.frombuffer(self.bev_image.data, (width, height), 'RGBA')
+        self.dirty = True
+    
+    def toggle_bev(self):
+        self.show_bev = not self.show_bev
+        self.dirty = True
+    
+    def draw_bev(self, surface):
+        # North-up grid stretched between the map positions of its corners
+        x_min, y_min, x_max, y_max = self.bev_grid.bounds
+        left, top = self.world_to_map((x_min, y_max))
+        right, bottom = self.world_to_map((x_max, y_min))
+        size = (right - left, bottom - top)
+        if not (0 < size[0] <= MAX_BEV_PIXELS and 0 < size[1] <= MAX_BEV_PIXELS):
+            return
+        scaled = self.parent.render_cache.scale(self.bev_surface, size)
+        outer_clip = surface.get_clip()
+        surface.set_clip(self.bounds.clip(outer_clip))
+        surface.blit(scaled, (left, top))
+        surface.set_clip(outer_clip)
+    
+    def world_to_map(self, location):
+        dot_x = int(self.x + self.offset_x + location[0] * self.scale_x) + self.offset_adjust_x
+        dot_y = int(self.y + self.offset_y - location[1] * self.scale_y * 1.5) + self.offset_adjust_y
+        return dot_x, dot_y
+    
     def update_sliders(self, mouse_pos, mouse_pressed):
         # Update sliders and return if any slider was changed
         changed = False
@@ -76,6 +132,13 @@ class MapView:
         if self.offset_y_slider.update(mouse_pos, mouse_pressed):
             self.offset_y = self.offset_y_slider.value
             changed = True
+        
+        # Markers move with the sliders, so any slider change repaints the whole map
+        sliders = (self.scale_x_slider, self.scale_y_slider, self.offset_x_slider, self.offset_y_slider)
+        if any(slider.dirty for slider in sliders):
+            self.dirty = True
+            for slider in sliders:
+                slider.dirty = False
             
         return changed
     
@@ -86,7 +149,7 @@ class MapView:
         pygame.draw.rect(surface, (100, 100, 100), map_rect, 1)
         
         # Draw map title
-        title_font = pygame.font.SysFont('Arial', 18, bold=True)
+        title_font = self.parent.render_cache.font('Arial', 18, bold=True)
         title_text = title_font.render("Scene Map View", True, (220, 220, 220))
         surface.blit(title_text, (self.x + 10, self.y + 5))
         
@@ -95,6 +158,10 @@ class MapView:
         bg_y = self.y + 30
         surface.blit(self.background, (bg_x, bg_y))
         
+        # LiDAR occupancy of both cars under the markers
+        if self.show_bev and self.bev_surface is not None:
+            self.draw_bev(surface)
+        
         # Draw car positions if scene data is available
         if self.parent.scene_data:
             car_colors = [(255, 0, 0), (0, 255, 0)]  # Red for Car A, Green for Car B
@@ -103,8 +170,7 @@ class MapView:
                 location_key = f"{car_id}_Location"
                 if location_key in self.parent.scene_data:
                     location = self.parent.scene_data[location_key]
-                    dot_x = int(self.x + self.offset_x + location[0] * self.scale_x) + self.offset_adjust_x
-                    dot_y = int(self.y + self.offset_y - location[1] * self.scale_y * 1.5) + self.offset_adjust_y
+                    dot_x, dot_y = self.world_to_map(location)
                     
                     car_color = car_colors[i]
                     
@@ -113,7 +179,7 @@ class MapView:
                     pygame.draw.circle(surface, (255, 255, 255), (dot_x, dot_y), 9, 1)
                     
                     # Draw label with background for better visibility
-                    font = pygame.font.SysFont('Arial', 14)
+                    font = self.parent.render_cache.font('Arial', 14)
                     label = f"{car_id} ({location[0]:.1f}, {location[1]:.1f})"
                     text = font.render(label, True, (240, 240, 240))
                     text_bg = pygame.Rect(dot_x + 10, dot_y - 10, text.get_width() + 6, text.get_height() + 4)
@@ -140,9 +206,20 @@ class MapView:
                         arrow_y2 = end_y - int(8 * np.sin(arrow_angle2))
                         pygame.draw.polygon(surface, car_color, [(end_x, end_y), (arrow_x1, arrow_y1), (arrow_x2, arrow_y2)])
             
+            # Draw fused detections: red/green when seen by one car, yellow when seen by both
+            fused = self.parent.fused_objects
+            if fused is not None:
+                for xy, name, seen_by in zip(fused['xy'], fused['object'], fused['seen_by']):
+                    if seen_by.all():
+                        color = (255, 220, 0)
+                    else:
+                        color = car_colors[int(np.argmax(seen_by))]
+                    radius = 5 if name == "Car" else 3
+                    pygame.draw.circle(surface, color, self.world_to_map(xy), radius)
+            
         
         # Draw data parameters
-        font = pygame.font.SysFont('Arial', 14)
+        font = self.parent.render_cache.font('Arial', 14)
         param_text = font.render(f"Position Controls:", True, (220, 220, 220))
         surface.blit(param_text, (self.x + 10, self.y + self.height - 140))
         
@@ -175,6 +252,7 @@ class MapView:
         self.scale_y_slider.value = self.scale_y
         self.offset_x_slider.value = self.offset_x
         self.offset_y_slider.value = self.offset_y
+        self.dirty = True
     
     def handle_drag(self, rel_x, rel_y):
         # Update offset values based on drag
@@ -184,6 +262,7 @@ class MapView:
         # Update slider values to match
         self.offset_x_slider.value = self.offset_x
         self.offset_y_slider.value = self.offset_y
+        self.dirty = True
 
 class SceneAnalyzer:
     def __init__(self):
@@ -192,9 +271,16 @@ class SceneAnalyzer:
         self.screen_height = 800
         self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
         pygame.display.set_caption("Multi-Vehicle Scene Analyzer")
-        self.font = pygame.font.SysFont('Arial', 16)
-        self.title_font = pygame.font.SysFont('Arial', 20, bold=True)
-        self.status_font = pygame.font.SysFont('Arial', 16)
+        # Fonts, text and scaled panel images are kept across frames
+        self.render_cache = RenderCache()
+        self.fps_overlay = FpsOverlay()
+        self.redraw = RedrawScheduler(self.screen)
+        self.overlay_changed = False
+        self.status_rect = pygame.Rect(10, self.screen_height - 30, self.screen_width - 20, 20)
+        self.scroll_rect = pygame.Rect(20, 50, 320, self.screen_height - 230)
+        self.font = self.render_cache.font('Arial', 16)
+        self.title_font = self.render_cache.font('Arial', 20, bold=True)
+        self.status_font = self.render_cache.font('Arial', 16)
         self.bg_color = (30, 30, 30)
         self.panel_color = (50, 50, 50)
         self.text_color = (220, 220, 220)
@@ -203,21 +289,32 @@ class SceneAnalyzer:
         self.current_scene = None
         self.scene_data = None
         
+        self.car_a_frame = None
         self.car_a_image = None
         self.car_a_detection = None
         self.car_a_depth = None
         self.car_a_depth_map = None
+        self.car_a_raw_detections = None
+        self.car_a_projection = None
         
+        self.car_b_frame = None
         self.car_b_image = None
         self.car_b_detection = None
         self.car_b_depth = None
         self.car_b_depth_map = None
+        self.car_b_raw_detections = None
+        self.car_b_projection = None
         
         self.detected_persons_a = []
         self.detected_persons_b = []
+        self.fused_objects = None
         self.confidence_threshold = 0.5
+        self.has_yolo = False
+        self.has_depth = False
         
         self.load_models()
+        self.worker = InferenceWorker()
+        self.prefetcher = Prefetcher(depth=1)
         self.scan_scene_files()
         self.setup_ui()
         self.running = True
@@ -229,29 +326,30 @@ class SceneAnalyzer:
         self.dragging_map = False
     
     def load_models(self):
-        try:
-            self.yolo_model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=True)
-            self.has_yolo = True
-        except Exception as e:
-            self.has_yolo = False
-            self.status_message = f"Failed to load YOLO: {e}"
-        
-        try:
-            self.depth_model = torch.hub.load("intel-isl/MiDaS", "MiDaS_small")
-            self.depth_model.to('cuda' if torch.cuda.is_available() else 'cpu')
-            self.depth_model.eval()
-            self.midas_transforms = torch.hub.load("intel-isl/MiDaS", "transforms")
-            self.transform = self.midas_transforms.small_transform
-            self.has_depth = True
-        except Exception as e:
-            self.has_depth = False
-            self.status_message = f"Failed to load depth model: {e}"
+        # Models load in the background while the window comes up; pinned
+        # weights in ./models are used when present
+        weights_dir = DEFAULT_WEIGHTS_DIR if os.path.isdir(DEFAULT_WEIGHTS_DIR) else None
+        self.perception = Perception(cache=ResultCache(DEFAULT_CACHE_DIR), weights_dir=weights_dir)
+        self.perception.start_loading()
+        self.models_ready = False
+    
+    def check_models_loaded(self):
+        if self.models_ready or not self.perception.is_loaded():
+            return
+        self.models_ready = True
+        self.has_yolo = self.perception.has_yolo
+        self.has_depth = self.perception.has_depth
+        # Load times are also recorded as "model.load" spans (F4 writes them out)
+        load_times = format_load_times(self.perception.load_times)
+        if self.perception.load_errors:
+            self.status_message = f"{self.perception.load_errors[-1]} ({load_times})"
+        else:
+            self.status_message = f"Models loaded ({load_times})"
     
     def scan_scene_files(self):
-        scene_path = "./data/input"
         self.scene_files = []
         try:
-            self.scene_files = glob.glob(os.path.join(scene_path, "scene_*.json"))
+            self.scene_files = scan_scene_files("./data/input")
             self.status_message = f"Found {len(self.scene_files)} scene files."
         except Exception as e:
             self.status_message = f"Error scanning scene files: {e}"
@@ -279,10 +377,15 @@ class SceneAnalyzer:
     def run(self):
         clock = pygame.time.Clock()
         while self.running:
+            # Sleeps on the event queue when idle; polls while models load or jobs run
+            busy = not self.models_ready or self.worker.has_work()
+            events = self.redraw.events(busy)
             mouse_pos = pygame.mouse.get_pos()
             mouse_pressed = pygame.mouse.get_pressed()
+            previous_status = self.status_message
             
-            for event in pygame.event.get():
+            for event in events:
+                self.redraw.handle_event(event)
                 if event.type == QUIT:
                     self.running = False
                 elif event.type == MOUSEBUTTONDOWN:
@@ -312,17 +415,48 @@ class SceneAnalyzer:
                     self.dragging_map = False
                 
                 elif event.type == MOUSEWHEEL:
-                    self.scroll_y = max(0, min(self.max_scroll, self.scroll_y - event.y * 20))
+                    scroll_y = max(0, min(self.max_scroll, self.scroll_y - event.y * 20))
+                    if scroll_y != self.scroll_y:
+                        self.scroll_y = scroll_y
+                        self.redraw.mark_dirty(self.scroll_rect)
                 
                 elif event.type == MOUSEMOTION and self.dragging_map:
                     self.map_view.handle_drag(event.rel[0], event.rel[1])
+                
+                elif event.type == KEYDOWN and event.key == K_F3:
+                    self.fps_overlay.toggle()
+                    self.redraw.mark_dirty(self.status_rect)
+                
+                elif event.type == KEYDOWN and event.key == K_b:
+                    self.map_view.toggle_bev()
+                
+                elif event.type == KEYDOWN and event.key == K_F4:
+                    # Chrome trace of the recent pipeline spans (chrome://tracing, Perfetto)
+                    tracer.export(TRACE_PATH)
+                    self.status_message = f"Trace of {len(tracer.spans)} spans written to {TRACE_PATH}"
             
             # Update confidence slider
             slider_changed = self.confidence_slider.update(mouse_pos, mouse_pressed)
-            if slider_changed and self.current_scene:
+            if slider_changed and self.current_scene and self.confidence_slider.value != self.confidence_threshold:
                 self.confidence_threshold = self.confidence_slider.value
-                if self.has_yolo:
-                    self.process_scene(self.current_scene, reprocess=True)
+                # A pending scene job picks up the new threshold when it completes
+                if self.has_yolo and not self.worker.is_busy("scene"):
+                    self.apply_confidence_threshold()
+            
+            # Pick up finished inference jobs and show progress of the running one.
+            # New results change the panels, the map and the scene data together.
+            self.check_models_loaded()
+            for job in self.worker.poll():
+                if job.key == "scene":
+                    self.apply_scene_result(job)
+                elif job.key == "threshold":
+                    self.apply_detection_result(job)
+                self.redraw.mark_all()
+            progress = self.worker.progress()
+            if progress:
+                self.status_message = progress
+            if self.status_message != previous_status:
+                self.redraw.mark_dirty(self.status_rect)
             
             # Update map view sliders
             self.map_view.update_sliders(mouse_pos, mouse_pressed)  # Removed unused variable 'map_sliders_changed'
@@ -332,14 +466,28 @@ class SceneAnalyzer:
             for button, _ in self.scene_buttons:
                 adjusted_button = button.rect.copy()
                 adjusted_button.y -= self.scroll_y
-                button.is_hovered = adjusted_button.collidepoint(mouse_pos)
+                is_hovered = bool(adjusted_button.collidepoint(mouse_pos))
+                if is_hovered != button.is_hovered:
+                    button.is_hovered = is_hovered
+                    self.redraw.mark_dirty(adjusted_button.clip(self.scroll_rect))
             
-            self.draw()
-            pygame.display.flip()
-            clock.tick(60)
+            self.redraw.collect((self.scene_list_button, self.confidence_slider, self.map_view))
+            if self.redraw.redraw(self.draw_frame):
+                if self.overlay_changed:
+                    self.redraw.mark_dirty(self.status_rect)
+                # Caps the repaint rate while dragging or hovering
+                clock.tick(60)
+        self.worker.shutdown()
+        self.prefetcher.shutdown()
         pygame.quit()
         sys.exit()
     
+    def draw_frame(self):
+        self.fps_overlay.begin_draw()
+        self.draw()
+        self.overlay_changed = self.fps_overlay.end_draw()
+        self.fps_overlay.draw(self.screen, self.status_font)
+    
     def draw(self):
         self.screen.fill(self.bg_color)
         
@@ -348,9 +496,10 @@ class SceneAnalyzer:
         pygame.draw.rect(self.screen, self.panel_color, left_panel)
         self.scene_list_button.draw(self.screen, self.font)
         
-        # Draw scrollable scene list
-        scroll_rect = pygame.Rect(20, 50, 320, self.screen_height - 230)
-        self.screen.set_clip(scroll_rect)
+        # Draw scrollable scene list, inside whatever area is being repainted
+        scroll_rect = self.scroll_rect
+        outer_clip = self.screen.get_clip()
+        self.screen.set_clip(scroll_rect.clip(outer_clip))
         for button, _ in self.scene_buttons:
             adjusted_button = button.rect.copy()
             adjusted_button.y -= self.scroll_y
@@ -360,7 +509,7 @@ class SceneAnalyzer:
                 text_surf = self.font.render(button.text, True, (255, 255, 255))
                 text_rect = text_surf.get_rect(center=adjusted_button.center)
                 self.screen.blit(text_surf, text_rect)
-        self.screen.set_clip(None)
+        self.screen.set_clip(outer_clip)
         
         # Draw scroll indicators if needed
         if self.max_scroll > 0:
@@ -470,7 +619,7 @@ class SceneAnalyzer:
             self.screen.blit(info_text_b, (car_b_yolo_panel.x + 10, car_b_yolo_panel.y + car_b_yolo_panel.height - 25))
         
         # Draw status bar
-        status_rect = pygame.Rect(10, self.screen_height - 30, self.screen_width - 20, 20)
+        status_rect = self.status_rect
         pygame.draw.rect(self.screen, (60, 60, 60), status_rect)
         status_text = self.status_font.render(self.status_message, True, self.text_color)
         self.screen.blit(status_text, (status_rect.x + 10, status_rect.y + 2))
@@ -480,211 +629,184 @@ class SceneAnalyzer:
         self.screen.blit(title_text, (panel.x + 10, panel.y + 5))
     
     def draw_image_in_panel(self, image, panel):
+        # Scaled once per (surface, panel size); later frames blit the cached copy
         content_rect = pygame.Rect(panel.x + 5, panel.y + 30, panel.width - 10, panel.height - 35)
-        img_w, img_h = image.get_size()
-        scale = min(content_rect.width / img_w, content_rect.height / img_h)
-        new_w, new_h = int(img_w * scale), int(img_h * scale)
-        scaled_img = pygame.transform.scale(image, (new_w, new_h))
-        img_x = content_rect.x + (content_rect.width - new_w) // 2
-        img_y = content_rect.y + (content_rect.height - new_h) // 2
-        self.screen.blit(scaled_img, (img_x, img_y))
-    
-    def process_scene(self, scene_path, reprocess=False):
-        try:
-            self.status_message = f"Processing scene {os.path.basename(scene_path)}..."
-            self.current_scene = scene_path
-            
-            if not reprocess:
-                with open(scene_path, 'r') as f:
-                    self.scene_data = json.load(f)
-                
-                base_data_dir = "./data"
-                car_a_camera_path = os.path.join(base_data_dir, self.scene_data.get("CarA_Camera", ""))
-                car_b_camera_path = os.path.join(base_data_dir, self.scene_data.get("CarB_Camera", ""))
-                
-                if os.path.exists(car_a_camera_path):
-                    img_a = cv2.imread(car_a_camera_path)
-                    img_a_rgb = cv2.cvtColor(img_a, cv2.COLOR_BGR2RGB)
-                    self.car_a_image = self.numpy_to_pygame(img_a_rgb)
-                    
-                    if self.has_depth:
-                        self.generate_depth_map_a(img_a_rgb.copy())
-                else:
-                    self.status_message = f"Error: Car A camera image not found at {car_a_camera_path}"
-                    return
-                
-                if os.path.exists(car_b_camera_path):
-                    img_b = cv2.imread(car_b_camera_path)
-                    img_b_rgb = cv2.cvtColor(img_b, cv2.COLOR_BGR2RGB)
-                    self.car_b_image = self.numpy_to_pygame(img_b_rgb)
-                    
-                    if self.has_depth:
-                        self.generate_depth_map_b(img_b_rgb.copy())
-                else:
-                    self.status_message = f"Error: Car B camera image not found at {car_b_camera_path}"
-                    return
-            
-            if self.has_yolo:
-                if self.car_a_image is not None and self.car_a_depth_map is not None:
-                    img_a = cv2.imread(os.path.join("./data", self.scene_data.get("CarA_Camera", "")))
-                    img_a_rgb = cv2.cvtColor(img_a, cv2.COLOR_BGR2RGB)
-                    self.run_yolo_detection_a(img_a_rgb.copy())
-                
-                if self.car_b_image is not None and self.car_b_depth_map is not None:
-                    img_b = cv2.imread(os.path.join("./data", self.scene_data.get("CarB_Camera", "")))
-                    img_b_rgb = cv2.cvtColor(img_b, cv2.COLOR_BGR2RGB)
-                    self.run_yolo_detection_b(img_b_rgb.copy())
-            
-            self.status_message = f"Processed scene {os.path.basename(scene_path)}"
-            
-        except Exception as e:
-            self.status_message = f"Error processing scene: {e}"
-    
-    def generate_depth_map_a(self, img):
-        input_batch = self.transform(img).to('cuda' if torch.cuda.is_available() else 'cpu')
-        with torch.no_grad():
-            prediction = self.depth_model(input_batch)
-            prediction = torch.nn.functional.interpolate(
-                prediction.unsqueeze(1),
-                size=img.shape[:2],
-                mode="bicubic",
-                align_corners=False,
-            ).squeeze()
-        
-        self.car_a_depth_map = prediction.cpu().numpy()
-        normalized_depth = (self.car_a_depth_map - self.car_a_depth_map.min()) / (self.car_a_depth_map.max() - self.car_a_depth_map.min())
-        depth_colored = cv2.applyColorMap((normalized_depth * 255).astype(np.uint8), cv2.COLORMAP_PLASMA)
-        self.car_a_depth = self.numpy_to_pygame(depth_colored)
-    
-    def generate_depth_map_b(self, img):
-        input_batch = self.transform(img).to('cuda' if torch.cuda.is_available() else 'cpu')
-        with torch.no_grad():
-            prediction = self.depth_model(input_batch)
-            prediction = torch.nn.functional.interpolate(
-                prediction.unsqueeze(1),
-                size=img.shape[:2],
-                mode="bicubic",
-                align_corners=False,
-            ).squeeze()
-        
-        self.car_b_depth_map = prediction.cpu().numpy()
-        normalized_depth = (self.car_b_depth_map - self.car_b_depth_map.min()) / (self.car_b_depth_map.max() - self.car_b_depth_map.min())
-        depth_colored = cv2.applyColorMap((normalized_depth * 255).astype(np.uint8), cv2.COLORMAP_PLASMA)
-        self.car_b_depth = self.numpy_to_pygame(depth_colored)
-    
-    def run_yolo_detection_a(self, img):
-        results = self.yolo_model(img)
-        persons = results.pandas().xyxy[0]
-        persons = persons[persons['class'] == 0]
-        
-        filtered_persons = persons[persons['confidence'] >= self.confidence_threshold]
-        self.detected_persons_a = []
-        
-        for idx, row in filtered_persons.iterrows():
-            x1, y1, x2, y2 = int(row['xmin']), int(row['ymin']), int(row['xmax']), int(row['ymax'])
-            conf = row['confidence']
-            
-            distance_str = "N/A"
-            distance_val = None
-            
-            if self.has_depth and self.car_a_depth_map is not None:
-                try:
-                    roi = self.car_a_depth_map[y1:y2, x1:x2]
-                    if roi.size > 0:
-                        avg_depth = np.mean(roi)
-                        depth_scale = 0.05
-                        distance_val = avg_depth * depth_scale
-                        distance_str = f"{distance_val:.2f}m"
-                except Exception:
-                    distance_str = "Error"
-            
-            self.detected_persons_a.append({
-                'id': idx,
-                'bbox': (x1, y1, x2, y2),
-                'conf': conf,
-                'distance': distance_str,
-                'distance_val': distance_val
-            })
-            
-            # Print bounding box info to console
-            print(f"Car A - Person {idx}: BBox=({x1}, {y1}, {x2}, {y2}), Confidence={conf:.2f}, Distance={distance_str}")
-            
-            box_color = (0, 255, 0)
-            if distance_val is not None:
-                if distance_val < 1.5:
-                    box_color = (0, 0, 255)
-                elif distance_val < 2.5:
-                    box_color = (0, 165, 255)
-                else:
-                    box_color = (0, 255, 0)
-            
-            cv2.rectangle(img, (x1, y1), (x2, y2), box_color, 2)
-            
-            label = f"{len(self.detected_persons_a)}"
-            cv2.putText(img, label, (x1+5, y1+20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, box_color, 2)
-        
-        self.car_a_detection = self.numpy_to_pygame(img)
-        num_persons = len(self.detected_persons_a)
-        self.status_message = f"Detected {num_persons} persons in Car A (threshold: {self.confidence_threshold:.2f})"
+        scaled_img, position = self.render_cache.fit(image, content_rect)
+        self.screen.blit(scaled_img, position)
     
-    def run_yolo_detection_b(self, img):
-        results = self.yolo_model(img)
-        persons = results.pandas().xyxy[0]
-        persons = persons[persons['class'] == 0]
-        
-        filtered_persons = persons[persons['confidence'] >= self.confidence_threshold]
-        self.detected_persons_b = []
-        
-        for idx, row in filtered_persons.iterrows():
-            x1, y1, x2, y2 = int(row['xmin']), int(row['ymin']), int(row['xmax']), int(row['ymax'])
-            conf = row['confidence']
-            
-            distance_str = "N/A"
-            distance_val = None
-            
-            if self.has_depth and self.car_b_depth_map is not None:
-                try:
-                    roi = self.car_b_depth_map[y1:y2, x1:x2]
-                    if roi.size > 0:
-                        avg_depth = np.mean(roi)
-                        depth_scale = 0.05
-                        distance_val = avg_depth * depth_scale
-                        distance_str = f"{distance_val:.2f}m"
-                except Exception:
-                    distance_str = "Error"
-            
-            self.detected_persons_b.append({
-                'id': idx,
-                'bbox': (x1, y1, x2, y2),
-                'conf': conf,
-                'distance': distance_str,
-                'distance_val': distance_val
-            })
-            
-            # Print bounding box info to console
-            print(f"Car B - Person {idx}: BBox=({x1}, {y1}, {x2}, {y2}), Confidence={conf:.2f}, Distance={distance_str}")
-            
-            box_color = (0, 255, 0)
-            if distance_val is not None:
-                if distance_val < 1.5:
-                    box_color = (0, 0, 255)
-                elif distance_val < 2.5:
-                    box_color = (0, 165, 255)
-                else:
-                    box_color = (0, 255, 0)
-            
-            cv2.rectangle(img, (x1, y1), (x2, y2), box_color, 2)
-            label = f"{len(self.detected_persons_b)}"
-            cv2.putText(img, label, (x1+5, y1+20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, box_color, 2)
-        
-        self.car_b_detection = self.numpy_to_pygame(img)
+    def process_scene(self, scene_path):
+        # Model work runs on the inference worker; a newer scene replaces queued work
+        self.status_message = f"Processing scene {os.path.basename(scene_path)}..."
+        self.worker.cancel("threshold")
+        self.worker.submit("scene", self.compute_scene, scene_path)
+    
+    def compute_scene(self, job, scene_path):
+        # Runs on the worker thread, so it must not touch pygame or viewer state
+        with span("viewer.compute_scene", scene=os.path.basename(scene_path)):
+            return self.compute_scene_stages(job, scene_path)
+    
+    def load_scene_inputs(self, scene_path):
+        # Same loading stages as the batch pipeline, plus the BEV raster. Each
+        # PNG is decoded once; depth, detection and display share the buffer.
+        inputs = load_scene_inputs(scene_path)
+        inputs['bev_grid'] = build_scene_bev(inputs['scene_data'])
+        return inputs
+    
+    def prefetch_next_scene(self, scene_path):
+        # The next scene in the list is loaded while this one is on screen
+        if scene_path in self.scene_files:
+            index = self.scene_files.index(scene_path)
+            if index + 1 < len(self.scene_files):
+                next_path = self.scene_files[index + 1]
+                self.prefetcher.submit(next_path, self.load_scene_inputs, next_path)
+    
+    def compute_scene_stages(self, job, scene_path):
+        job.report(f"Loading scene {os.path.basename(scene_path)}...")
+        inputs = self.prefetcher.get(scene_path, self.load_scene_inputs, scene_path)
+        self.prefetch_next_scene(scene_path)
+        scene_data = inputs['scene_data']
+        frame_a, frame_b = inputs['frames']
+        projections = inputs['projections']
+        bev_grid = inputs['bev_grid']
+        
+        if not self.perception.is_loaded():
+            job.report("Waiting for models to finish loading...")
+            self.perception.wait_for_models()
+        has_depth = self.perception.has_depth
+        has_yolo = self.perception.has_yolo
+        
+        depth_maps = [None, None]
+        if has_depth:
+            job.report("Estimating depth for both cameras...")
+            depth_maps = self.perception.estimate_depth_batch([frame_a, frame_b])
+        
+        raw_detections = [None, None]
+        lidar_objects = None
+        if has_yolo:
+            job.report("Detecting persons in both cameras...")
+            raw_detections = self.perception.detect_raw_batch([frame_a, frame_b])
+        else:
+            job.report("No camera detector; detecting objects in the LiDAR sweeps...")
+            lidar_objects = detect_scene_objects(scene_data)
+        
+        return {
+            'scene_path': scene_path,
+            'scene_data': scene_data,
+            'frames': (frame_a, frame_b),
+            'depth_maps': depth_maps,
+            'raw_detections': raw_detections,
+            'projections': projections,
+            'bev_grid': bev_grid,
+            'lidar_objects': lidar_objects,
+        }
+    
+    def apply_scene_result(self, job):
+        if job.error is not None:
+            if isinstance(job.error, FileNotFoundError):
+                self.status_message = f"Error: {job.error}"
+            else:
+                self.status_message = f"Error processing scene: {job.error}"
+            return
+        
+        result = job.result
+        self.current_scene = result['scene_path']
+        self.scene_data = result['scene_data']
+        self.car_a_frame, self.car_b_frame = result['frames']
+        self.car_a_depth_map, self.car_b_depth_map = result['depth_maps']
+        self.car_a_raw_detections, self.car_b_raw_detections = result['raw_detections']
+        self.car_a_projection, self.car_b_projection = result['projections']
+        self.map_view.set_bev(result['bev_grid'])
+        # Replaced by the fused camera detections once they are filtered
+        self.fused_objects = result['lidar_objects']
+        
+        self.car_a_image = self.numpy_to_pygame(self.car_a_frame.rgb)
+        self.car_b_image = self.numpy_to_pygame(self.car_b_frame.rgb)
+        self.car_a_depth = self.depth_surface(self.car_a_depth_map, self.car_a_projection)
+        self.car_b_depth = self.depth_surface(self.car_b_depth_map, self.car_b_projection)
+        
+        self.status_message = f"Processed scene {os.path.basename(self.current_scene)}"
+        self.apply_confidence_threshold()
+    
+    def depth_surface(self, depth_map, projection):
+        # MiDaS depth when available, otherwise the sparse LiDAR depth image
+        if depth_map is not None:
+            return self.numpy_to_pygame(colorize_depth(depth_map))
+        if projection is not None and len(projection) > 0:
+            sparse_depth = cv2.dilate(projection.sparse_depth_image(), np.ones((7, 7), np.uint8))
+            return self.numpy_to_pygame(colorize_depth(sparse_depth))
+        return None
+    
+    def apply_confidence_threshold(self):
+        # Re-filtering cached raw boxes is cheap, but drawing still runs off the UI thread
+        if self.car_a_raw_detections is None or self.car_b_raw_detections is None:
+            return
+        depth_map_a = self.car_a_depth_map if self.has_depth else None
+        depth_map_b = self.car_b_depth_map if self.has_depth else None
+        self.worker.submit("threshold", self.compute_detections, self.confidence_threshold, self.scene_data,
+                           (self.car_a_frame, self.car_a_raw_detections, depth_map_a, self.car_a_projection),
+                           (self.car_b_frame, self.car_b_raw_detections, depth_map_b, self.car_b_projection))
+    
+    def compute_detections(self, job, threshold, scene_data, car_a, car_b):
+        job.report(f"Filtering detections (threshold: {threshold:.2f})...")
+        outputs = []
+        detections_by_car = {}
+        for (frame, raw_detections, depth_map, projection), car_id, car_label in zip(
+                (car_a, car_b), ("CarA", "CarB"), ("Car A", "Car B")):
+            # One filtering pass per car: fusion takes every class, the view draws the persons
+            detections = filter_detections(raw_detections, depth_map, threshold, projection,
+                                           frame_size=frame.image_size)
+            persons = [d for d in detections if d['object'] == OBJECT_CLASSES[PERSON_CLASS]]
+            # Drawing is the only step that needs its own copy of the pixels
+            outputs.append((persons, self.draw_detections(frame.copy_for_drawing(), persons, car_label)))
+            detections_by_car[car_id] = detections
+        
+        job.report("Fusing detections from both cars...")
+        fused = fuse_detections(scene_data, detections_by_car)
+        return threshold, outputs, fused
+    
+    def apply_detection_result(self, job):
+        if job.error is not None:
+            self.status_message = f"Error filtering detections: {job.error}"
+            return
+        
+        threshold, ((persons_a, img_a), (persons_b, img_b)), self.fused_objects = job.result
+        self.detected_persons_a = persons_a
+        self.detected_persons_b = persons_b
+        self.car_a_detection = self.numpy_to_pygame(img_a)
+        self.car_b_detection = self.numpy_to_pygame(img_b)
         total_persons = len(self.detected_persons_a) + len(self.detected_persons_b)
-        self.status_message = f"Total: {total_persons} persons detected across both cameras (threshold: {self.confidence_threshold:.2f})"
+        self.status_message = f"Total: {total_persons} persons detected across both cameras (threshold: {threshold:.2f})"
+    
+    def draw_detections(self, img, persons, car_label):
+        # The boxes behind the drawn numbers go into the span instead of the console
+        boxes = [{'number': number, 'id': person['id'], 'bbox': person['bbox'], 'conf': round(person['conf'], 2),
+                  'distance': person['distance']} for number, person in enumerate(persons, start=1)]
+        with span("viewer.draw_detections", car=car_label, persons=boxes):
+            for number, person in enumerate(persons, start=1):
+                self.draw_person_box(img, person, number)
+        return img
+    
+    def draw_person_box(self, img, person, number):
+        x1, y1, x2, y2 = person['bbox']
+        distance_val = person['distance_val']
+        box_color = (0, 255, 0)
+        if distance_val is not None:
+            if distance_val < NEAR_DISTANCE:
+                box_color = (255, 0, 0)
+            elif distance_val < CAUTION_DISTANCE:
+                box_color = (255, 165, 0)
+            else:
+                box_color = (0, 255, 0)
+        
+        cv2.rectangle(img, (x1, y1), (x2, y2), box_color, 2)
+        cv2.putText(img, f"{number}", (x1+5, y1+20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, box_color, 2)
     
     def numpy_to_pygame(self, img_array):
-        img_array = np.flip(img_array, axis=2)
-        img_surface = pygame.surfarray.make_surface(np.transpose(img_array, (1, 0, 2)))
-        return img_surface
+        # Wraps a contiguous RGB array without copying; the surface keeps the buffer alive
+        with span("viewer.surface"):
+            img_array = np.ascontiguousarray(img_array)
+            height, width = img_array.shape[:2]
+            return pygame.image.frombuffer(img_array.data, (width, height), 'RGB')
 
 if __name__ == "__main__":
     app = SceneAnalyzer()
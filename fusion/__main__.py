@@ -0,0 +1,182 @@
+import sys
+import argparse
+from fusion.batch import run_batch
+from fusion.bench import run_bench
+from fusion.backends import BACKENDS
+from fusion.export import run_export
+from fusion.perception import DEFAULT_BATCH_SIZE, DEFAULT_MAX_BATCH_MB, DEFAULT_DEPTH_SIZE, DEFAULT_DETECTION_SIZE
+from fusion.tracking import DEFAULT_KEYFRAME_INTERVAL, DEFAULT_MAX_COAST
+from fusion.pipeline import DEFAULT_PREFETCH_DEPTH
+from fusion.registration import ICP_METHODS
+from fusion.profiling import PROFILE_MODES, profile_session
+from fusion.timing import tracer
+from fusion.store import CAR_NAMES, ResultStore, run_query
+
+
+def add_pipeline_arguments(parser):
+    parser.add_argument("input_dir", nargs="?", default="./data/input",
+                        help="Folder containing scene_*.json files")
+    parser.add_argument("--data-dir", default=None,
+                        help="Base folder for camera/lidar paths (default: parent of input_dir)")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Detection confidence threshold")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Camera frames per model forward pass")
+    parser.add_argument("--max-batch-mb", type=int, default=DEFAULT_MAX_BATCH_MB,
+                        help="Approximate memory cap per forward pass in MB")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Reuse raw model outputs stored in this folder (e.g. ./data/cache/inference)")
+    parser.add_argument("--weights-dir", default=None,
+                        help="Pinned torch.hub checkouts and weights (populated on the first online run)")
+    parser.add_argument("--offline", action="store_true",
+                        help="Fail instead of downloading when --weights-dir is incomplete")
+    parser.add_argument("--no-depth-model", dest="use_depth_model", action="store_false",
+                        help="Skip MiDaS; person distances come from the LiDAR sweeps only")
+    parser.add_argument("--depth-size", type=int, default=DEFAULT_DEPTH_SIZE,
+                        help="Long side of the MiDaS input in pixels")
+    parser.add_argument("--full-res-depth", action="store_true",
+                        help="Upsample depth maps to the camera resolution instead of keeping model resolution")
+    parser.add_argument("--detection-size", type=int, default=DEFAULT_DETECTION_SIZE,
+                        help="Long side of the YOLO input in pixels")
+    parser.add_argument("--tiles", type=int, default=1,
+                        help="Also run YOLO on an N x N grid of overlapping crops (small, distant objects)")
+    parser.add_argument("--backend", choices=BACKENDS, default="eager",
+                        help="Inference backend; exported backends run on CPU (see the export command)")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH_DEPTH,
+                        help="Scenes each loading stage (decode, LiDAR) runs ahead of inference; 0 loads inline")
+    parser.add_argument("--track", action="store_true",
+                        help="Track objects across the scenes in order and add a track_id to each object")
+    parser.add_argument("--coast", type=int, default=DEFAULT_MAX_COAST,
+                        help="With --track, keep reporting a confirmed track for up to N scenes without a detection")
+    parser.add_argument("--keyframe", type=int, default=DEFAULT_KEYFRAME_INTERVAL,
+                        help="With --track and --lidar-only, search every Nth scene in full and only around the "
+                             "predicted tracks in between, skipping stable ones")
+    parser.add_argument("--refine-poses", action="store_true",
+                        help="Correct CarB's pose by registering its LiDAR sweep onto CarA's before fusion")
+    parser.add_argument("--icp", choices=ICP_METHODS, default="point_to_plane", help="ICP variant for --refine-poses")
+    parser.add_argument("--lidar-only", action="store_true",
+                        help="Skip the camera models and detect objects from the LiDAR sweeps")
+    parser.add_argument("--trace", default=None,
+                        help="Write per-stage spans here: .jsonl for JSON lines, otherwise Chrome trace JSON")
+    parser.add_argument("--profile", choices=PROFILE_MODES, default=None,
+                        help="Profile the whole run with cProfile or torch.profiler")
+    parser.add_argument("--profile-out", default=None,
+                        help="Profiler output path (default: profile.prof / torch_trace.json)")
+
+
+def pipeline_options(args):
+    return {
+        'base_data_dir': args.data_dir,
+        'confidence_threshold': args.threshold,
+        'batch_size': args.batch_size,
+        'max_batch_mb': args.max_batch_mb,
+        'cache_dir': args.cache_dir,
+        'weights_dir': args.weights_dir,
+        'offline': args.offline,
+        'use_depth_model': args.use_depth_model,
+        'lidar_only': args.lidar_only,
+        'depth_size': args.depth_size,
+        'detection_size': args.detection_size,
+        'detection_tiles': args.tiles,
+        'full_res_depth': args.full_res_depth,
+        'backend': args.backend,
+        'track': args.track,
+        'coast': args.coast,
+        'keyframe_interval': args.keyframe,
+        'prefetch_depth': args.prefetch,
+        'refine_poses': args.refine_poses,
+        'icp_method': args.icp,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m fusion",
+                                     description="Headless multi-vehicle scene processing")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = subparsers.add_parser("batch", help="Run detection and depth on every scene_*.json")
+    add_pipeline_arguments(batch_parser)
+    batch_parser.add_argument("--out", default="./results", help="Output folder for per-scene JSON")
+    batch_parser.add_argument("--workers", type=int, default=1,
+                              help="Worker processes, each with its own copy of the models")
+    batch_parser.add_argument("--threads-per-worker", type=int, default=None,
+                              help="Torch threads per worker (default: cores / workers)")
+    batch_parser.add_argument("--resume", action="store_true",
+                              help="Skip scenes that already have a result in --out")
+    batch_parser.add_argument("--store", default=None,
+                              help="Also append every detection and fused object to this columnar store folder")
+
+    bench_parser = subparsers.add_parser("bench", help="Score the pipeline against ground truth and time each stage")
+    add_pipeline_arguments(bench_parser)
+    bench_parser.add_argument("--gt", default=None,
+                              help="Ground truth folder (default: output/ next to the input folder)")
+    bench_parser.add_argument("--report", default="./bench_report.json", help="Path of the JSON report")
+    bench_parser.add_argument("--out", default=None, help="Also write per-scene results to this folder")
+
+    export_parser = subparsers.add_parser("export", help="Export the models for a CPU backend and check parity")
+    export_parser.add_argument("input_dir", nargs="?", default="./data/input",
+                               help="Folder containing scene_*.json files used for the parity check")
+    export_parser.add_argument("--backend", choices=BACKENDS[1:], required=True)
+    export_parser.add_argument("--data-dir", default=None,
+                               help="Base folder for camera/lidar paths (default: parent of input_dir)")
+    export_parser.add_argument("--weights-dir", default=None,
+                               help="Pinned torch.hub checkouts and weights; artifacts go to its exports/ folder")
+    export_parser.add_argument("--offline", action="store_true",
+                               help="Fail instead of downloading when --weights-dir is incomplete")
+    export_parser.add_argument("--export-dir", default=None, help="Artifact folder (default: <weights-dir>/exports)")
+    export_parser.add_argument("--depth-size", type=int, default=DEFAULT_DEPTH_SIZE)
+    export_parser.add_argument("--detection-size", type=int, default=DEFAULT_DETECTION_SIZE)
+    export_parser.add_argument("--scenes", type=int, default=None, help="Only check the first N scenes")
+    export_parser.add_argument("--report", default=None, help="Write the parity report to this JSON file")
+
+    query_parser = subparsers.add_parser("query", help="Count rows of a columnar result store matching filters")
+    query_parser.add_argument("store", help="Store folder written by batch --store")
+    query_parser.add_argument("--run", action="append", default=None, help="Only this run (repeatable)")
+    query_parser.add_argument("--scene", action="append", default=None, help="Only this scene (repeatable)")
+    query_parser.add_argument("--car", action="append", choices=CAR_NAMES, default=None,
+                              help="Only this car's detections, or the fused objects (repeatable)")
+    query_parser.add_argument("--object", action="append", default=None, help="Only this class (repeatable)")
+    query_parser.add_argument("--min-confidence", type=float, default=None)
+    query_parser.add_argument("--max-distance", type=float, default=None)
+    query_parser.add_argument("--csv", default=None, help="Write the matching rows to this CSV file")
+    return parser
+
+
+def check_pipeline_arguments(parser, args):
+    # Combinations the pipeline cannot honour are rejected rather than ignored
+    if args.keyframe > 1 and not (args.track and args.lidar_only):
+        parser.error("--keyframe needs --track and --lidar-only")
+    if getattr(args, 'workers', 1) > 1:
+        if args.keyframe > 1:
+            parser.error("--keyframe needs scenes in order and cannot be combined with --workers")
+        if args.refine_poses:
+            parser.error("--refine-poses needs scenes in order and cannot be combined with --workers")
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command in ("batch", "bench"):
+        check_pipeline_arguments(parser, args)
+    # export and query take no profiling or tracing options
+    with profile_session(getattr(args, 'profile', None), getattr(args, 'profile_out', None)):
+        if args.command == "batch":
+            run_batch(args.input_dir, args.out, workers=args.workers, threads_per_worker=args.threads_per_worker,
+                      resume=args.resume, store_dir=args.store, **pipeline_options(args))
+        elif args.command == "bench":
+            run_bench(args.input_dir, gt_dir=args.gt, report_path=args.report, out_dir=args.out,
+                      **pipeline_options(args))
+        elif args.command == "export":
+            report = run_export(args.input_dir, args.backend, args.data_dir, args.weights_dir, args.offline,
+                                args.export_dir, args.depth_size, args.detection_size, args.scenes, args.report)
+            if report is None or not report['passed']:
+                return 1
+        elif args.command == "query":
+            run_query(ResultStore(args.store), args.run, args.scene, args.car, args.object, args.min_confidence,
+                      args.max_distance, args.csv)
+    if getattr(args, 'trace', None):
+        print(f"Trace of {len(tracer.spans)} spans written to {tracer.export(args.trace)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import os
+import threading
+import importlib.util
+import numpy as np
+import torch
+from fusion.yolo import box_iou, letterbox, letterbox_shape, unletterbox, yolo_nms
+
+BACKENDS = ("eager", "torchscript", "int8", "onnx")
+EXPORT_SUFFIXES = {"torchscript": ".torchscript.pt", "int8": ".int8.onnx", "onnx": ".onnx"}
+
+
+def backend_available(backend):
+    # onnx and int8 run on ONNX Runtime, which is an optional dependency
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    if backend in ("onnx", "int8"):
+        return importlib.util.find_spec("onnxruntime") is not None
+    return True
+
+
+class RawYoloOutput(torch.nn.Module):
+    # YOLOv5 network without AutoShape: (B, 3, H, W) in [0, 1] to (B, N, 5 + classes) before NMS
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        for module in model.modules():
+            if type(module).__name__ == "Detect":
+                # In-place anchor decoding does not export to ONNX cleanly
+                module.inplace = False
+
+    def forward(self, x):
+        return self.model(x)[0]
+
+
+def export_module(module, example, path, backend):
+    # One-time export of an eval-mode module for one input shape. Written to a
+    # temporary file first so a crashed export never leaves a truncated artifact.
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with torch.no_grad():
+            if backend == "torchscript":
+                torch.jit.trace(module, example).save(tmp_path)
+            else:
+                torch.onnx.export(module, example, tmp_path, input_names=["input"], output_names=["output"],
+                                  dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+                                  opset_version=17)
+                if backend == "int8":
+                    # Dynamic quantization in torch only covers Linear/LSTM layers, which
+                    # neither model has; ONNX Runtime quantizes the convolutions too
+                    from onnxruntime.quantization import QuantType, quantize_dynamic
+                    float_path = f"{tmp_path}.float"
+                    os.replace(tmp_path, float_path)
+                    try:
+                        quantize_dynamic(float_path, tmp_path, weight_type=QuantType.QUInt8)
+                    finally:
+                        os.remove(float_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+class ExportedModel:
+    # Runs an exported copy of a torch module, exporting it on first use for
+    # each input shape and reusing the artifact in export_dir afterwards
+    def __init__(self, module, name, backend, export_dir):
+        self.module = module
+        self.name = name
+        self.backend = backend
+        self.export_dir = export_dir
+        self.runners = {}
+        self.lock = threading.Lock()
+
+    def artifact_path(self, shape):
+        # ONNX graphs take any batch size; traced TorchScript is kept per batch size
+        dims = shape[1:] if self.backend != "torchscript" else shape
+        return os.path.join(self.export_dir, f"{self.name}-{'x'.join(map(str, dims))}{EXPORT_SUFFIXES[self.backend]}")
+
+    def runner(self, example):
+        path = self.artifact_path(tuple(example.shape))
+        with self.lock:
+            if path not in self.runners:
+                if not os.path.exists(path):
+                    export_module(self.module, example, path, self.backend)
+                self.runners[path] = self.load(path)
+            return self.runners[path]
+
+    def load(self, path):
+        if self.backend == "torchscript":
+            return torch.jit.load(path, map_location="cpu")
+        import onnxruntime
+        session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        return lambda x: torch.from_numpy(session.run(None, {"input": x.cpu().numpy()})[0])
+
+    def __call__(self, x):
+        with torch.no_grad():
+            return self.runner(x)(x)
+
+
+class EagerDetector:
+    # torch.hub AutoShape model: letterboxing, NMS and box rescaling built in
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, images, size):
+        results = self.model(images, size=size)
+        return [boxes.cpu().numpy().astype(np.float32) for boxes in results.xyxy]
+
+
+class ExportedDetector:
+    # Exported YOLOv5 network with AutoShape's pre- and post-processing done here
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, images, size):
+        shape = letterbox_shape(images, size)
+        padded, gains, pads = zip(*(letterbox(img, shape) for img in images))
+        batch = np.stack(padded).transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+        prediction = self.model(torch.from_numpy(batch))
+        detections = []
+        for rows, img, gain, pad in zip(prediction, images, gains, pads):
+            boxes = yolo_nms(rows.float().numpy())
+            detections.append(np.column_stack([unletterbox(boxes[:, :4], gain, pad, img.shape), boxes[:, 4:]]))
+        return detections
+
+
+def depth_backend(model, backend, export_dir, name="midas_small"):
+    # Callable from a (B, 3, H, W) MiDaS input to a (B, H, W) tensor
+    if backend == "eager":
+        return model
+    return ExportedModel(model, name, backend, export_dir)
+
+
+def detector_backend(model, backend, export_dir, name="yolov5s"):
+    # Callable from a list of RGB frames and a letterbox size to raw (N, 6) boxes per frame
+    if backend == "eager":
+        return EagerDetector(model)
+    return ExportedDetector(ExportedModel(RawYoloOutput(model.model).eval(), name, backend, export_dir))
+
+
+def depth_parity(reference, candidate):
+    # Mean absolute difference relative to the reference depth range
+    reference, candidate = np.asarray(reference, np.float32), np.asarray(candidate, np.float32)
+    depth_range = max(float(reference.max() - reference.min()), 1e-6)
+    return float(np.mean(np.abs(reference - candidate))) / depth_range
+
+
+def detection_parity(reference, candidate, confidence_threshold=0.5, iou_threshold=0.5):
+    # Fraction of reference boxes above the threshold matched by a candidate box
+    # of the same class, their mean IoU and the largest confidence difference
+    reference = reference[reference[:, 4] >= confidence_threshold]
+    if len(reference) == 0:
+        return {'boxes': 0, 'matched': 1.0, 'mean_iou': None, 'max_conf_diff': 0.0}
+    if len(candidate) == 0:
+        return {'boxes': len(reference), 'matched': 0.0, 'mean_iou': None, 'max_conf_diff': None}
+    iou = box_iou(reference, candidate)
+    iou[reference[:, 5, None] != candidate[None, :, 5]] = 0.0
+    best = iou.argmax(axis=1)
+    best_iou = iou[np.arange(len(reference)), best]
+    matched = best_iou >= iou_threshold
+    conf_diff = np.abs(reference[matched, 4] - candidate[best[matched], 4])
+    return {
+        'boxes': int(len(reference)),
+        'matched': float(matched.mean()),
+        'mean_iou': float(best_iou[matched].mean()) if matched.any() else None,
+        'max_conf_diff': float(conf_diff.max()) if matched.any() else None,
+    }
@@ -0,0 +1,331 @@
+import os
+import json
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import torch
+from fusion.perception import (Perception, DEFAULT_BATCH_SIZE, DEFAULT_MAX_BATCH_MB, DEFAULT_DEPTH_SIZE,
+                               DEFAULT_DETECTION_SIZE, depth_statistics,
+                               filter_detections, format_load_times)
+from fusion.fuse import fuse_scene, to_output_schema
+from fusion.lidar_detector import detect_scene_objects
+from fusion.timing import StageTimer, null_stage, tracer
+from fusion.cache import ResultCache
+from fusion.pipeline import DEFAULT_PREFETCH_DEPTH, scene_input_stream
+from fusion.registration import PoseRefiner, corrected_scene
+from fusion.tracking import Tracker, DEFAULT_KEYFRAME_INTERVAL, DEFAULT_MAX_COAST
+from fusion.scene import CAR_IDS, load_scene, scan_scene_files, scene_name
+from fusion.store import ResultStore
+
+
+def infer_scene_group(perception, scene_inputs, base_data_dir="./data", confidence_threshold=0.5, timer=None,
+                      search_plan=None):
+    # Same YOLO + MiDaS path as SceneAnalyzer.process_scene, without a display.
+    # Camera frames of every car in every scene of the group are batched together;
+    # scene_inputs come from the pipeline's loading stages. search_plan returns
+    # the tracker's plan for the next scene; the LiDAR detector only searches
+    # where it says and keeps it in the result's "search".
+    stage = timer.stage if timer is not None else null_stage
+    images = [frame for inputs in scene_inputs for frame in inputs['frames']]
+    projections = [projection for inputs in scene_inputs for projection in inputs['projections']]
+
+    num_frames = len(scene_inputs) * len(CAR_IDS)
+    depth_maps = [None] * num_frames
+    if perception.has_depth:
+        with stage("depth"):
+            depth_maps = perception.estimate_depth_batch(images)
+    detections = [[] for _ in range(num_frames)]
+    if perception.has_yolo:
+        with stage("detection"):
+            raw_detections = perception.detect_raw_batch(images)
+            detections = [filter_detections(raw, depth_map, confidence_threshold, projection,
+                                            frame_size=frame.image_size)
+                          for raw, depth_map, projection, frame in zip(raw_detections, depth_maps, projections,
+                                                                       images)]
+
+    results = []
+    frames = iter(zip(depth_maps, detections))
+    for inputs in scene_inputs:
+        scene_data = inputs['scene_data']
+        result = {'scene': scene_name(inputs['path'])}
+        if 'registration' in inputs:
+            result['registration'] = inputs['registration']
+        detections_by_car = {}
+        for car_id in CAR_IDS:
+            depth_map, car_detections = next(frames)
+            detections_by_car[car_id] = car_detections
+            result[car_id] = {
+                'detections': car_detections,
+                'depth': depth_statistics(depth_map),
+            }
+        # Both cars' detections merged in world coordinates, in the data/output schema.
+        # Without a camera detector the objects come from the LiDAR sweeps alone.
+        if perception.has_yolo:
+            with stage("fusion"):
+                result['objects'] = fuse_scene(scene_data, detections_by_car)
+        else:
+            plan = None
+            if search_plan is not None:
+                plan = result['search'] = search_plan()
+            with stage("lidar_detection"):
+                objects = detect_scene_objects(scene_data, base_data_dir, sweeps=inputs['sweeps'], plan=plan)
+                result['objects'] = to_output_schema(objects, scene_data)
+        results.append(result)
+    return results
+
+
+def create_perception(batch_size=DEFAULT_BATCH_SIZE, max_batch_mb=DEFAULT_MAX_BATCH_MB, cache_dir=None,
+                      weights_dir=None, offline=False, use_depth_model=True, lidar_only=False,
+                      depth_size=DEFAULT_DEPTH_SIZE, detection_size=DEFAULT_DETECTION_SIZE, detection_tiles=1,
+                      full_res_depth=False, backend="eager"):
+    cache = ResultCache(cache_dir) if cache_dir else None
+    perception = Perception(batch_size=batch_size, max_batch_mb=max_batch_mb, cache=cache,
+                            weights_dir=weights_dir, offline=offline, use_depth_model=use_depth_model,
+                            depth_size=depth_size, detection_size=detection_size,
+                            detection_tiles=detection_tiles, full_res_depth=full_res_depth, backend=backend)
+    if lidar_only:
+        print("Camera models skipped; objects come from the LiDAR detector")
+        return perception
+    for error in perception.load_models():
+        print(error)
+    print(f"Model load times: {format_load_times(perception.load_times)}")
+    if not perception.has_yolo:
+        print("No camera detector available; falling back to the LiDAR detector")
+    return perception
+
+
+def split_scene_groups(scene_files, batch_size=DEFAULT_BATCH_SIZE):
+    # Consecutive scenes whose camera frames fill one forward pass
+    scenes_per_group = max(1, batch_size // len(CAR_IDS))
+    return [scene_files[i:i + scenes_per_group] for i in range(0, len(scene_files), scenes_per_group)]
+
+
+def iter_scene_groups(perception, scene_files, base_data_dir, confidence_threshold=0.5,
+                      batch_size=DEFAULT_BATCH_SIZE, timer=None, prefetch_depth=DEFAULT_PREFETCH_DEPTH,
+                      refiner=None, search_plan=None):
+    # Yields (scene paths, results, error) per group of scenes sharing forward
+    # passes, in order. Later scenes are read, decoded and their LiDAR loaded
+    # on prefetch threads while the models work on the current group.
+    use_camera = perception.has_yolo or perception.has_depth
+    scenes_per_group = max(1, batch_size // len(CAR_IDS))
+    if search_plan is not None:
+        # Each scene's plan needs the tracks updated with the scene before it,
+        # which happens after its group is yielded
+        scenes_per_group = 1
+    stream = scene_input_stream(scene_files, base_data_dir, use_camera, timer, prefetch_depth, refiner)
+
+    def infer(group):
+        paths = [inputs['path'] for inputs in group]
+        try:
+            return paths, infer_scene_group(perception, group, base_data_dir, confidence_threshold, timer,
+                                            search_plan), None
+        except Exception as e:
+            return paths, [], e
+
+    group = []
+    for scene_path, inputs, error in stream:
+        if error is not None:
+            # A scene that failed to load fails alone; the group so far still runs
+            if group:
+                yield infer(group)
+                group = []
+            yield [scene_path], [], error
+            continue
+        group.append(inputs)
+        if len(group) == scenes_per_group:
+            yield infer(group)
+            group = []
+    if group:
+        yield infer(group)
+
+
+# Per-process perception of a pool worker, loaded once by init_worker
+worker_perception = None
+# Shards of consecutive scene groups queued per worker process
+SHARDS_PER_WORKER = 4
+
+
+def worker_threads(workers, threads_per_worker=None):
+    # Splits the cores between workers so torch/OpenCV pools do not oversubscribe
+    if threads_per_worker:
+        return threads_per_worker
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def init_worker(perception_options, threads):
+    global worker_perception
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    cv2.setNumThreads(1)
+    worker_perception = create_perception(**perception_options)
+
+
+def split_worker_shards(groups, workers, shards_per_worker=SHARDS_PER_WORKER):
+    # Contiguous runs of scene groups, a few per worker so that one slow run
+    # does not hold up the others
+    size = max(1, -(-len(groups) // (workers * shards_per_worker)))
+    return [groups[i:i + size] for i in range(0, len(groups), size)]
+
+
+def process_shard_in_worker(groups, base_data_dir, confidence_threshold, batch_size, prefetch_depth):
+    # The same prefetching group loop as a single process, over one shard
+    timer = StageTimer()
+    scene_files = [scene_path for group in groups for scene_path in group]
+    outputs = list(iter_scene_groups(worker_perception, scene_files, base_data_dir, confidence_threshold,
+                                     batch_size, timer, prefetch_depth))
+    # Spans go back to the parent with the results so --trace covers all workers
+    spans = tracer.snapshot()
+    tracer.clear()
+    return outputs, timer, spans
+
+
+def iter_scene_groups_parallel(scene_files, base_data_dir, perception_options, workers,
+                               confidence_threshold=0.5, threads_per_worker=None, timer=None,
+                               prefetch_depth=DEFAULT_PREFETCH_DEPTH):
+    # Same contract as iter_scene_groups, with runs of scene groups sharded
+    # over worker processes that each load the models once and prefetch within
+    # their shard. Groups are yielded in input order whatever order the
+    # workers finish in.
+    batch_size = perception_options.get('batch_size', DEFAULT_BATCH_SIZE)
+    shards = split_worker_shards(split_scene_groups(scene_files, batch_size), workers)
+    threads = worker_threads(workers, threads_per_worker)
+    print(f"Processing {len(shards)} shards of scene groups on {workers} workers x {threads} threads")
+    # spawn: forked copies of an initialized torch/OpenMP runtime can deadlock
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(perception_options, threads)) as pool:
+        futures = [pool.submit(process_shard_in_worker, shard, base_data_dir, confidence_threshold, batch_size,
+                               prefetch_depth)
+                   for shard in shards]
+        for shard, future in zip(shards, futures):
+            try:
+                outputs, shard_timer, spans = future.result()
+            except Exception as e:
+                # The worker itself failed, e.g. loading the models
+                yield [scene_path for group in shard for scene_path in group], [], e
+                continue
+            if timer is not None:
+                timer.merge(shard_timer)
+            tracer.extend(spans)
+            yield from outputs
+
+
+def default_data_dir(input_dir):
+    # Scene JSONs reference camera/lidar paths relative to the parent of the input folder
+    return os.path.dirname(os.path.abspath(input_dir))
+
+
+def result_path(out_dir, scene):
+    return os.path.join(out_dir, f"{scene}.json")
+
+
+def write_result(result, out_dir):
+    # Written to a temporary file first, so an interrupted run never leaves a
+    # truncated result that --resume would take as done
+    out_path = result_path(out_dir, result['scene'])
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f, indent=2)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def run_batch(input_dir, out_dir, base_data_dir=None, confidence_threshold=0.5,
+              batch_size=DEFAULT_BATCH_SIZE, max_batch_mb=DEFAULT_MAX_BATCH_MB, cache_dir=None,
+              weights_dir=None, offline=False, use_depth_model=True, lidar_only=False,
+              depth_size=DEFAULT_DEPTH_SIZE, detection_size=DEFAULT_DETECTION_SIZE, detection_tiles=1,
+              full_res_depth=False, backend="eager", track=False, coast=DEFAULT_MAX_COAST,
+              keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, prefetch_depth=DEFAULT_PREFETCH_DEPTH,
+              refine_poses=False, icp_method="point_to_plane", workers=1, threads_per_worker=None, resume=False,
+              store_dir=None):
+    if workers > 1 and (refine_poses or (track and keyframe_interval > 1)):
+        # Both carry state from one scene to the next, which shards break up
+        raise ValueError("Pose refinement and detection feedback need scenes in order and cannot run on workers")
+    if base_data_dir is None:
+        base_data_dir = default_data_dir(input_dir)
+
+    scene_files = scan_scene_files(input_dir)
+    if not scene_files:
+        print(f"No scene files found in {input_dir}")
+        return []
+    if resume:
+        pending = [p for p in scene_files if not os.path.exists(result_path(out_dir, scene_name(p)))]
+        print(f"Resuming: {len(scene_files) - len(pending)} of {len(scene_files)} scenes already done")
+        scene_files = pending
+        if not scene_files:
+            return []
+
+    os.makedirs(out_dir, exist_ok=True)
+    perception_options = {
+        'batch_size': batch_size,
+        'max_batch_mb': max_batch_mb,
+        'cache_dir': cache_dir,
+        'weights_dir': weights_dir,
+        'offline': offline,
+        'use_depth_model': use_depth_model,
+        'lidar_only': lidar_only,
+        'depth_size': depth_size,
+        'detection_size': detection_size,
+        'detection_tiles': detection_tiles,
+        'full_res_depth': full_res_depth,
+        'backend': backend,
+    }
+    # Scenes arrive in order, so tracks carry over from one scene to the next
+    tracker = Tracker(max_coast=coast, keyframe_interval=keyframe_interval) if track else None
+    steps = 1
+
+    def search_plan():
+        # Predicted over the scenes since the last update, as tracker.update will
+        return tracker.search_plan(dt=steps)
+
+    if workers > 1:
+        scene_groups = iter_scene_groups_parallel(scene_files, base_data_dir, perception_options, workers,
+                                                  confidence_threshold, threads_per_worker,
+                                                  prefetch_depth=prefetch_depth)
+    else:
+        perception = create_perception(**perception_options)
+        refiner = PoseRefiner(icp_method) if refine_poses else None
+        feedback = tracker is not None and keyframe_interval > 1
+        scene_groups = iter_scene_groups(perception, scene_files, base_data_dir, confidence_threshold, batch_size,
+                                         prefetch_depth=prefetch_depth, refiner=refiner,
+                                         search_plan=search_plan if feedback else None)
+    # Rows of every scene also go to the columnar store, if one is given
+    store = ResultStore(store_dir) if store_dir else None
+    scene_paths = {scene_name(p): p for p in scene_files}
+    results = []
+    failed = 0
+    start = time.perf_counter()
+    # The store is closed on a crash too, so the buffered scenes are not lost
+    try:
+        for group, group_results, error in scene_groups:
+            if error is not None:
+                failed += len(group)
+                steps += len(group)
+                print(f"Error processing {', '.join(os.path.basename(p) for p in group)}: {error}")
+                continue
+            for result in group_results:
+                if tracker is not None:
+                    result['objects'] = tracker.update(result['objects'], dt=steps, plan=result.get('search'))
+                    steps = 1
+                write_result(result, out_dir)
+                if store is not None:
+                    scene_data = load_scene(scene_paths[result['scene']])
+                    if 'registration' in result:
+                        scene_data = corrected_scene(scene_data, result['registration'])
+                    store.append_result(result, scene_data)
+                results.append(result)
+                detection_counts = ", ".join(f"{car_id}: {len(result[car_id]['detections'])}" for car_id in CAR_IDS)
+                print(f"Processed {result['scene']} ({detection_counts} detections, "
+                      f"{len(result['objects'])} fused objects)")
+    finally:
+        if store is not None:
+            store.close()
+    elapsed = time.perf_counter() - start
+
+    rate = len(results) / elapsed if elapsed > 0 else 0.0
+    print(f"Processed {len(results)} scenes ({failed} failed) in {elapsed:.2f}s, {rate:.2f} scenes/sec")
+    return results
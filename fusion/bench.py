@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import platform
+import torch
+from fusion.batch import create_perception, default_data_dir, iter_scene_groups, write_result
+from fusion.evaluate import evaluate_scene, load_ground_truth, summarize
+from fusion.perception import DEFAULT_BATCH_SIZE, DEFAULT_MAX_BATCH_MB, DEFAULT_DEPTH_SIZE, DEFAULT_DETECTION_SIZE
+from fusion.scene import load_scene, scan_scene_files, scene_name
+from fusion.timing import StageTimer, peak_memory_mb
+from fusion.registration import PoseRefiner
+from fusion.tracking import Tracker, DEFAULT_KEYFRAME_INTERVAL, DEFAULT_MAX_COAST
+from fusion.pipeline import DEFAULT_PREFETCH_DEPTH
+from fusion.visibility import recall_by_visibility, scene_visibility, summarize_visibility
+
+
+def run_bench(input_dir, gt_dir=None, report_path="./bench_report.json", out_dir=None, base_data_dir=None,
+              confidence_threshold=0.5, batch_size=DEFAULT_BATCH_SIZE, max_batch_mb=DEFAULT_MAX_BATCH_MB,
+              cache_dir=None, weights_dir=None, offline=False, use_depth_model=True, lidar_only=False,
+              depth_size=DEFAULT_DEPTH_SIZE, detection_size=DEFAULT_DETECTION_SIZE, detection_tiles=1,
+              full_res_depth=False, backend="eager", track=False, coast=DEFAULT_MAX_COAST,
+              keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, prefetch_depth=DEFAULT_PREFETCH_DEPTH,
+              refine_poses=False, icp_method="point_to_plane"):
+    # Runs the batch pipeline over every scene, scores the fused objects against
+    # ground truth and writes accuracy, per-stage latency and memory to one report
+    if base_data_dir is None:
+        base_data_dir = default_data_dir(input_dir)
+    if gt_dir is None:
+        gt_dir = os.path.join(base_data_dir, "output")
+
+    scene_files = scan_scene_files(input_dir)
+    if not scene_files:
+        print(f"No scene files found in {input_dir}")
+        return None
+
+    timer = StageTimer()
+    with timer.stage("model_load"):
+        perception = create_perception(batch_size, max_batch_mb, cache_dir, weights_dir, offline, use_depth_model,
+                                       lidar_only, depth_size, detection_size, detection_tiles, full_res_depth,
+                                       backend)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    tracker = Tracker(max_coast=coast, keyframe_interval=keyframe_interval) if track else None
+    refiner = PoseRefiner(icp_method) if refine_poses else None
+    steps = 1
+
+    def search_plan():
+        return tracker.search_plan(dt=steps)
+
+    feedback = tracker is not None and keyframe_interval > 1
+    scenes = {}
+    visibility = {}
+    scene_paths = {scene_name(p): p for p in scene_files}
+    failed = []
+    start = time.perf_counter()
+    for group, group_results, error in iter_scene_groups(perception, scene_files, base_data_dir,
+                                                         confidence_threshold, batch_size, timer, prefetch_depth,
+                                                         refiner, search_plan if feedback else None):
+        if error is not None:
+            failed.extend(os.path.basename(p) for p in group)
+            steps += len(group)
+            print(f"Error processing {', '.join(os.path.basename(p) for p in group)}: {error}")
+            continue
+        for result in group_results:
+            if tracker is not None:
+                with timer.stage("tracking"):
+                    result['objects'] = tracker.update(result['objects'], dt=steps, plan=result.get('search'))
+                steps = 1
+            if out_dir:
+                write_result(result, out_dir)
+            try:
+                ground_truth = load_ground_truth(gt_dir, result['scene'])
+            except OSError:
+                print(f"No ground truth for {result['scene']} in {gt_dir}")
+                continue
+            scenes[result['scene']] = evaluate_scene(result['objects'], ground_truth)
+            # Recall split by which cars could see each agent: what fusion recovers
+            with timer.stage("visibility"):
+                scene_data = load_scene(scene_paths[result['scene']])
+                visible = scene_visibility(scene_data, ground_truth, base_data_dir)
+            visibility[result['scene']] = recall_by_visibility(result['objects'], ground_truth, visible)
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(scenes.values())
+    report = {
+        'config': {
+            'input_dir': input_dir,
+            'gt_dir': gt_dir,
+            'confidence_threshold': confidence_threshold,
+            'batch_size': batch_size,
+            'max_batch_mb': max_batch_mb,
+            'use_depth_model': use_depth_model,
+            'lidar_only': lidar_only,
+            'depth_size': depth_size,
+            'detection_size': detection_size,
+            'detection_tiles': detection_tiles,
+            'full_res_depth': full_res_depth,
+            'backend': perception.backend,
+            'track': track,
+            'coast': coast,
+            'keyframe_interval': keyframe_interval,
+            'prefetch_depth': prefetch_depth,
+            'refine_poses': refine_poses,
+            'icp_method': icp_method,
+            'cache_dir': cache_dir,
+            'device': perception.device,
+            'torch_threads': torch.get_num_threads(),
+            'platform': platform.platform(),
+        },
+        'model_load_times': perception.load_times,
+        'accuracy': summary,
+        'recall_by_visibility': summarize_visibility(visibility.values()),
+        'scenes': {name: summarize([metrics]) for name, metrics in scenes.items()},
+        'failed_scenes': failed,
+        'latency': {
+            'elapsed_s': elapsed,
+            'scenes_per_sec': len(scenes) / elapsed if elapsed > 0 else 0.0,
+            'stages': timer.report(),
+        },
+        'peak_memory_mb': peak_memory_mb(),
+    }
+    if torch.cuda.is_available():
+        report['peak_gpu_memory_mb'] = torch.cuda.max_memory_allocated() / (1024 * 1024)
+
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Precision {summary['precision']:.3f}, recall {summary['recall']:.3f}, "
+          f"mean centre error {format_optional(summary['mean_center_error'], 'm')}, "
+          f"mean BEV IoU {format_optional(summary['mean_bev_iou'])}")
+    for group, stats in report['recall_by_visibility'].items():
+        print(f"  recall, seen by {group}: {format_optional(stats['recall'])} ({stats['found']}/{stats['agents']})")
+    for name, stats in timer.report().items():
+        print(f"  {name}: {stats['mean_ms']:.1f} ms x {stats['count']}")
+    print(f"{report['latency']['scenes_per_sec']:.2f} scenes/sec, peak memory {report['peak_memory_mb']:.0f} MB")
+    print(f"Report written to {report_path}")
+    return report
+
+
+def format_optional(value, unit=""):
+    return "n/a" if value is None else f"{value:.2f}{unit}"
@@ -0,0 +1,161 @@
+import numpy as np
+from fusion.lidar import xyz, load_scene_lidar
+from fusion.scene import CAR_IDS, car_pose, local_to_world
+from fusion.fuse import SENSOR_HEIGHT
+from fusion.timing import traced
+
+# Cell size in metres
+BEV_RESOLUTION = 0.2
+# Returns further than this from their car are left out of the grid
+BEV_MAX_RANGE = 80.0
+# Cells whose highest return is this far above the road count as obstacles
+OBSTACLE_HEIGHT = 0.3
+
+
+class BevGrid:
+    # Bird's-eye-view raster of world-frame LiDAR returns. Row r, column c covers
+    # x in [x_min + c * res, x_min + (c + 1) * res) and likewise y for rows, so
+    # rows grow with world y. Heights are above the road; empty cells hold NaN.
+    def __init__(self, bounds, resolution, count, source_count, max_height, min_height, intensity_sum):
+        self.bounds = bounds
+        self.resolution = resolution
+        self.count = count
+        self.source_count = source_count
+        self.max_height = max_height
+        self.min_height = min_height
+        self.intensity_sum = intensity_sum
+
+    @property
+    def shape(self):
+        return self.count.shape
+
+    @property
+    def occupancy(self):
+        return self.count > 0
+
+    @property
+    def mean_intensity(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self.intensity_sum / self.count, np.nan).astype(np.float32)
+
+    def obstacle_mask(self, min_height=OBSTACLE_HEIGHT):
+        # Occupied cells with returns above the road surface
+        with np.errstate(invalid='ignore'):
+            return self.max_height > min_height
+
+    def world_to_cell(self, points_xy):
+        # (rows, cols, inside) of world (x, y) points
+        points_xy = np.asarray(points_xy, dtype=np.float64).reshape(-1, 2)
+        x_min, y_min = self.bounds[0], self.bounds[1]
+        cols = np.floor((points_xy[:, 0] - x_min) / self.resolution).astype(np.int64)
+        rows = np.floor((points_xy[:, 1] - y_min) / self.resolution).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+        return rows, cols, inside
+
+    def cell_centers(self, rows, cols):
+        x_min, y_min = self.bounds[0], self.bounds[1]
+        return np.column_stack([x_min + (np.asarray(cols) + 0.5) * self.resolution,
+                                y_min + (np.asarray(rows) + 0.5) * self.resolution])
+
+    def lookup(self, values, points_xy, fill=np.nan):
+        # Samples a per-cell array at world points, fill outside the grid
+        rows, cols, inside = self.world_to_cell(points_xy)
+        result = np.full(len(rows), fill, dtype=np.result_type(values.dtype, np.asarray(fill).dtype))
+        result[inside] = values[rows[inside], cols[inside]]
+        return result
+
+
+def scene_world_points(scene_data, base_data_dir="./data", car_ids=CAR_IDS, max_range=BEV_MAX_RANGE):
+    # World-frame (x, y, z above road), intensity and car index of every return
+    # of every available sweep
+    coords, intensities, sources = [], [], []
+    for source, car_id in enumerate(car_ids):
+        try:
+            points = load_scene_lidar(scene_data, car_id, base_data_dir)
+        except FileNotFoundError:
+            continue
+        local = np.asarray(xyz(points))
+        keep = np.hypot(local[:, 0], local[:, 1]) <= max_range
+        local = local[keep]
+        location, yaw = car_pose(scene_data, car_id)
+        world = np.empty((len(local), 3), dtype=np.float32)
+        world[:, :2] = local_to_world(local[:, :2], location, yaw)
+        world[:, 2] = local[:, 2] + SENSOR_HEIGHT
+        coords.append(world)
+        intensities.append(np.asarray(points['I'], dtype=np.float32)[keep])
+        sources.append(np.full(len(local), source, dtype=np.int8))
+    if not coords:
+        return np.zeros((0, 3), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int8)
+    return np.concatenate(coords), np.concatenate(intensities), np.concatenate(sources)
+
+
+def rasterize(points, intensity=None, sources=None, resolution=BEV_RESOLUTION, bounds=None, num_sources=None):
+    # One pass of bincount/ufunc.at over flat cell indices; no per-point loop.
+    # bounds is (x_min, y_min, x_max, y_max); defaults to the extent of the points.
+    points = np.asarray(points)
+    if bounds is None:
+        if len(points):
+            lo = np.floor(points[:, :2].min(axis=0) / resolution) * resolution
+            hi = np.floor(points[:, :2].max(axis=0) / resolution) * resolution + resolution
+        else:
+            lo, hi = np.zeros(2), np.full(2, resolution)
+        bounds = (float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1]))
+    x_min, y_min, x_max, y_max = bounds
+    width = max(1, int(np.ceil((x_max - x_min) / resolution)))
+    height = max(1, int(np.ceil((y_max - y_min) / resolution)))
+
+    cols = np.floor((points[:, 0] - x_min) / resolution).astype(np.int64)
+    rows = np.floor((points[:, 1] - y_min) / resolution).astype(np.int64)
+    inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    flat = rows[inside] * width + cols[inside]
+    z = points[inside, 2].astype(np.float32)
+    num_cells = width * height
+
+    count = np.bincount(flat, minlength=num_cells).astype(np.int32)
+    if intensity is None:
+        intensity_sum = np.zeros(num_cells, dtype=np.float32)
+    else:
+        intensity_sum = np.bincount(flat, weights=np.asarray(intensity)[inside], minlength=num_cells).astype(np.float32)
+    max_height = np.full(num_cells, -np.inf, dtype=np.float32)
+    min_height = np.full(num_cells, np.inf, dtype=np.float32)
+    np.maximum.at(max_height, flat, z)
+    np.minimum.at(min_height, flat, z)
+    max_height[count == 0] = np.nan
+    min_height[count == 0] = np.nan
+
+    # Returns per cell from each car, (num_sources, H, W)
+    if sources is None:
+        source_count = count.reshape(1, height, width)
+    else:
+        sources = np.asarray(sources)[inside].astype(np.int64)
+        if num_sources is None:
+            num_sources = int(sources.max()) + 1 if len(sources) else 1
+        source_count = np.bincount(sources * num_cells + flat,
+                                   minlength=num_sources * num_cells).astype(np.int32)
+        source_count = source_count.reshape(num_sources, height, width)
+
+    shape = (height, width)
+    return BevGrid(bounds, resolution, count.reshape(shape), source_count, max_height.reshape(shape),
+                   min_height.reshape(shape), intensity_sum.reshape(shape))
+
+
+@traced("bev.build")
+def build_scene_bev(scene_data, base_data_dir="./data", resolution=BEV_RESOLUTION, bounds=None,
+                    max_range=BEV_MAX_RANGE):
+    points, intensity, sources = scene_world_points(scene_data, base_data_dir, max_range=max_range)
+    return rasterize(points, intensity, sources, resolution, bounds, num_sources=len(CAR_IDS))
+
+
+def bev_rgba(grid, min_height=OBSTACLE_HEIGHT, max_height=3.0):
+    # Display image with north up: obstacles shaded by height, road returns dim,
+    # empty cells transparent
+    rgba = np.zeros(grid.shape + (4,), dtype=np.uint8)
+    occupied = grid.occupancy
+    obstacles = grid.obstacle_mask(min_height)
+    rgba[occupied & ~obstacles] = (90, 90, 110, 120)
+    level = np.clip((grid.max_height[obstacles] - min_height) / (max_height - min_height), 0.0, 1.0)
+    rgba[obstacles, 0] = (80 + 175 * level).astype(np.uint8)
+    rgba[obstacles, 1] = (200 - 120 * level).astype(np.uint8)
+    rgba[obstacles, 2] = 255 - (175 * level).astype(np.uint8)
+    rgba[obstacles, 3] = 220
+    return np.ascontiguousarray(rgba[::-1])
@@ -0,0 +1,72 @@
+import os
+from collections import OrderedDict
+import numpy as np
+from fusion.frame import content_hash
+
+DEFAULT_CACHE_DIR = "./data/cache/inference"
+DEFAULT_MAX_CACHE_MB = 512
+
+
+class ResultCache:
+    # Raw model outputs keyed by (model id, image content hash), kept in an
+    # in-memory LRU and optionally persisted as .npy files
+    def __init__(self, cache_dir=None, max_cache_mb=DEFAULT_MAX_CACHE_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_cache_mb * 1024 * 1024
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, model_id, img):
+        safe_model_id = model_id.replace("/", "_").replace(":", "_")
+        return f"{safe_model_id}-{content_hash(img)}"
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+        if self.cache_dir:
+            try:
+                value = np.load(self.disk_path(key))
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                self.hits += 1
+                self.remember(key, value)
+                return value
+
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.remember(key, value)
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self.disk_path(key)}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, value)
+                os.replace(tmp_path, self.disk_path(key))
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def remember(self, key, value):
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key).nbytes
+        self.entries[key] = value
+        self.total_bytes += value.nbytes
+        # Evict least recently used entries, always keeping the newest one
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= evicted.nbytes
+
+    def disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
@@ -0,0 +1,125 @@
+import os
+import json
+import numpy as np
+from fusion.fuse import associate
+
+# Centre distance in metres within which a prediction counts as a true positive
+EVAL_GATES = {"Car": 4.0, "Pedestrian": 2.0}
+
+
+def load_ground_truth(gt_dir, scene):
+    with open(os.path.join(gt_dir, f"{scene}.json"), 'r') as f:
+        return json.load(f)
+
+
+def box_corners(location, dimension, rotation):
+    # BEV footprint corners (counter-clockwise) of an object in the data/output schema
+    half_length, half_width = dimension[0] / 2, dimension[1] / 2
+    local = np.array([[half_length, half_width], [-half_length, half_width],
+                      [-half_length, -half_width], [half_length, -half_width]])
+    theta = np.radians(rotation)
+    rotation_matrix = np.array([[np.cos(theta), -np.sin(theta)],
+                                [np.sin(theta), np.cos(theta)]])
+    return local @ rotation_matrix.T + np.asarray(location[:2])
+
+
+def polygon_area(polygon):
+    if len(polygon) < 3:
+        return 0.0
+    x, y = polygon[:, 0], polygon[:, 1]
+    return 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def clip_polygon(subject, clip):
+    # Sutherland-Hodgman clipping of a polygon by a convex counter-clockwise polygon
+    output = list(subject)
+    for i in range(len(clip)):
+        if not output:
+            break
+        edge_start, edge_end = clip[i], clip[(i + 1) % len(clip)]
+        edge = edge_end - edge_start
+
+        def inside(p):
+            return edge[0] * (p[1] - edge_start[1]) - edge[1] * (p[0] - edge_start[0]) >= 0
+
+        def intersection(p, q):
+            d = q - p
+            denom = edge[0] * d[1] - edge[1] * d[0]
+            t = (edge[1] * (p[0] - edge_start[0]) - edge[0] * (p[1] - edge_start[1])) / denom
+            return p + t * d
+
+        points, output = output, []
+        for j in range(len(points)):
+            current, previous = points[j], points[j - 1]
+            if inside(current):
+                if not inside(previous):
+                    output.append(intersection(previous, current))
+                output.append(current)
+            elif inside(previous):
+                output.append(intersection(previous, current))
+    return np.array(output).reshape(-1, 2)
+
+
+def bev_iou(obj_a, obj_b):
+    corners_a = box_corners(obj_a['Location'], obj_a['Dimension'], obj_a['Rotation'])
+    corners_b = box_corners(obj_b['Location'], obj_b['Dimension'], obj_b['Rotation'])
+    intersection = polygon_area(clip_polygon(corners_a, corners_b))
+    union = polygon_area(corners_a) + polygon_area(corners_b) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def evaluate_scene(predicted, ground_truth, gates=EVAL_GATES):
+    # Per-class true/false positives and the centre error and BEV IoU of each match
+    pred_xy = np.array([o['Location'][:2] for o in predicted], dtype=np.float64).reshape(-1, 2)
+    gt_xy = np.array([o['Location'][:2] for o in ground_truth], dtype=np.float64).reshape(-1, 2)
+    pred_classes = np.array([o['object'] for o in predicted], dtype=object)
+    gt_classes = np.array([o['object'] for o in ground_truth], dtype=object)
+    matches = associate(pred_xy, gt_xy, pred_classes, gt_classes, gates)
+
+    metrics = {}
+    for name in sorted(set(pred_classes) | set(gt_classes)):
+        class_matches = matches[pred_classes[matches[:, 0]] == name] if len(matches) else matches
+        metrics[name] = {
+            'tp': len(class_matches),
+            'fp': int((pred_classes == name).sum()) - len(class_matches),
+            'fn': int((gt_classes == name).sum()) - len(class_matches),
+            'center_errors': [float(np.linalg.norm(pred_xy[i] - gt_xy[j])) for i, j in class_matches],
+            'ious': [float(bev_iou(predicted[i], ground_truth[j])) for i, j in class_matches],
+        }
+    return metrics
+
+
+def summarize(scene_metrics):
+    # Aggregates evaluate_scene() outputs into overall and per-class scores
+    per_class = {}
+    for metrics in scene_metrics:
+        for name, m in metrics.items():
+            total = per_class.setdefault(name, {'tp': 0, 'fp': 0, 'fn': 0, 'center_errors': [], 'ious': []})
+            for key in ('tp', 'fp', 'fn'):
+                total[key] += m[key]
+            total['center_errors'].extend(m['center_errors'])
+            total['ious'].extend(m['ious'])
+
+    overall = {'tp': 0, 'fp': 0, 'fn': 0, 'center_errors': [], 'ious': []}
+    for total in per_class.values():
+        for key in ('tp', 'fp', 'fn'):
+            overall[key] += total[key]
+        overall['center_errors'].extend(total['center_errors'])
+        overall['ious'].extend(total['ious'])
+
+    summary = score(overall)
+    summary['per_class'] = {name: score(total) for name, total in per_class.items()}
+    return summary
+
+
+def score(counts):
+    tp, fp, fn = counts['tp'], counts['fp'], counts['fn']
+    return {
+        'tp': tp,
+        'fp': fp,
+        'fn': fn,
+        'precision': tp / (tp + fp) if tp + fp else 0.0,
+        'recall': tp / (tp + fn) if tp + fn else 0.0,
+        'mean_center_error': float(np.mean(counts['center_errors'])) if counts['center_errors'] else None,
+        'mean_bev_iou': float(np.mean(counts['ious'])) if counts['ious'] else None,
+    }
@@ -0,0 +1,94 @@
+import os
+import json
+import time
+from fusion.backends import depth_parity, detection_parity
+from fusion.batch import default_data_dir
+from fusion.frame import Frame
+from fusion.perception import Perception, DEFAULT_DEPTH_SIZE, DEFAULT_DETECTION_SIZE, format_load_times
+from fusion.scene import CAR_IDS, scan_scene_files, load_scene, scene_name
+
+# An exported backend passes when its depth maps differ from eager ones by less
+# than this fraction of the depth range and it finds this share of eager boxes
+DEPTH_PARITY_TOLERANCE = 0.02
+DETECTION_PARITY_MIN_MATCH = 0.95
+
+
+def load_frames(scene_files, base_data_dir):
+    frames, names = [], []
+    for scene_path in scene_files:
+        scene_data = load_scene(scene_path)
+        for car_id in CAR_IDS:
+            frames.append(Frame.from_scene(scene_data, car_id, base_data_dir))
+            names.append(f"{scene_name(scene_path)}/{car_id}")
+    return frames, names
+
+
+def timed(run, frames):
+    start = time.perf_counter()
+    outputs = run(frames)
+    return outputs, (time.perf_counter() - start) / max(1, len(frames))
+
+
+def run_export(input_dir, backend, base_data_dir=None, weights_dir=None, offline=False, export_dir=None,
+               depth_size=DEFAULT_DEPTH_SIZE, detection_size=DEFAULT_DETECTION_SIZE, max_scenes=None,
+               report_path=None, confidence_threshold=0.5):
+    # Exports both models for the frame sizes of the bundled scenes (a one-time
+    # step; artifacts are reused from export_dir afterwards) and checks their
+    # outputs against the eager models on the same frames
+    if base_data_dir is None:
+        base_data_dir = default_data_dir(input_dir)
+    scene_files = scan_scene_files(input_dir)[:max_scenes]
+    if not scene_files:
+        print(f"No scene files found in {input_dir}")
+        return None
+    frames, names = load_frames(scene_files, base_data_dir)
+
+    options = dict(weights_dir=weights_dir, offline=offline, depth_size=depth_size, detection_size=detection_size)
+    eager = Perception(**options)
+    exported = Perception(backend=backend, export_dir=export_dir, **options)
+    for perception in (eager, exported):
+        for error in perception.load_models():
+            print(error)
+    print(f"Model load times: {format_load_times(exported.load_times)}")
+    if not (exported.has_yolo and exported.has_depth) or exported.backend != backend:
+        print(f"Cannot export the {backend} backend")
+        return None
+
+    # A first full batch exports, the timed passes below measure steady-state latency
+    start = time.perf_counter()
+    exported.estimate_depth_batch(frames[:exported.batch_size])
+    exported.detect_raw_batch(frames[:exported.batch_size])
+    export_s = time.perf_counter() - start
+
+    report = {'backend': backend, 'export_dir': exported.export_dir, 'export_s': export_s, 'frames': {}}
+    eager_depth, report['eager_depth_ms'] = timed(eager.estimate_depth_batch, frames)
+    exported_depth, report['depth_ms'] = timed(exported.estimate_depth_batch, frames)
+    eager_boxes, report['eager_detection_ms'] = timed(eager.detect_raw_batch, frames)
+    exported_boxes, report['detection_ms'] = timed(exported.detect_raw_batch, frames)
+    for key in ('eager_depth_ms', 'depth_ms', 'eager_detection_ms', 'detection_ms'):
+        report[key] *= 1000.0
+
+    for name, *outputs in zip(names, eager_depth, exported_depth, eager_boxes, exported_boxes):
+        report['frames'][name] = {
+            'depth_error': depth_parity(outputs[0], outputs[1]),
+            'detection': detection_parity(outputs[2], outputs[3], confidence_threshold),
+        }
+    depth_error = max(f['depth_error'] for f in report['frames'].values())
+    matched = min(f['detection']['matched'] for f in report['frames'].values())
+    report['max_depth_error'] = depth_error
+    report['min_detection_match'] = matched
+    report['passed'] = bool(depth_error <= DEPTH_PARITY_TOLERANCE and matched >= DETECTION_PARITY_MIN_MATCH)
+
+    print(f"{backend}: exported to {exported.export_dir} in {export_s:.1f}s")
+    print(f"  depth {report['depth_ms']:.1f} ms/frame (eager {report['eager_depth_ms']:.1f}), "
+          f"max error {100 * depth_error:.2f}% of range")
+    print(f"  detection {report['detection_ms']:.1f} ms/frame (eager {report['eager_detection_ms']:.1f}), "
+          f"worst frame matches {100 * matched:.1f}% of eager boxes")
+    print(f"  parity {'passed' if report['passed'] else 'FAILED'} "
+          f"(tolerance {100 * DEPTH_PARITY_TOLERANCE:.0f}% depth, {100 * DETECTION_PARITY_MIN_MATCH:.0f}% boxes)")
+    if report_path:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2, default=float)
+        print(f"Parity report written to {report_path}")
+    return report
@@ -0,0 +1,52 @@
+import hashlib
+import numpy as np
+from fusion.scene import read_camera_image
+from fusion.timing import span
+
+
+def image_hash(img):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{img.shape}{img.dtype}".encode())
+    digest.update(np.ascontiguousarray(img).data)
+    return digest.hexdigest()
+
+
+class Frame:
+    # A camera image decoded once into a single read-only RGB buffer that is
+    # shared by depth, detection and display. Only drawing takes a copy.
+    def __init__(self, rgb, path=None):
+        self.rgb = rgb
+        self.rgb.flags.writeable = False
+        self.path = path
+        self._content_hash = None
+
+    @classmethod
+    def from_scene(cls, scene_data, car_id, base_data_dir="./data"):
+        with span("image.load", car=car_id):
+            rgb = read_camera_image(scene_data, car_id, base_data_dir)
+        return cls(rgb, path=scene_data.get(f"{car_id}_Camera"))
+
+    @property
+    def shape(self):
+        return self.rgb.shape
+
+    @property
+    def image_size(self):
+        return self.rgb.shape[1], self.rgb.shape[0]
+
+    def content_hash(self):
+        # The buffer is read-only, so the hash only needs computing once
+        if self._content_hash is None:
+            self._content_hash = image_hash(self.rgb)
+        return self._content_hash
+
+    def copy_for_drawing(self):
+        return self.rgb.copy()
+
+
+def as_rgb(img):
+    return img.rgb if isinstance(img, Frame) else img
+
+
+def content_hash(img):
+    return img.content_hash() if isinstance(img, Frame) else image_hash(img)
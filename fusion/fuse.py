@@ -0,0 +1,168 @@
+import numpy as np
+from fusion.projection import CAMERA_MATRIX
+from fusion.scene import CAR_IDS, car_pose, local_to_world
+from fusion.timing import traced
+
+# Footprints used for fused objects, matching data/output (Length, Width, Height)
+OBJECT_DIMENSIONS = {
+    "Car": [4.791779518127441, 2.163450002670288, 1.4876600503921509],
+    "Pedestrian": [0.3799999952316284, 0.3799999952316284, 1.2999999523162842],
+}
+# Maximum world distance in metres between two detections of the same object
+MATCH_GATES = {"Car": 3.0, "Pedestrian": 1.5}
+# LiDAR/camera height above the road; ground returns sit at z = -1.70
+SENSOR_HEIGHT = 1.7
+
+
+def detection_positions(detections, camera_matrix=CAMERA_MATRIX):
+    # Car-frame (x forward, y right) centres of camera detections. The bearing
+    # comes from the box bottom centre; the range from LiDAR when available,
+    # otherwise from intersecting the box bottom with the ground plane.
+    # Positions that cannot be recovered are NaN.
+    if not detections:
+        return np.zeros((0, 2))
+    fx, fy = camera_matrix[0, 0], camera_matrix[1, 1]
+    cx, cy = camera_matrix[0, 2], camera_matrix[1, 2]
+
+    boxes = np.array([d['bbox'] for d in detections], dtype=np.float64)
+    lidar_range = np.array([d['distance_val'] if d.get('distance_source') == "lidar" else np.nan
+                            for d in detections], dtype=np.float64)
+    # LiDAR hits the visible surface; the centre is about half a footprint further
+    surface_offset = np.array([min(OBJECT_DIMENSIONS.get(d.get('object'), [0.0, 0.0])[:2]) / 2
+                               for d in detections])
+
+    u = (boxes[:, 0] + boxes[:, 2]) / 2
+    v_bottom = boxes[:, 3]
+    bearing = np.arctan2(u - cx, fx)
+
+    below_horizon = v_bottom > cy
+    ground_x = np.where(below_horizon, fy * SENSOR_HEIGHT / np.where(below_horizon, v_bottom - cy, 1.0), np.nan)
+    ground_range = ground_x / np.cos(bearing)
+    distance = np.where(np.isfinite(lidar_range), lidar_range, ground_range) + surface_offset
+    return np.column_stack([distance * np.cos(bearing), distance * np.sin(bearing)])
+
+
+def associate(positions_a, positions_b, classes_a, classes_b, gates=MATCH_GATES):
+    # Match detections of the same class across cars by world distance
+    classes_a = np.asarray(classes_a)
+    classes_b = np.asarray(classes_b)
+    if len(positions_a) == 0 or len(positions_b) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    cost = np.linalg.norm(positions_a[:, None, :] - positions_b[None, :, :], axis=2)
+    gate = np.array([gates.get(c, 0.0) for c in classes_a])
+    cost[(classes_a[:, None] != classes_b[None, :]) | ~(cost <= gate[:, None])] = np.inf
+    return mutual_nearest_matches(cost)
+
+
+def mutual_nearest_matches(cost):
+    # (rows, cols) pairs from a cost matrix with inf for forbidden pairs.
+    # Each round accepts all mutual nearest neighbours in one vectorized step,
+    # then removes them from the cost matrix. The input is modified.
+    rows = np.arange(cost.shape[0])
+    matches = []
+    while np.isfinite(cost).any():
+        best_col = np.argmin(cost, axis=1)
+        best_row = np.argmin(cost, axis=0)
+        mutual = (best_row[best_col] == rows) & np.isfinite(cost[rows, best_col])
+        matched_rows = rows[mutual]
+        matched_cols = best_col[mutual]
+        matches.append(np.column_stack([matched_rows, matched_cols]))
+        cost[matched_rows, :] = np.inf
+        cost[:, matched_cols] = np.inf
+    if not matches:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.concatenate(matches)
+
+
+def merge_cars(xy_a, xy_b, classes_a, classes_b, weights_a, weights_b, gates=MATCH_GATES):
+    # Matches the world-frame detections of two cars and merges every matched
+    # pair into one weighted position. Objects come out as matched pairs, then
+    # the unmatched detections of the first car, then those of the second.
+    # Besides xy, object and seen_by, each object has the index of its
+    # detection in either car (-1 where that car missed it) and their weights
+    # (0 where missed), so callers can carry other per-detection values along.
+    matches = associate(xy_a, xy_b, classes_a, classes_b, gates)
+    matched_a = np.zeros(len(xy_a), dtype=bool)
+    matched_b = np.zeros(len(xy_b), dtype=bool)
+    matched_a[matches[:, 0]] = True
+    matched_b[matches[:, 1]] = True
+    only_a = np.flatnonzero(~matched_a)
+    only_b = np.flatnonzero(~matched_b)
+
+    ia, ib = matches[:, 0], matches[:, 1]
+    pair_weights = np.column_stack([weights_a[ia], weights_b[ib]])
+    merged_xy = (xy_a[ia] * pair_weights[:, :1] + xy_b[ib] * pair_weights[:, 1:]) / pair_weights.sum(axis=1,
+                                                                                                     keepdims=True)
+    index = np.concatenate([matches, np.column_stack([only_a, np.full(len(only_a), -1)]),
+                            np.column_stack([np.full(len(only_b), -1), only_b])]).astype(np.int64).reshape(-1, 2)
+    weights = np.concatenate([pair_weights, np.column_stack([weights_a[only_a], np.zeros(len(only_a))]),
+                              np.column_stack([np.zeros(len(only_b)), weights_b[only_b]])]).reshape(-1, 2)
+    return {
+        'xy': np.concatenate([merged_xy, xy_a[only_a], xy_b[only_b]]).reshape(-1, 2),
+        'object': np.concatenate([classes_a[ia], classes_a[only_a], classes_b[only_b]]),
+        'seen_by': index >= 0,
+        'index': index,
+        'weights': weights.astype(np.float64),
+    }
+
+
+def heavier_view(merged, values_a, values_b):
+    # Per merged object, the value from the car whose detection weighs more
+    values_a, values_b = np.asarray(values_a), np.asarray(values_b)
+    index = merged['index']
+    from_a = (index[:, 0] >= 0) & ((index[:, 1] < 0) | (merged['weights'][:, 0] >= merged['weights'][:, 1]))
+    values = np.concatenate([values_a, values_b])
+    return values[np.where(from_a, index[:, 0], len(values_a) + index[:, 1])]
+
+
+@traced("fusion.fuse")
+def fuse_detections(scene_data, detections_by_car, gates=MATCH_GATES):
+    # Returns fused objects as arrays: world xy, object class, confidence and a
+    # boolean (objects, cars) matrix of which cars saw each object
+    world = {}
+    for car_id in CAR_IDS:
+        detections = detections_by_car.get(car_id) or []
+        location, yaw = car_pose(scene_data, car_id)
+        xy = local_to_world(detection_positions(detections), location, yaw)
+        classes = np.array([d.get('object', "Pedestrian") for d in detections], dtype=object)
+        conf = np.array([d['conf'] for d in detections], dtype=np.float64)
+
+        valid = np.isfinite(xy).all(axis=1)
+        # The other car is not one of the scene's road agents
+        for other_id in CAR_IDS:
+            if other_id != car_id:
+                other_location, _ = car_pose(scene_data, other_id)
+                near_other = np.linalg.norm(xy - other_location, axis=1) <= gates.get("Car", 0.0)
+                valid &= ~((classes == "Car") & near_other)
+        world[car_id] = (xy[valid], classes[valid], conf[valid])
+
+    (xy_a, classes_a, conf_a), (xy_b, classes_b, conf_b) = world[CAR_IDS[0]], world[CAR_IDS[1]]
+    merged = merge_cars(xy_a, xy_b, classes_a, classes_b, conf_a, conf_b, gates)
+    return {'xy': merged['xy'], 'object': merged['object'], 'confidence': merged['weights'].max(axis=1),
+            'seen_by': merged['seen_by']}
+
+
+def to_output_schema(fused, scene_data):
+    # Same fields as data/output/scene_*.json. A camera box carries no heading,
+    # so Rotation is the heading of (one of) the cars that saw the object unless
+    # the detector measured one (fused['rotation'], degrees). The fused
+    # confidence is kept alongside for the result store and queries.
+    yaws = np.array([car_pose(scene_data, car_id)[1] for car_id in CAR_IDS])
+    rotations = fused.get('rotation')
+    if rotations is None:
+        rotations = yaws[np.argmax(fused['seen_by'], axis=1)] if len(fused['seen_by']) else []
+    objects = []
+    for xy, name, rotation, confidence in zip(fused['xy'], fused['object'], rotations, fused['confidence']):
+        objects.append({
+            "object": str(name),
+            "Location": [float(xy[0]), float(xy[1])],
+            "Rotation": float(rotation) if name == "Car" else 0.0,
+            "Dimension": list(OBJECT_DIMENSIONS.get(name, [0.0, 0.0, 0.0])),
+            "confidence": float(confidence),
+        })
+    return objects
+
+
+def fuse_scene(scene_data, detections_by_car, gates=MATCH_GATES):
+    return to_output_schema(fuse_detections(scene_data, detections_by_car, gates), scene_data)
@@ -0,0 +1,132 @@
+import os
+import numpy as np
+from numpy.lib import recfunctions
+
+# PLY property types mapped to numpy type codes
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1',
+    'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2',
+    'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4',
+    'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4',
+    'double': 'f8', 'float64': 'f8',
+}
+
+PLY_BYTE_ORDER = {
+    'ascii': '<',
+    'binary_little_endian': '<',
+    'binary_big_endian': '>',
+}
+
+
+def read_ply_header(f):
+    # Returns (format, vertex count, vertex dtype, header size in bytes)
+    magic = f.readline()
+    if magic.strip() != b'ply':
+        raise ValueError("Not a PLY file")
+
+    fmt = None
+    count = 0
+    fields = []
+    element = None
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError("PLY header is missing end_header")
+        tokens = line.decode('ascii').split()
+        if not tokens or tokens[0] in ('comment', 'obj_info'):
+            continue
+        if tokens[0] == 'end_header':
+            break
+        if tokens[0] == 'format':
+            fmt = tokens[1]
+        elif tokens[0] == 'element':
+            element = tokens[1]
+            if element == 'vertex':
+                count = int(tokens[2])
+        elif tokens[0] == 'property' and element == 'vertex':
+            if tokens[1] == 'list':
+                raise ValueError("List properties are not supported for vertices")
+            fields.append((tokens[2], PLY_TYPES[tokens[1]]))
+
+    if fmt not in PLY_BYTE_ORDER:
+        raise ValueError(f"Unsupported PLY format: {fmt}")
+    byte_order = PLY_BYTE_ORDER[fmt]
+    dtype = np.dtype([(name, byte_order + code) for name, code in fields])
+    return fmt, count, dtype, f.tell()
+
+
+def parse_ply(path):
+    with open(path, 'rb') as f:
+        fmt, count, dtype, _ = read_ply_header(f)
+
+        if fmt != 'ascii':
+            points = np.fromfile(f, dtype=dtype, count=count)
+            return points.astype(dtype.newbyteorder('='))
+
+        # Parse the whole vertex body in a single call instead of line by line
+        body = f.read()
+        field_types = {dtype[name] for name in dtype.names}
+        parse_type = field_types.pop() if len(field_types) == 1 else np.float64
+        values = np.fromstring(body, dtype=parse_type, sep=' ')
+
+    num_fields = len(dtype.names)
+    if values.size < count * num_fields:
+        raise ValueError(f"PLY body of {path} has {values.size} values, expected {count * num_fields}")
+    values = values[:count * num_fields].reshape(count, num_fields)
+
+    if values.dtype == dtype[0]:
+        return values.view(dtype).reshape(count)
+
+    points = np.empty(count, dtype=dtype)
+    for i, name in enumerate(dtype.names):
+        points[name] = values[:, i]
+    return points
+
+
+def sidecar_path(path):
+    return os.path.splitext(path)[0] + ".npy"
+
+
+def load_point_cloud(path, use_cache=True):
+    # Parse the PLY once and memory-map the binary sidecar on later loads
+    if not use_cache:
+        return parse_ply(path)
+
+    cache_path = sidecar_path(path)
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            return np.load(cache_path, mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+
+    points = parse_ply(path)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.save(f, points)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Read-only data directories still work, just without the cache
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return points
+    return np.load(cache_path, mmap_mode='r')
+
+
+def scene_lidar_path(scene_data, car_id, base_data_dir="./data"):
+    lidar_path = os.path.join(base_data_dir, scene_data.get(f"{car_id}_Lidar", ""))
+    if not os.path.exists(lidar_path):
+        raise FileNotFoundError(f"{car_id} lidar not found at {lidar_path}")
+    return lidar_path
+
+
+def load_scene_lidar(scene_data, car_id, base_data_dir="./data", use_cache=True):
+    return load_point_cloud(scene_lidar_path(scene_data, car_id, base_data_dir), use_cache=use_cache)
+
+
+def xyz(points):
+    # (N, 3) float32 coordinates; a view when the fields are packed float32
+    return recfunctions.structured_to_unstructured(points[['x', 'y', 'z']], dtype=np.float32, copy=False)
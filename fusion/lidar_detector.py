@@ -0,0 +1,250 @@
+import numpy as np
+import cv2
+from fusion.bev import rasterize
+from fusion.fuse import OBJECT_DIMENSIONS, MATCH_GATES, SENSOR_HEIGHT, heavier_view, merge_cars
+from fusion.lidar import xyz, load_scene_lidar
+from fusion.scene import CAR_IDS, car_pose, local_to_world, world_to_local
+from fusion.timing import traced
+
+# Returns closer than this to the fitted road plane are ground
+GROUND_THRESHOLD = 0.2
+RANSAC_HYPOTHESES = 64
+RANSAC_SAMPLE = 2048
+# Returns of the ego car itself
+EGO_RADIUS = 3.0
+DETECTION_RANGE = 60.0
+# Road agents reach down to the road; canopies and signs start higher up
+MAX_CLUSTER_BASE = 0.6
+CLUSTER_CELL_SIZE = 0.3
+MIN_CLUSTER_POINTS = 5
+# Candidate headings for the minimum-area box fit, over a quarter turn
+HEADING_STEPS = 18
+# Visible (length, width, height above road) ranges per class; a car seen from
+# one side only shows part of its footprint. Clusters are kept whole, so trees,
+# poles and buildings fail the height range instead of leaving a trunk behind.
+CLASS_LIMITS = {
+    "Car": {'length': (1.5, 6.5), 'width': (0.0, 3.0), 'height': (0.9, 2.5)},
+    "Pedestrian": {'length': (0.0, 1.2), 'width': (0.0, 1.2), 'height': (0.8, 2.2)},
+}
+
+
+def fit_ground_plane(coords, hypotheses=RANSAC_HYPOTHESES, sample_size=RANSAC_SAMPLE,
+                     threshold=GROUND_THRESHOLD, seed=0):
+    # RANSAC over all hypotheses at once: (hypotheses, sample) residuals in one
+    # matrix, then a least-squares refit on the winner's inliers. Returns
+    # (normal, offset) with the normal pointing up, so height = p @ normal + offset.
+    rng = np.random.default_rng(seed)
+    # The road is below the sensor; restricting seeds to low points avoids walls.
+    # When half the sweep shares the lowest height, those points are the seeds.
+    median = np.percentile(coords[:, 2], 50)
+    candidates = coords[coords[:, 2] < median]
+    if len(candidates) < 3:
+        candidates = coords[coords[:, 2] <= median]
+    if len(candidates) < 3:
+        return np.array([0.0, 0.0, 1.0]), SENSOR_HEIGHT
+    sample = coords[rng.choice(len(coords), min(sample_size, len(coords)), replace=False)]
+
+    triples = candidates[rng.integers(0, len(candidates), size=(hypotheses, 3))]
+    normals = np.cross(triples[:, 1] - triples[:, 0], triples[:, 2] - triples[:, 0])
+    norms = np.linalg.norm(normals, axis=1)
+    valid = norms > 1e-6
+    normals[valid] /= norms[valid, None]
+    normals *= np.where(normals[:, 2:] < 0, -1.0, 1.0)
+    # Near-horizontal planes only (within about 15 degrees)
+    valid &= normals[:, 2] > 0.96
+    offsets = -np.einsum('ij,ij->i', normals, triples[:, 0])
+
+    residuals = np.abs(sample @ normals.T + offsets)
+    inlier_counts = np.where(valid, (residuals < threshold).sum(axis=0), -1)
+    if inlier_counts.max() <= 0:
+        return np.array([0.0, 0.0, 1.0]), SENSOR_HEIGHT
+    best = np.argmax(inlier_counts)
+
+    # z = a x + b y + c through all inliers of the best hypothesis
+    inliers = coords[np.abs(coords @ normals[best] + offsets[best]) < threshold]
+    design = np.column_stack([inliers[:, 0], inliers[:, 1], np.ones(len(inliers))])
+    (a, b, c), *_ = np.linalg.lstsq(design, inliers[:, 2], rcond=None)
+    normal = np.array([-a, -b, 1.0])
+    scale = np.linalg.norm(normal)
+    return normal / scale, -c / scale
+
+
+def cluster_points(coords_xy, cell_size=CLUSTER_CELL_SIZE, min_points=MIN_CLUSTER_POINTS):
+    # Connected components of occupied BEV cells (8-connected). Returns a label
+    # per point, -1 for points in clusters smaller than min_points.
+    if len(coords_xy) == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    grid = rasterize(np.column_stack([coords_xy, np.zeros(len(coords_xy))]), resolution=cell_size)
+    num_labels, label_image = cv2.connectedComponents(grid.occupancy.astype(np.uint8), connectivity=8)
+    rows, cols, _ = grid.world_to_cell(coords_xy)
+    labels = label_image[rows, cols].astype(np.int64) - 1
+
+    sizes = np.bincount(labels, minlength=num_labels - 1)
+    keep = sizes >= min_points
+    remap = np.full(len(sizes), -1, dtype=np.int64)
+    remap[keep] = np.arange(keep.sum())
+    return remap[labels], int(keep.sum())
+
+
+def fit_oriented_boxes(coords_xy, labels, num_labels, heading_steps=HEADING_STEPS):
+    # Minimum-area rectangle per cluster, searched over a fixed set of headings
+    # for all clusters at once. Returns centres (K, 2), (length, width) (K, 2)
+    # and the heading of the length axis in radians (K,).
+    angles = np.linspace(0.0, np.pi / 2, heading_steps, endpoint=False)
+    cos, sin = np.cos(angles), np.sin(angles)
+    u = coords_xy[:, :1] * cos + coords_xy[:, 1:2] * sin
+    v = -coords_xy[:, :1] * sin + coords_xy[:, 1:2] * cos
+
+    keys = (labels[:, None] * heading_steps + np.arange(heading_steps)).ravel()
+    size = num_labels * heading_steps
+    extents = []
+    for values in (u.ravel(), v.ravel()):
+        low = np.full(size, np.inf)
+        high = np.full(size, -np.inf)
+        np.minimum.at(low, keys, values)
+        np.maximum.at(high, keys, values)
+        extents.append((low.reshape(num_labels, heading_steps), high.reshape(num_labels, heading_steps)))
+    (u_low, u_high), (v_low, v_high) = extents
+
+    best = np.argmin((u_high - u_low) * (v_high - v_low), axis=1)
+    k = np.arange(num_labels)
+    u_low, u_high, v_low, v_high = u_low[k, best], u_high[k, best], v_low[k, best], v_high[k, best]
+    angle = angles[best]
+    u_center, v_center = (u_low + u_high) / 2, (v_low + v_high) / 2
+    centers = np.column_stack([u_center * np.cos(angle) - v_center * np.sin(angle),
+                               u_center * np.sin(angle) + v_center * np.cos(angle)])
+
+    u_extent, v_extent = u_high - u_low, v_high - v_low
+    u_is_length = u_extent >= v_extent
+    sizes = np.column_stack([np.where(u_is_length, u_extent, v_extent),
+                             np.where(u_is_length, v_extent, u_extent)])
+    headings = np.where(u_is_length, angle, angle + np.pi / 2)
+    return centers, sizes, headings
+
+
+def classify_boxes(sizes, heights, limits=CLASS_LIMITS):
+    # First class whose visible size and height ranges contain the cluster, else None
+    classes = np.full(len(sizes), None, dtype=object)
+    for name, limit in limits.items():
+        match = ((sizes[:, 0] >= limit['length'][0]) & (sizes[:, 0] <= limit['length'][1]) &
+                 (sizes[:, 1] >= limit['width'][0]) & (sizes[:, 1] <= limit['width'][1]) &
+                 (heights >= limit['height'][0]) & (heights <= limit['height'][1]))
+        classes[match & (classes == None)] = name  # noqa: E711
+    return classes
+
+
+def complete_boxes(centers, sizes, headings, classes):
+    # A sweep only sees the near faces of an object; push each centre away from
+    # the sensor until the box has the class footprint from data/output
+    template = np.array([OBJECT_DIMENSIONS.get(name, [0.0, 0.0])[:2] for name in classes]).reshape(-1, 2)
+    missing = np.clip(template - sizes, 0.0, None)
+    length_axis = np.column_stack([np.cos(headings), np.sin(headings)])
+    width_axis = np.column_stack([-np.sin(headings), np.cos(headings)])
+    completed = centers.copy()
+    for axis, extra in ((length_axis, missing[:, 0]), (width_axis, missing[:, 1])):
+        away = np.sign(np.einsum('ij,ij->i', centers, axis))
+        completed += axis * (away * extra / 2)[:, None]
+    return completed
+
+
+def in_regions(coords_xy, centers, radii):
+    # Points within any of the (K, 2) centres' radii
+    inside = np.zeros(len(coords_xy), dtype=bool)
+    for center, radius in zip(centers, radii):
+        inside |= np.sum((coords_xy - center) ** 2, axis=1) <= radius * radius
+    return inside
+
+
+@traced("lidar.detect")
+def detect_objects(points, detection_range=DETECTION_RANGE, regions=None):
+    # Car-frame detections of one sweep: centre xy, heading (radians), visible
+    # (length, width), height above road, point count and class. With regions,
+    # (centres, radii) in the car frame, only obstacles inside them are
+    # clustered; the road plane is still fitted to the whole sweep.
+    coords = np.asarray(xyz(points), dtype=np.float64)
+    planar_range = np.hypot(coords[:, 0], coords[:, 1])
+    coords = coords[(planar_range > EGO_RADIUS) & (planar_range < detection_range)]
+    empty = {'xy': np.zeros((0, 2)), 'heading': np.zeros(0), 'size': np.zeros((0, 2)),
+             'height': np.zeros(0), 'count': np.zeros(0, dtype=np.int64), 'object': np.zeros(0, dtype=object)}
+    if len(coords) < 3:
+        return empty
+
+    normal, offset = fit_ground_plane(coords)
+    height = coords @ normal + offset
+    obstacle = height > GROUND_THRESHOLD
+    coords, height = coords[obstacle], height[obstacle]
+    if regions is not None:
+        searched = in_regions(coords[:, :2], *regions)
+        coords, height = coords[searched], height[searched]
+    labels, num_labels = cluster_points(coords[:, :2])
+    if num_labels == 0:
+        return empty
+
+    clustered = labels >= 0
+    coords, height, labels = coords[clustered], height[clustered], labels[clustered]
+    centers, sizes, headings = fit_oriented_boxes(coords[:, :2], labels, num_labels)
+    max_height = np.full(num_labels, -np.inf)
+    min_height = np.full(num_labels, np.inf)
+    np.maximum.at(max_height, labels, height)
+    np.minimum.at(min_height, labels, height)
+    counts = np.bincount(labels, minlength=num_labels)
+
+    classes = classify_boxes(sizes, max_height)
+    classes[min_height > MAX_CLUSTER_BASE] = None
+    keep = classes != None  # noqa: E711
+    centers, sizes, headings, classes = centers[keep], sizes[keep], headings[keep], classes[keep]
+    return {
+        'xy': complete_boxes(centers, sizes, headings, classes),
+        'heading': headings,
+        'size': sizes,
+        'height': max_height[keep],
+        'count': counts[keep],
+        'object': classes,
+    }
+
+
+def detect_scene_objects(scene_data, base_data_dir="./data", gates=MATCH_GATES, sweeps=None, plan=None):
+    # Both sweeps in world coordinates, merged like the camera detections with
+    # positions weighted by point count. Confidence grows with the object's
+    # points over both sweeps, counts / (counts + 4 * MIN_CLUSTER_POINTS).
+    # sweeps maps car id to already loaded points (None when missing). plan is
+    # a Tracker.search_plan: only its world search regions are searched.
+    no_points = np.zeros(0, dtype=[('x', 'f4'), ('y', 'f4'), ('z', 'f4')])
+    world = []
+    for car_id in CAR_IDS:
+        location, yaw = car_pose(scene_data, car_id)
+        if sweeps is not None:
+            points = sweeps.get(car_id)
+        else:
+            try:
+                points = load_scene_lidar(scene_data, car_id, base_data_dir)
+            except FileNotFoundError:
+                points = None
+        regions = None
+        if plan is not None:
+            regions = (world_to_local(plan['xy'], location, yaw), plan['radius'])
+        detected = detect_objects(no_points if points is None else points, regions=regions)
+        xy = local_to_world(detected['xy'], location, yaw)
+        rotation = yaw + np.degrees(detected['heading'])
+        # The partner car is not one of the scene's road agents
+        others = [car_pose(scene_data, other)[0] for other in CAR_IDS if other != car_id]
+        valid = np.ones(len(xy), dtype=bool)
+        for other_location in others:
+            valid &= ~((detected['object'] == "Car") &
+                       (np.linalg.norm(xy - other_location, axis=1) <= gates.get("Car", 0.0)))
+        world.append((xy[valid], detected['object'][valid], rotation[valid],
+                      detected['count'][valid].astype(np.float64)))
+
+    (xy_a, classes_a, rot_a, count_a), (xy_b, classes_b, rot_b, count_b) = world
+    merged = merge_cars(xy_a, xy_b, classes_a, classes_b, count_a, count_b, gates)
+    counts = merged['weights'].sum(axis=1)
+    confidence = counts / (counts + MIN_CLUSTER_POINTS * 4)
+    # Heading of the view with more points
+    rotation = heavier_view(merged, rot_a, rot_b)
+    return {'xy': merged['xy'], 'object': merged['object'], 'confidence': confidence,
+            'seen_by': merged['seen_by'], 'rotation': normalize_rotation(rotation)}
+
+
+def normalize_rotation(degrees):
+    # Box headings are symmetric under half turns; report them in (-90, 90]
+    return 90.0 - np.mod(90.0 - np.asarray(degrees), 180.0)
@@ -0,0 +1,475 @@
+import os
+import glob
+import time
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+import cv2
+import torch
+import torchvision
+from fusion.backends import backend_available, depth_backend, detector_backend
+from fusion.frame import as_rgb
+from fusion.timing import span, traced, tracer
+
+PERSON_CLASS = 0
+# COCO classes kept for fusion, mapped to the object names used in data/output
+OBJECT_CLASSES = {0: "Pedestrian", 2: "Car", 5: "Car", 7: "Car"}
+DEPTH_SCALE = 0.05
+# torch.hub repos as owner/name:ref; only checkouts of these refs are loaded
+YOLO_HUB_REPO = "ultralytics/yolov5:v7.0"
+DEPTH_HUB_REPO = "intel-isl/MiDaS:v3_1"
+YOLO_MODEL_ID = "ultralytics/yolov5:yolov5s"
+DEPTH_MODEL_ID = "intel-isl/MiDaS:MiDaS_small"
+# Raw YOLO output columns, one row per box before any thresholding
+RAW_DETECTION_COLUMNS = ('xmin', 'ymin', 'xmax', 'ymax', 'confidence', 'class')
+DEFAULT_WEIGHTS_DIR = "./models"
+DEFAULT_BATCH_SIZE = 4
+DEFAULT_MAX_BATCH_MB = 1024
+# Long side of the MiDaS input (MiDaS_small is trained at 256) and of the YOLO letterbox
+DEFAULT_DEPTH_SIZE = 256
+DEFAULT_DETECTION_SIZE = 640
+# MiDaS input normalization, as in the hub small_transform
+MIDAS_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+MIDAS_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+# Tiled detection: fraction of a tile shared with its neighbours, and the IoU
+# above which a tile box and a full-frame box are the same detection
+TILE_OVERLAP = 0.2
+TILE_NMS_IOU = 0.5
+# Summed-area tables of recently filtered depth maps, so re-filtering at a new
+# threshold does not rebuild them. Only read-only maps are remembered.
+MAX_INTEGRAL_TABLES = 8
+integral_tables = OrderedDict()
+integral_tables_lock = threading.Lock()
+
+
+def image_batch_bytes(img):
+    # Rough working set of one frame in a forward pass: a float32 copy of the
+    # full-resolution frame plus the full-resolution float32 output
+    return img.shape[0] * img.shape[1] * 4 * (3 + 1)
+
+
+def batch_indices(images, batch_size=DEFAULT_BATCH_SIZE, max_batch_bytes=None):
+    # Groups image indices into batches of equal-shaped frames, capped by count and memory
+    by_shape = {}
+    for i, img in enumerate(images):
+        by_shape.setdefault(img.shape, []).append(i)
+
+    for indices in by_shape.values():
+        batch = []
+        batch_bytes = 0
+        for i in indices:
+            size = image_batch_bytes(images[i])
+            over_memory = max_batch_bytes is not None and batch_bytes + size > max_batch_bytes
+            if batch and (len(batch) >= batch_size or over_memory):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(i)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+
+def midas_input_size(image_size, size=DEFAULT_DEPTH_SIZE, multiple=32):
+    # Aspect-preserving (width, height) with the long side at most size, both
+    # rounded to the network stride like the hub's "upper_bound" resize
+    width, height = image_size
+    scale = size / max(width, height)
+
+    def constrain(x):
+        y = int(np.round(x / multiple) * multiple)
+        if y > size:
+            y = int(np.floor(x / multiple) * multiple)
+        return max(multiple, y)
+    return constrain(width * scale), constrain(height * scale)
+
+
+def midas_input(img, size=DEFAULT_DEPTH_SIZE):
+    # (1, 3, H, W) float tensor for MiDaS at the given input size
+    height, width = img.shape[:2]
+    resized = cv2.resize(img, midas_input_size((width, height), size), interpolation=cv2.INTER_CUBIC)
+    normalized = (resized.astype(np.float32) / 255.0 - MIDAS_MEAN) / MIDAS_STD
+    return torch.from_numpy(np.ascontiguousarray(normalized.transpose(2, 0, 1))).unsqueeze(0)
+
+
+def tile_windows(image_size, tiles, overlap=TILE_OVERLAP):
+    # (x0, y0, x1, y1) of a tiles x tiles grid of overlapping windows
+    width, height = image_size
+    tile_w = int(np.ceil(width / (tiles - (tiles - 1) * overlap)))
+    tile_h = int(np.ceil(height / (tiles - (tiles - 1) * overlap)))
+    xs = np.linspace(0, width - tile_w, tiles).astype(int)
+    ys = np.linspace(0, height - tile_h, tiles).astype(int)
+    return [(int(x), int(y), int(x) + tile_w, int(y) + tile_h) for y in ys for x in xs]
+
+
+def merge_tile_detections(boxes_per_window, windows, iou_threshold=TILE_NMS_IOU):
+    # Shifts each window's boxes into frame coordinates and keeps the best box
+    # per object (class-aware NMS), in the raw (N, 6) layout
+    shifted = []
+    for boxes, (x0, y0, _, _) in zip(boxes_per_window, windows):
+        boxes = boxes.copy()
+        boxes[:, [0, 2]] += x0
+        boxes[:, [1, 3]] += y0
+        shifted.append(boxes)
+    merged = np.concatenate(shifted) if shifted else np.zeros((0, 6), dtype=np.float32)
+    if len(merged) == 0:
+        return merged
+    tensor = torch.from_numpy(merged)
+    keep = torchvision.ops.batched_nms(tensor[:, :4], tensor[:, 4], tensor[:, 5].long(), iou_threshold)
+    return merged[keep.numpy()]
+
+
+def hub_checkouts(weights_dir, repo):
+    # torch.hub stores a checkout of owner/name:ref as <owner>_<name>_<ref>,
+    # with any "/" in the ref replaced; returns (pinned path, all checkout names)
+    owner_name, ref = repo.split(':')
+    owner, name = owner_name.split('/')
+    pinned = os.path.join(weights_dir, f"{owner}_{name}_{ref.replace('/', '_')}")
+    found = sorted(os.path.basename(p) for p in glob.glob(os.path.join(weights_dir, f"{owner}_{name}_*"))
+                   if os.path.isdir(p))
+    return pinned, found
+
+
+def find_hub_checkout(weights_dir, repo):
+    # The checkout of exactly the pinned ref, or None when there is none yet.
+    # Checkouts of other refs are never loaded in its place.
+    pinned, _ = hub_checkouts(weights_dir, repo)
+    return pinned if os.path.isdir(pinned) else None
+
+
+def hub_load(repo, model, weights_dir=None, offline=False, **kwargs):
+    # Prefer a pinned local checkout under weights_dir so loading works offline.
+    # Online loads with a weights_dir populate it for the next run. The hub dir
+    # is process-wide, so it only points at weights_dir for this load.
+    if not weights_dir:
+        if offline:
+            raise FileNotFoundError(f"No weights dir to load {repo} from offline")
+        return torch.hub.load(repo, model, **kwargs)
+
+    os.makedirs(weights_dir, exist_ok=True)
+    previous_dir = torch.hub.get_dir()
+    torch.hub.set_dir(os.path.abspath(weights_dir))
+    try:
+        checkout = find_hub_checkout(weights_dir, repo)
+        if checkout:
+            return torch.hub.load(checkout, model, source='local', **kwargs)
+        if offline:
+            _, found = hub_checkouts(weights_dir, repo)
+            others = f"; found {', '.join(found)}" if found else ""
+            raise FileNotFoundError(f"No local checkout of {repo} in {weights_dir}{others}")
+        return torch.hub.load(repo, model, **kwargs)
+    finally:
+        torch.hub.set_dir(previous_dir)
+
+
+def format_load_times(load_times):
+    return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in load_times.items())
+
+
+def model_device(backend):
+    # Exported backends (TorchScript, int8 and ONNX Runtime) target CPU-only deployments
+    return 'cuda' if torch.cuda.is_available() and backend == "eager" else 'cpu'
+
+
+class Perception:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, max_batch_mb=DEFAULT_MAX_BATCH_MB, cache=None,
+                 weights_dir=None, offline=False, use_depth_model=True, depth_size=DEFAULT_DEPTH_SIZE,
+                 detection_size=DEFAULT_DETECTION_SIZE, detection_tiles=1, full_res_depth=False,
+                 backend="eager", export_dir=None):
+        self.backend = backend
+        self.export_dir = export_dir or os.path.join(weights_dir or DEFAULT_WEIGHTS_DIR, "exports")
+        self.device = model_device(backend)
+        self.cache = cache
+        self.weights_dir = weights_dir
+        self.offline = offline
+        self.use_depth_model = use_depth_model
+        self.loader = None
+        self.load_lock = threading.Lock()
+        self.load_errors = []
+        self.load_times = {}
+        self.batch_size = max(1, batch_size)
+        self.max_batch_bytes = max_batch_mb * 1024 * 1024 if max_batch_mb else None
+        # Depth maps stay at model resolution unless full_res_depth; boxes are
+        # mapped onto them instead. detection_tiles > 1 adds an n x n grid of
+        # overlapping crops to the full frame for small, distant objects.
+        self.depth_size = depth_size
+        self.detection_size = detection_size
+        self.detection_tiles = max(1, detection_tiles)
+        self.full_res_depth = full_res_depth
+        self.yolo_model = None
+        self.depth_model = None
+        self.detector = None
+        self.depth_runner = None
+        self.has_yolo = False
+        self.has_depth = False
+
+    def start_loading(self):
+        # Loads models on a background thread; safe to call more than once
+        with self.load_lock:
+            if self.loader is None:
+                self.loader = threading.Thread(target=self.load_all_models, name="model-loader", daemon=True)
+                self.loader.start()
+
+    def wait_for_models(self):
+        self.start_loading()
+        self.loader.join()
+        return self.load_errors
+
+    def is_loaded(self):
+        return self.loader is not None and not self.loader.is_alive()
+
+    def load_models(self):
+        # Returns a list of error messages for models that failed to load
+        return self.wait_for_models()
+
+    def load_all_models(self):
+        # torch.hub puts each repo on sys.path while importing it, and both repos
+        # ship a top-level "utils", so the models are loaded one after the other
+        if not backend_available(self.backend):
+            self.load_errors.append(f"onnxruntime is not installed; falling back from {self.backend!r} "
+                                    f"to the eager backend")
+            self.backend = "eager"
+            self.device = model_device(self.backend)
+        self.load_yolo_model()
+        if self.use_depth_model:
+            self.load_depth_model()
+
+    def load_yolo_model(self):
+        start = time.perf_counter()
+        try:
+            if self.weights_dir:
+                # Pinned weights file; downloaded there on the first online run
+                weights_path = os.path.join(self.weights_dir, "yolov5s.pt")
+                self.yolo_model = hub_load(YOLO_HUB_REPO, 'custom', self.weights_dir, self.offline,
+                                           path=weights_path)
+            else:
+                self.yolo_model = hub_load(YOLO_HUB_REPO, 'yolov5s', offline=self.offline, pretrained=True)
+            self.detector = detector_backend(self.yolo_model, self.backend, self.export_dir)
+            self.has_yolo = True
+        except Exception as e:
+            self.has_yolo = False
+            self.load_errors.append(f"Failed to load YOLO: {e}")
+        self.load_times['yolo'] = time.perf_counter() - start
+        tracer.record("model.load", start, self.load_times['yolo'], {'model': "yolo", 'loaded': self.has_yolo})
+
+    def load_depth_model(self):
+        start = time.perf_counter()
+        try:
+            self.depth_model = hub_load(DEPTH_HUB_REPO, "MiDaS_small", self.weights_dir, self.offline)
+            self.depth_model.to(self.device)
+            self.depth_model.eval()
+            self.depth_runner = depth_backend(self.depth_model, self.backend, self.export_dir)
+            self.load_times['depth'] = time.perf_counter() - start
+            self.has_depth = True
+        except Exception as e:
+            self.has_depth = False
+            self.load_errors.append(f"Failed to load depth model: {e}")
+            self.load_times.setdefault('depth', time.perf_counter() - start)
+        tracer.record("model.load", start, self.load_times['depth'], {'model': "depth", 'loaded': self.has_depth})
+
+    def estimate_depth(self, img):
+        return self.estimate_depth_batch([img])[0]
+
+    @property
+    def depth_model_id(self):
+        # Outputs depend on the input size and output resolution, so both are in the cache key
+        full = "/full" if self.full_res_depth else ""
+        return f"{DEPTH_MODEL_ID}@{self.depth_size}{full}{self.backend_suffix}"
+
+    @property
+    def yolo_model_id(self):
+        tiles = f"/tiles{self.detection_tiles}" if self.detection_tiles > 1 else ""
+        return f"{YOLO_MODEL_ID}@{self.detection_size}{tiles}{self.backend_suffix}"
+
+    @property
+    def backend_suffix(self):
+        # Exported models agree with eager ones only to within the parity tolerances
+        return "" if self.backend == "eager" else f"/{self.backend}"
+
+    def estimate_depth_batch(self, images):
+        depth_maps = self.cached_batch(images, self.depth_model_id, self.run_depth_model)
+        # Shared with the cache and the integral tables of filter_detections
+        for depth_map in depth_maps:
+            depth_map.setflags(write=False)
+        return depth_maps
+
+    def run_depth_model(self, images):
+        # One MiDaS forward pass per batch of equal-sized frames
+        self.wait_for_models()
+        depth_maps = [None] * len(images)
+        for indices in batch_indices(images, self.batch_size, self.max_batch_bytes):
+            with span("depth.transform", frames=len(indices)):
+                input_batch = torch.cat([midas_input(as_rgb(images[i]), self.depth_size)
+                                         for i in indices]).to(self.device)
+            with torch.no_grad():
+                with span("depth.forward", frames=len(indices)):
+                    prediction = self.depth_runner(input_batch)
+                if self.full_res_depth:
+                    with span("depth.interpolate", frames=len(indices)):
+                        prediction = torch.nn.functional.interpolate(
+                            prediction.unsqueeze(1),
+                            size=images[indices[0]].shape[:2],
+                            mode="bicubic",
+                            align_corners=False,
+                        ).squeeze(1)
+                prediction = prediction.cpu().numpy()
+            for depth_map, i in zip(prediction, indices):
+                depth_maps[i] = depth_map
+        return depth_maps
+
+    def detect_raw_batch(self, images):
+        return self.cached_batch(images, self.yolo_model_id, self.run_yolo_model)
+
+    def run_yolo_model(self, images):
+        # YOLOv5 AutoShape letterboxes a list of frames into a single batch tensor
+        # and maps the boxes back to frame coordinates
+        self.wait_for_models()
+        if self.detection_tiles > 1:
+            return [self.run_yolo_tiled(as_rgb(img)) for img in images]
+        detections = [None] * len(images)
+        for indices in batch_indices(images, self.batch_size, self.max_batch_bytes):
+            with span("yolo.forward", frames=len(indices)):
+                boxes = self.detector([as_rgb(images[i]) for i in indices], self.detection_size)
+            for raw, i in zip(boxes, indices):
+                detections[i] = raw
+        return detections
+
+    def run_yolo_tiled(self, img):
+        # Full frame plus overlapping crops (views, not copies) in one batch
+        height, width = img.shape[:2]
+        windows = [(0, 0, width, height)] + tile_windows((width, height), self.detection_tiles)
+        crops = [img[y0:y1, x0:x1] for x0, y0, x1, y1 in windows]
+        with span("yolo.forward", frames=len(crops), tiled=True):
+            boxes = self.detector(crops, self.detection_size)
+        return merge_tile_detections(boxes, windows)
+
+    def detect_persons(self, img, depth_map=None, confidence_threshold=0.5, lidar_projection=None):
+        return self.detect_persons_batch([img], [depth_map], confidence_threshold, [lidar_projection])[0]
+
+    def detect_persons_batch(self, images, depth_maps=None, confidence_threshold=0.5, lidar_projections=None):
+        if depth_maps is None:
+            depth_maps = [None] * len(images)
+        if lidar_projections is None:
+            lidar_projections = [None] * len(images)
+        raw_detections = self.detect_raw_batch(images)
+        return [filter_persons(raw, depth_map, confidence_threshold, projection, image_size(img))
+                for img, raw, depth_map, projection in zip(images, raw_detections, depth_maps, lidar_projections)]
+
+    def cached_batch(self, images, model_id, run_model):
+        # Only frames without a cached output for this model go through run_model
+        if self.cache is None:
+            return run_model(images)
+
+        keys = [self.cache.make_key(model_id, img) for img in images]
+        outputs = [self.cache.get(key) for key in keys]
+        missing = [i for i, output in enumerate(outputs) if output is None]
+        if missing:
+            computed = run_model([images[i] for i in missing])
+            for i, output in zip(missing, computed):
+                self.cache.put(keys[i], output)
+                outputs[i] = output
+        return outputs
+
+
+def image_size(img):
+    # (width, height) of a Frame or array
+    return img.image_size if hasattr(img, 'image_size') else (img.shape[1], img.shape[0])
+
+
+def filter_persons(raw_detections, depth_map=None, confidence_threshold=0.5, lidar_projection=None,
+                   frame_size=None):
+    return filter_detections(raw_detections, depth_map, confidence_threshold, lidar_projection,
+                             (PERSON_CLASS,), frame_size)
+
+
+def integral_table(depth_map):
+    # (H + 1, W + 1) float64 summed-area table, memoized for read-only maps
+    key = id(depth_map)
+    with integral_tables_lock:
+        entry = integral_tables.get(key)
+        if entry is not None and entry[0]() is depth_map:
+            integral_tables.move_to_end(key)
+            return entry[1]
+    table = cv2.integral(np.ascontiguousarray(depth_map, dtype=np.float32), sdepth=cv2.CV_64F)
+    if not depth_map.flags.writeable:
+        with integral_tables_lock:
+            integral_tables[key] = (weakref.ref(depth_map), table)
+            while len(integral_tables) > MAX_INTEGRAL_TABLES:
+                integral_tables.popitem(last=False)
+    return table
+
+
+def box_means(depth_map, boxes, frame_size=None):
+    # Mean of the depth map inside each (x1, y1, x2, y2) frame-coordinate box,
+    # NaN for boxes that miss the map. A summed-area table makes every mean four
+    # lookups, however many or large the boxes. frame_size (width, height) maps
+    # boxes onto a depth map kept at model resolution; None means it matches the frame.
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    height, width = depth_map.shape[:2]
+    scale_x, scale_y = (1.0, 1.0) if frame_size is None else (width / frame_size[0], height / frame_size[1])
+    # Same cells as slicing [int(y1 * sy):int(y2 * sy)] with at least one row and column
+    x0 = np.clip(np.trunc(boxes[:, 0] * scale_x).astype(np.int64), 0, width)
+    y0 = np.clip(np.trunc(boxes[:, 1] * scale_y).astype(np.int64), 0, height)
+    x1 = np.clip(np.maximum(x0 + 1, np.trunc(boxes[:, 2] * scale_x).astype(np.int64)), 0, width)
+    y1 = np.clip(np.maximum(y0 + 1, np.trunc(boxes[:, 3] * scale_y).astype(np.int64)), 0, height)
+    table = integral_table(depth_map)
+    sums = table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+    area = (y1 - y0) * (x1 - x0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(area > 0, sums / area, np.nan)
+
+
+@traced("detections.filter")
+def filter_detections(raw_detections, depth_map=None, confidence_threshold=0.5, lidar_projection=None,
+                      classes=tuple(OBJECT_CLASSES), frame_size=None):
+    # Re-filtering cached raw boxes is all a threshold change needs. Distances
+    # come from in-box LiDAR returns (metres) when a projection is given, and
+    # fall back to the relative MiDaS depth otherwise. All distances are computed
+    # in one vectorized pass; only the output dicts are built per box.
+    keep = np.flatnonzero(np.isin(raw_detections[:, 5], classes) &
+                          (raw_detections[:, 4] >= confidence_threshold))
+    boxes = raw_detections[keep]
+    distances = np.full(len(keep), np.nan)
+    from_lidar = np.zeros(len(keep), dtype=bool)
+    if lidar_projection is not None and len(keep):
+        distances = lidar_projection.box_distances(boxes[:, :4])
+        from_lidar = np.isfinite(distances)
+    if depth_map is not None and not from_lidar.all():
+        distances = np.where(from_lidar, distances, box_means(depth_map, boxes[:, :4], frame_size) * DEPTH_SCALE)
+    sources = np.where(from_lidar, "lidar", "depth")
+    found = np.isfinite(distances)
+
+    detected = []
+    for idx, (x1, y1, x2, y2), conf, class_id, distance, source, has_distance in zip(
+            keep.tolist(), boxes[:, :4].astype(np.int64).tolist(), boxes[:, 4].tolist(),
+            boxes[:, 5].astype(np.int64).tolist(), distances.tolist(), sources.tolist(), found.tolist()):
+        detected.append({
+            'id': idx,
+            'object': OBJECT_CLASSES.get(class_id, str(class_id)),
+            'bbox': (x1, y1, x2, y2),
+            'conf': conf,
+            'distance': f"{distance:.2f}m" if has_distance else "N/A",
+            'distance_val': distance if has_distance else None,
+            'distance_source': source if has_distance else None
+        })
+    return detected
+
+
+@traced("depth.colormap")
+def colorize_depth(depth_map):
+    # RGB visualization, matching the camera frames
+    normalized_depth = (depth_map - depth_map.min()) / (depth_map.max() - depth_map.min())
+    depth_colored = cv2.applyColorMap((normalized_depth * 255).astype(np.uint8), cv2.COLORMAP_PLASMA)
+    return cv2.cvtColor(depth_colored, cv2.COLOR_BGR2RGB, dst=depth_colored)
+
+
+def depth_statistics(depth_map):
+    if depth_map is None:
+        return None
+    return {
+        'min': float(depth_map.min()),
+        'max': float(depth_map.max()),
+        'mean': float(depth_map.mean()),
+        'median': float(np.median(depth_map)),
+    }
@@ -0,0 +1,172 @@
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from fusion.frame import Frame
+from fusion.lidar import load_scene_lidar
+from fusion.projection import load_lidar_projection
+from fusion.registration import corrected_scene
+from fusion.scene import CAR_IDS, load_scene
+from fusion.timing import null_stage
+
+# Scenes each loading stage may run ahead of its consumer; 0 loads inline
+DEFAULT_PREFETCH_DEPTH = 2
+
+
+def prefetch(items, depth=DEFAULT_PREFETCH_DEPTH, name="prefetch"):
+    # Iterates items on a background thread, at most depth items ahead of the
+    # consumer (a bounded queue gives backpressure). Producer exceptions are
+    # re-raised in the consumer; closing the generator stops the producer.
+    if depth <= 0:
+        yield from items
+        return
+    pending = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                pending.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((done, e))
+            return
+        finally:
+            # Stops upstream prefetch threads too when the consumer goes away
+            close = getattr(items, 'close', None)
+            if close is not None:
+                close()
+        put((done, None))
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = pending.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def stage(fn, items, *args):
+    # Applies fn to the value of every (scene path, value, error) item that
+    # has not failed yet; a failure is passed along instead of ending the stream
+    for scene_path, inputs, error in items:
+        if error is None:
+            try:
+                inputs = fn(inputs, *args)
+            except Exception as e:
+                inputs, error = None, e
+        yield scene_path, inputs, error
+
+
+def read_scene_inputs(scene_path, base_data_dir="./data", use_camera=True, timer=None):
+    # Scene JSON plus every car's decoded camera frame (only when a camera model
+    # will look at them)
+    stage_timer = timer.stage if timer is not None else null_stage
+    scene_data = load_scene(scene_path)
+    frames = []
+    for car_id in CAR_IDS if use_camera else ():
+        with stage_timer("image_decode"):
+            frames.append(Frame.from_scene(scene_data, car_id, base_data_dir))
+    return {'path': scene_path, 'scene_data': scene_data, 'frames': frames, 'projections': [], 'sweeps': None}
+
+
+def load_lidar_inputs(inputs, base_data_dir="./data", use_camera=True, timer=None):
+    # Camera runs project each sweep into its frame; LiDAR-only runs read the
+    # sweeps into memory for the detector
+    stage_timer = timer.stage if timer is not None else null_stage
+    scene_data = inputs['scene_data']
+    with stage_timer("lidar_load"):
+        if use_camera:
+            inputs['projections'] = [load_lidar_projection(scene_data, car_id, base_data_dir,
+                                                           image_size=frame.image_size)
+                                     for car_id, frame in zip(CAR_IDS, inputs['frames'])]
+        else:
+            inputs['sweeps'] = {}
+            for car_id in CAR_IDS:
+                try:
+                    inputs['sweeps'][car_id] = np.array(load_scene_lidar(scene_data, car_id, base_data_dir))
+                except FileNotFoundError:
+                    inputs['sweeps'][car_id] = None
+    return inputs
+
+
+def refine_scene_pose(inputs, refiner, base_data_dir="./data", timer=None):
+    # Registers the second car's sweep onto the first car's; everything
+    # downstream (LiDAR detection, fusion) then uses the corrected pose
+    if refiner is None:
+        return inputs
+    stage_timer = timer.stage if timer is not None else null_stage
+    with stage_timer("registration"):
+        try:
+            registration = refiner.register(inputs['scene_data'], base_data_dir, inputs['sweeps'])
+        except FileNotFoundError:
+            return inputs
+    inputs['registration'] = registration
+    inputs['scene_data'] = corrected_scene(inputs['scene_data'], registration)
+    return inputs
+
+
+def load_scene_inputs(scene_path, base_data_dir="./data", use_camera=True, timer=None, refiner=None):
+    # All loading stages inline, for one scene
+    inputs = read_scene_inputs(scene_path, base_data_dir, use_camera, timer)
+    inputs = load_lidar_inputs(inputs, base_data_dir, use_camera, timer)
+    return refine_scene_pose(inputs, refiner, base_data_dir, timer)
+
+
+def scene_input_stream(scene_files, base_data_dir="./data", use_camera=True, timer=None,
+                       depth=DEFAULT_PREFETCH_DEPTH, refiner=None):
+    # Yields (scene path, inputs, error) in order. JSON reads and PNG decodes
+    # run on one thread and LiDAR loads on another, each up to depth scenes
+    # ahead, so both overlap with model inference on the consumer's thread.
+    # Pose refinement runs on the LiDAR thread, in scene order, so each scene
+    # warm-starts from the one before.
+    items = ((scene_path, scene_path, None) for scene_path in scene_files)
+    decoded = prefetch(stage(read_scene_inputs, items, base_data_dir, use_camera, timer), depth, "decode")
+    loaded = stage(load_lidar_inputs, decoded, base_data_dir, use_camera, timer)
+    return prefetch(stage(refine_scene_pose, loaded, refiner, base_data_dir, timer), depth, "lidar-load")
+
+
+class Prefetcher:
+    # Keyed prefetch for interactive use: submit() starts loading on a
+    # background thread, get() returns that result or computes it inline.
+    # At most depth loads are kept; older ones are dropped.
+    def __init__(self, depth=1):
+        self.depth = depth
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self.futures = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        with self.lock:
+            if key in self.futures or self.depth <= 0:
+                return
+            self.futures[key] = self.executor.submit(fn, *args)
+            while len(self.futures) > self.depth:
+                self.futures.popitem(last=False)[1].cancel()
+
+    def get(self, key, fn, *args):
+        with self.lock:
+            future = self.futures.pop(key, None)
+        if future is not None and not future.cancelled():
+            return future.result()
+        return fn(*args)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,39 @@
+import cProfile
+import pstats
+from contextlib import contextmanager
+import torch
+
+PROFILE_MODES = ("cprofile", "torch")
+
+
+@contextmanager
+def profile_session(mode=None, path=None):
+    # Optional whole-run profiler around a block. cprofile writes a .prof file
+    # (snakeviz, pstats) and prints the top functions; torch records operator
+    # timings and writes a Chrome trace. mode=None profiles nothing.
+    if mode is None:
+        yield
+        return
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = path or "profile.prof"
+            profiler.dump_stats(path)
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+            print(f"cProfile stats written to {path}")
+    elif mode == "torch":
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        with torch.profiler.profile(activities=activities, record_shapes=True) as profiler:
+            yield
+        path = path or "torch_trace.json"
+        profiler.export_chrome_trace(path)
+        print(profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=20))
+        print(f"torch.profiler trace written to {path}")
+    else:
+        raise ValueError(f"Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}")
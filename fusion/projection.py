@@ -0,0 +1,108 @@
+import numpy as np
+from fusion.lidar import xyz, scene_lidar_path
+from fusion.spatial import SpatialIndex, load_cloud_index
+from fusion.timing import span
+
+# Camera intrinsics from the README; both cars use the same camera
+FOCAL_LENGTH = 2058.72664
+CAMERA_MATRIX = np.array([
+    [FOCAL_LENGTH, 0.0, 960.0],
+    [0.0, FOCAL_LENGTH, 540.0],
+    [0.0, 0.0, 1.0],
+], dtype=np.float32)
+IMAGE_SIZE = (1920, 1080)
+MIN_DEPTH = 0.5
+# In-box returns further than this behind the nearest one are treated as background
+CLUSTER_GAP = 1.0
+# Grid cell size in pixels for per-box point lookups
+IMAGE_CELL_SIZE = 64
+# Ground-plane distance bands in metres for the viewer's box colours: a person
+# closer than NEAR_DISTANCE is drawn red, closer than CAUTION_DISTANCE orange
+NEAR_DISTANCE = 5.0
+CAUTION_DISTANCE = 10.0
+
+
+def image_coords(points, image_size=IMAGE_SIZE, camera_matrix=CAMERA_MATRIX, min_depth=MIN_DEPTH):
+    # (M, 3) pixel u, v and ground-plane range of the returns that land in the
+    # camera image. The sensor frame is x forward, y right, z up and the camera
+    # sits at the sensor origin looking along +x, so u = cx + fx * y / x and
+    # v = cy - fy * z / x.
+    coords = np.asarray(xyz(points))
+    x, y, z = coords[:, 0], coords[:, 1], coords[:, 2]
+    in_front = x > min_depth
+    x, y, z = x[in_front], y[in_front], z[in_front]
+
+    fx, fy = camera_matrix[0, 0], camera_matrix[1, 1]
+    cx, cy = camera_matrix[0, 2], camera_matrix[1, 2]
+    u = (cx + fx * y / x).astype(np.float32)
+    v = (cy - fy * z / x).astype(np.float32)
+
+    width, height = image_size
+    in_image = (u >= 0) & (u < width) & (v >= 0) & (v < height)
+    # Ground-plane distance from the car, used as the metric object distance
+    return np.column_stack([u[in_image], v[in_image], np.hypot(x[in_image], y[in_image])])
+
+
+class LidarProjection:
+    # LiDAR returns of one car that land in its camera image, indexed by pixel
+    # for per-box lookups. index holds image_coords() of the sweep.
+    def __init__(self, index, image_size=IMAGE_SIZE):
+        self.index = index
+        self.image_size = image_size
+        self.u, self.v, self.range = index.coords.T
+
+    @classmethod
+    def from_points(cls, points, camera_matrix=CAMERA_MATRIX, image_size=IMAGE_SIZE, min_depth=MIN_DEPTH):
+        coords = image_coords(points, image_size, camera_matrix, min_depth)
+        return cls(SpatialIndex(coords, cell_size=IMAGE_CELL_SIZE), image_size)
+
+    def __len__(self):
+        return len(self.u)
+
+    def sparse_depth_image(self):
+        # Nearest return per pixel, 0 where no point projects
+        width, height = self.image_size
+        flat_index = self.v.astype(np.int64) * width + self.u.astype(np.int64)
+        depth_image = np.full(width * height, np.inf, dtype=np.float32)
+        np.minimum.at(depth_image, flat_index, self.range.astype(np.float32))
+        depth_image[np.isinf(depth_image)] = 0.0
+        return depth_image.reshape(height, width)
+
+    def box_distances(self, boxes, cluster_gap=CLUSTER_GAP):
+        # Median range of the nearest cluster of returns inside each (x1, y1, x2, y2)
+        # box, NaN for boxes without returns. Background points that fall inside a
+        # box are further than the object, so only returns within cluster_gap of
+        # the nearest one are kept.
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        distances = np.full(len(boxes), np.nan)
+        if len(boxes) == 0 or len(self) == 0:
+            return distances
+
+        query_ids, point_ids = self.index.range_pairs(boxes[:, :2], boxes[:, 2:])
+        ranges = self.range[point_ids]
+        order = np.lexsort((ranges, query_ids))
+        query_ids = query_ids[order]
+        ranges = ranges[order]
+
+        # Within each box the ranges are sorted, so the cluster is a prefix of the run
+        nearest = ranges[np.searchsorted(query_ids, query_ids)]
+        counts = np.bincount(query_ids[ranges <= nearest + cluster_gap], minlength=len(boxes))
+        starts = np.searchsorted(query_ids, np.arange(len(boxes)))
+
+        found = counts > 0
+        lower = ranges[starts[found] + (counts[found] - 1) // 2]
+        upper = ranges[starts[found] + counts[found] // 2]
+        distances[found] = np.where(counts[found] % 2 == 1, lower, (lower + upper) / 2)
+        return distances
+
+
+def load_lidar_projection(scene_data, car_id, base_data_dir="./data", image_size=IMAGE_SIZE):
+    # None when the scene has no LiDAR sweep for this car. The image-plane
+    # index is cached per sweep, so revisiting a scene does not rebuild it.
+    with span("lidar.projection", car=car_id):
+        try:
+            lidar_path = scene_lidar_path(scene_data, car_id, base_data_dir)
+        except FileNotFoundError:
+            return None
+        index = load_cloud_index(lidar_path, IMAGE_CELL_SIZE, image_coords, (tuple(image_size),))
+        return LidarProjection(index, image_size)
@@ -0,0 +1,291 @@
+import threading
+import weakref
+import numpy as np
+from fusion.fuse import SENSOR_HEIGHT
+from fusion.lidar import load_scene_lidar, scene_lidar_path, xyz
+from fusion.scene import CAR_IDS, car_pose
+from fusion.spatial import load_cloud_index
+from fusion.timing import traced
+
+# Poses in the scene JSON are planar (x, y, yaw), so sweeps are registered in
+# BEV: returns above the road, voxel-averaged, with the correction solved for
+# x, y and yaw only. Voxels are tall, as stacked returns of a facade add
+# nothing to a BEV fit but cost nearest-neighbour candidates.
+REGISTRATION_RANGE = 60.0
+EGO_RADIUS = 3.0
+GROUND_CLEARANCE = 0.3
+VOXEL_SIZE = 0.3
+VOXEL_HEIGHT = 1.5
+# Correspondences are searched within a radius that shrinks from the first to
+# the last value over the iterations, so larger initial errors still converge.
+# Wide early searches use every k-th source point, k the squared radius ratio,
+# which keeps each iteration's candidate pairs about the same.
+MAX_CORRESPONDENCE_DISTANCE = 2.0
+MIN_CORRESPONDENCE_DISTANCE = 0.5
+# Warm-started fits only have to follow the change since the previous scene
+WARM_START_DISTANCE = 1.0
+CORRESPONDENCE_DECAY = 0.7
+# Target neighbours in x/y (any height) used for each point-to-plane normal
+NORMAL_RADIUS = 0.5
+MIN_NORMAL_NEIGHBOURS = 4
+MAX_ITERATIONS = 30
+# Converged once an iteration moves the source less than this (m, degrees)
+TOLERANCE = (5e-3, 2e-2)
+MIN_CORRESPONDENCES = 50
+# A correction is only applied with this share of source points matched
+# (fitness, within MIN_CORRESPONDENCE_DISTANCE) and below these bounds
+MIN_FITNESS = 0.2
+MAX_CORRECTION = (3.0, 5.0)
+ICP_METHODS = ("point_to_point", "point_to_plane")
+
+
+def rigid_transform(dx=0.0, dy=0.0, dyaw=0.0):
+    # Homogeneous 2D transform, rotation in degrees
+    theta = np.radians(dyaw)
+    return np.array([[np.cos(theta), -np.sin(theta), dx],
+                     [np.sin(theta), np.cos(theta), dy],
+                     [0.0, 0.0, 1.0]])
+
+
+def transform_parameters(transform):
+    # (dx, dy, dyaw in degrees) of a rigid_transform
+    return (float(transform[0, 2]), float(transform[1, 2]),
+            float(np.degrees(np.arctan2(transform[1, 0], transform[0, 0]))))
+
+
+def pose_transform(scene_data, car_id):
+    # Car frame to world frame, as fuse.local_to_world applies it
+    location, yaw = car_pose(scene_data, car_id)
+    return rigid_transform(location[0], location[1], yaw)
+
+
+def apply_transform(transform, points):
+    # Moves the x/y of (N, 3) points; heights are unchanged
+    moved = points.copy()
+    moved[:, :2] = points[:, :2] @ transform[:2, :2].T + transform[:2, 2]
+    return moved
+
+
+def voxel_downsample(points, voxel_size=VOXEL_SIZE, voxel_height=VOXEL_HEIGHT):
+    # Centroid of the points in every occupied voxel
+    if len(points) == 0:
+        return points
+    voxels = np.floor(points / [voxel_size, voxel_size, voxel_height]).astype(np.int64)
+    voxels -= voxels.min(axis=0)
+    extent = voxels.max(axis=0) + 1
+    keys = (voxels[:, 0] * extent[1] + voxels[:, 1]) * extent[2] + voxels[:, 2]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    sums = np.column_stack([np.bincount(inverse, points[:, i], len(counts)) for i in range(points.shape[1])])
+    return (sums / counts[:, None]).astype(np.float32)
+
+
+def registration_points(points, transform, max_range=REGISTRATION_RANGE, voxel_size=VOXEL_SIZE):
+    # Returns of one sweep that constrain the pose: above the road, off the ego
+    # car and in range; x/y moved by transform, height above the road
+    local = np.asarray(xyz(points) if points.dtype.names else points, dtype=np.float32)
+    distance = np.hypot(local[:, 0], local[:, 1])
+    keep = (distance > EGO_RADIUS) & (distance <= max_range) & (local[:, 2] > GROUND_CLEARANCE - SENSOR_HEIGHT)
+    local = local[keep]
+    local[:, 2] += SENSOR_HEIGHT
+    return voxel_downsample(apply_transform(transform, local), voxel_size)
+
+
+def sensor_registration_points(points, voxel_size=VOXEL_SIZE):
+    # registration_points() in the sweep's own frame; it does not depend on any
+    # pose, so it is cached with the sweep's index
+    return registration_points(points, np.eye(3), voxel_size=voxel_size)
+
+
+def nearest_neighbours(index, queries, max_distance):
+    # (query ids, point ids, distances) of the nearest indexed point within
+    # max_distance of each query that has one
+    query_ids, point_ids = index.radius_pairs(queries, max_distance)
+    offsets = index.coords[point_ids] - queries[query_ids]
+    distances = np.sqrt(np.einsum('ij,ij->i', offsets, offsets))
+    order = np.lexsort((distances, query_ids))
+    query_ids, point_ids, distances = query_ids[order], point_ids[order], distances[order]
+    first = np.flatnonzero(np.r_[True, query_ids[1:] != query_ids[:-1]]) if len(query_ids) else query_ids
+    return query_ids[first], point_ids[first], distances[first]
+
+
+def bev_normals(index, radius=NORMAL_RADIUS, min_neighbours=MIN_NORMAL_NEIGHBOURS):
+    # Unit x/y normal of every indexed point: the direction of least spread of
+    # its neighbours. NaN where too few neighbours; walls and poles dominate
+    # above the road, so the normal of a facade points away from it.
+    points = index.coords
+    query_ids, point_ids = index.radius_pairs(points[:, :2], radius)
+    counts = np.bincount(query_ids, minlength=len(points)).astype(np.float64)
+    xy = points[point_ids, :2].astype(np.float64)
+    sums = np.column_stack([np.bincount(query_ids, xy[:, i], len(points)) for i in range(2)])
+    products = np.column_stack([np.bincount(query_ids, xy[:, i] * xy[:, j], len(points))
+                                for i, j in ((0, 0), (0, 1), (1, 1))])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = sums / counts[:, None]
+        sxx = products[:, 0] / counts - mean[:, 0] ** 2
+        sxy = products[:, 1] / counts - mean[:, 0] * mean[:, 1]
+        syy = products[:, 2] / counts - mean[:, 1] ** 2
+    # Major axis of the 2x2 covariance at half the angle of (sxx - syy, 2 sxy)
+    major = 0.5 * np.arctan2(2 * sxy, sxx - syy)
+    normals = np.column_stack([-np.sin(major), np.cos(major)])
+    normals[counts < min_neighbours] = np.nan
+    return normals
+
+
+# Point-to-plane normals of the indexes load_cloud_index keeps, dropped along
+# with their index
+_normals_cache = weakref.WeakKeyDictionary()
+_normals_cache_lock = threading.Lock()
+
+
+def target_normals(index):
+    # bev_normals of a shared target index, computed once per index
+    with _normals_cache_lock:
+        normals = _normals_cache.get(index)
+    if normals is None:
+        normals = bev_normals(index)
+        with _normals_cache_lock:
+            _normals_cache[index] = normals
+    return normals
+
+
+def solve_point_to_point(source, target):
+    # Least-squares rotation and translation taking source x/y onto target x/y
+    source_mean, target_mean = source.mean(axis=0), target.mean(axis=0)
+    s, t = source - source_mean, target - target_mean
+    angle = np.arctan2(np.sum(s[:, 0] * t[:, 1] - s[:, 1] * t[:, 0]), np.sum(s[:, 0] * t[:, 0] + s[:, 1] * t[:, 1]))
+    transform = rigid_transform(dyaw=np.degrees(angle))
+    transform[:2, 2] = target_mean - transform[:2, :2] @ source_mean
+    return transform
+
+
+def solve_point_to_plane(source, target, normals):
+    # Small-angle least squares of the distances along the target normals:
+    # (R s + t - d) . n with R linearised about the current estimate
+    rows = np.column_stack([source[:, 0] * normals[:, 1] - source[:, 1] * normals[:, 0], normals])
+    residual = np.einsum('ij,ij->i', target - source, normals)
+    (angle, dx, dy), *_ = np.linalg.lstsq(rows, residual, rcond=None)
+    return rigid_transform(dx, dy, np.degrees(angle))
+
+
+@traced("registration.icp")
+def icp(source, target_index, initial=None, method="point_to_plane", normals=None,
+        max_iterations=MAX_ITERATIONS, start_distance=MAX_CORRESPONDENCE_DISTANCE):
+    # Rigid BEV transform taking source (N, 3) points onto the indexed target,
+    # with its fitness (share of source points within MIN_CORRESPONDENCE_DISTANCE
+    # of the target) and the RMS distance of those points
+    if method not in ICP_METHODS:
+        raise ValueError(f"Unknown ICP method {method!r}, expected one of {ICP_METHODS}")
+    if method == "point_to_plane" and normals is None:
+        normals = bev_normals(target_index)
+    transform = np.eye(3) if initial is None else np.array(initial, dtype=np.float64)
+    converged = False
+    iterations = 0
+    for iterations in range(1, max_iterations + 1):
+        max_distance = max(MIN_CORRESPONDENCE_DISTANCE,
+                           start_distance * CORRESPONDENCE_DECAY ** (iterations - 1))
+        stride = int((max_distance / MIN_CORRESPONDENCE_DISTANCE) ** 2)
+        moved = apply_transform(transform, source[::stride])
+        query_ids, point_ids, _ = nearest_neighbours(target_index, moved, max_distance)
+        if method == "point_to_plane":
+            usable = np.isfinite(normals[point_ids, 0])
+            query_ids, point_ids = query_ids[usable], point_ids[usable]
+        if len(query_ids) < MIN_CORRESPONDENCES:
+            # Too few at a coarse level means too few sampled points: go finer
+            if max_distance > MIN_CORRESPONDENCE_DISTANCE:
+                continue
+            break
+        matched_source = moved[query_ids, :2].astype(np.float64)
+        matched_target = target_index.coords[point_ids, :2].astype(np.float64)
+        if method == "point_to_plane":
+            step = solve_point_to_plane(matched_source, matched_target, normals[point_ids])
+        else:
+            step = solve_point_to_point(matched_source, matched_target)
+        transform = step @ transform
+        dx, dy, dyaw = transform_parameters(step)
+        if np.hypot(dx, dy) < TOLERANCE[0] and abs(dyaw) < TOLERANCE[1] and max_distance == MIN_CORRESPONDENCE_DISTANCE:
+            converged = True
+            break
+
+    _, _, distances = nearest_neighbours(target_index, apply_transform(transform, source), MIN_CORRESPONDENCE_DISTANCE)
+    fitness = len(distances) / max(1, len(source))
+    rmse = float(np.sqrt(np.mean(distances ** 2))) if len(distances) else None
+    return {'transform': transform, 'fitness': fitness, 'rmse': rmse, 'iterations': iterations,
+            'converged': converged}
+
+
+class PoseRefiner:
+    # Registers the second car's sweep onto the first car's, scene by scene.
+    # The world-frame correction of the last accepted scene is the initial
+    # guess for the next one, so a steady pose bias converges in a few
+    # iterations; the first car's pose is kept as the reference.
+    def __init__(self, method="point_to_plane", voxel_size=VOXEL_SIZE, min_fitness=MIN_FITNESS,
+                 max_correction=MAX_CORRECTION):
+        if method not in ICP_METHODS:
+            raise ValueError(f"Unknown ICP method {method!r}, expected one of {ICP_METHODS}")
+        self.method = method
+        self.voxel_size = voxel_size
+        self.min_fitness = min_fitness
+        self.max_correction = max_correction
+        self.reset()
+
+    def reset(self):
+        self.correction = None
+
+    @traced("registration.scene")
+    def register(self, scene_data, base_data_dir="./data", sweeps=None):
+        # The second car's pose correction (dx, dy in world metres, dyaw in
+        # degrees) and the corrected (dx, dy, dyaw) transform from its frame to
+        # the first car's frame, with the ICP fit. sweeps maps car ids to
+        # loaded point clouds; missing ones are read from disk.
+        reference_id, moving_id = CAR_IDS[0], CAR_IDS[1]
+        poses = {car_id: pose_transform(scene_data, car_id) for car_id in (reference_id, moving_id)}
+        # ICP runs in the first car's frame, where its cloud and index are the
+        # same whatever the poses; the correction is kept in world coordinates
+        reference_path = scene_lidar_path(scene_data, reference_id, base_data_dir)
+        target_index = load_cloud_index(reference_path, MIN_CORRESPONDENCE_DISTANCE, sensor_registration_points,
+                                        (self.voxel_size,))
+        to_reference = np.linalg.inv(poses[reference_id])
+        points = (sweeps or {}).get(moving_id)
+        if points is None:
+            points = load_scene_lidar(scene_data, moving_id, base_data_dir)
+        source = registration_points(points, to_reference @ poses[moving_id], voxel_size=self.voxel_size)
+
+        warm = self.correction is not None
+        initial = to_reference @ self.correction @ poses[reference_id] if warm else None
+        normals = target_normals(target_index) if self.method == "point_to_plane" else None
+        fit = icp(source, target_index, initial, self.method, normals,
+                  start_distance=WARM_START_DISTANCE if warm else MAX_CORRESPONDENCE_DISTANCE)
+        correction = poses[reference_id] @ fit['transform'] @ to_reference
+        corrected_pose = correction @ poses[moving_id]
+        dx, dy = corrected_pose[:2, 2] - poses[moving_id][:2, 2]
+        dyaw = transform_parameters(fit['transform'])[2]
+        accepted = bool(fit['fitness'] >= self.min_fitness and np.hypot(dx, dy) <= self.max_correction[0]
+                        and abs(dyaw) <= self.max_correction[1])
+        if accepted:
+            self.correction = correction
+        else:
+            dx, dy, dyaw = 0.0, 0.0, 0.0
+            corrected_pose = poses[moving_id]
+        relative = to_reference @ corrected_pose
+        return {
+            'car': moving_id,
+            'correction': (float(dx), float(dy), float(dyaw)),
+            'relative': transform_parameters(relative),
+            'fitness': fit['fitness'],
+            'rmse': fit['rmse'],
+            'iterations': fit['iterations'],
+            'converged': fit['converged'],
+            'warm_start': warm,
+            'accepted': accepted,
+        }
+
+
+def corrected_scene(scene_data, registration):
+    # Copy of the scene JSON with the registered car's pose corrected
+    car_id = registration['car']
+    dx, dy, dyaw = registration['correction']
+    location = scene_data[f"{car_id}_Location"]
+    corrected = dict(scene_data)
+    corrected[f"{car_id}_Location"] = [location[0] + dx, location[1] + dy, *location[2:]]
+    corrected[f"{car_id}_Rotation"] = scene_data[f"{car_id}_Rotation"] + dyaw
+    return corrected
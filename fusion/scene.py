@@ -0,0 +1,56 @@
+import os
+import glob
+import json
+import numpy as np
+import cv2
+
+CAR_IDS = ("CarA", "CarB")
+
+
+def scan_scene_files(scene_path="./data/input"):
+    return sorted(glob.glob(os.path.join(scene_path, "scene_*.json")))
+
+
+def load_scene(scene_path):
+    with open(scene_path, 'r') as f:
+        return json.load(f)
+
+
+def scene_name(scene_path):
+    return os.path.splitext(os.path.basename(scene_path))[0]
+
+
+def camera_path(scene_data, car_id, base_data_dir="./data"):
+    return os.path.join(base_data_dir, scene_data.get(f"{car_id}_Camera", ""))
+
+
+def read_camera_image(scene_data, car_id, base_data_dir="./data"):
+    # Returns the camera frame as an RGB array, converted in place
+    path = camera_path(scene_data, car_id, base_data_dir)
+    img = cv2.imread(path) if os.path.exists(path) else None
+    if img is None:
+        raise FileNotFoundError(f"{car_id} camera image not found at {path}")
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+
+
+def car_pose(scene_data, car_id):
+    # World (x, y) location and yaw in degrees of a car
+    location = np.asarray(scene_data[f"{car_id}_Location"][:2], dtype=np.float64)
+    return location, float(scene_data[f"{car_id}_Rotation"])
+
+
+def local_to_world(points_xy, location, yaw):
+    # Car frame (x forward, y right) to world frame: world = R(yaw) @ local + location
+    points_xy = np.asarray(points_xy, dtype=np.float64).reshape(-1, 2)
+    theta = np.radians(yaw)
+    rotation = np.array([[np.cos(theta), -np.sin(theta)],
+                         [np.sin(theta), np.cos(theta)]])
+    return points_xy @ rotation.T + location
+
+
+def world_to_local(points_xy, location, yaw):
+    points_xy = np.asarray(points_xy, dtype=np.float64).reshape(-1, 2)
+    theta = np.radians(yaw)
+    rotation = np.array([[np.cos(theta), -np.sin(theta)],
+                         [np.sin(theta), np.cos(theta)]])
+    return (points_xy - location) @ rotation
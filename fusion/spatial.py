@@ -0,0 +1,158 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from fusion.lidar import load_point_cloud, xyz
+
+DEFAULT_CELL_SIZE = 2.0
+INDEX_CACHE_SIZE = 32
+
+
+class SpatialIndex:
+    # Uniform grid over the first two coordinates (BEV x/y, or image u/v).
+    # Points are sorted by cell so every cell is a contiguous run of indices;
+    # only occupied cells are stored, so sparse sweeps stay small. All queries
+    # are batched: candidate (query, point) pairs are generated for the cells a
+    # query overlaps and tested exactly in one vectorized pass.
+    def __init__(self, coords, cell_size=DEFAULT_CELL_SIZE):
+        self.coords = np.asarray(coords, dtype=np.float32)
+        self.cell_size = float(cell_size)
+        plane = self.coords[:, :2]
+        self.origin = plane.min(axis=0) if len(plane) else np.zeros(2, dtype=np.float32)
+        cells = np.floor((plane - self.origin) / self.cell_size).astype(np.int64)
+        self.grid_width = int(cells[:, 0].max()) + 1 if len(cells) else 1
+        self.grid_height = int(cells[:, 1].max()) + 1 if len(cells) else 1
+        cell_ids = cells[:, 0] * self.grid_height + cells[:, 1]
+
+        self.order = np.argsort(cell_ids, kind='stable')
+        sorted_ids = cell_ids[self.order]
+        self.cell_keys, self.cell_starts, self.cell_counts = np.unique(
+            sorted_ids, return_index=True, return_counts=True)
+
+    def __len__(self):
+        return len(self.coords)
+
+    def cell_range(self, lows, highs):
+        lo = np.floor((lows - self.origin) / self.cell_size).astype(np.int64)
+        hi = np.floor((highs - self.origin) / self.cell_size).astype(np.int64)
+        lo = np.maximum(lo, 0)
+        hi = np.minimum(hi, [self.grid_width - 1, self.grid_height - 1])
+        return lo, hi
+
+    def candidate_pairs(self, lows, highs):
+        # (query id, point id) for every point in a cell overlapping [lows, highs]
+        lows = np.asarray(lows, dtype=np.float32).reshape(-1, 2)
+        highs = np.asarray(highs, dtype=np.float32).reshape(-1, 2)
+        if len(self.cell_keys) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        lo, hi = self.cell_range(lows, highs)
+        spans = np.maximum(hi - lo + 1, 0)
+        cells_per_query = spans[:, 0] * spans[:, 1]
+
+        query_of_cell = np.repeat(np.arange(len(lows)), cells_per_query)
+        local = np.arange(len(query_of_cell)) - np.repeat(np.cumsum(cells_per_query) - cells_per_query,
+                                                          cells_per_query)
+        span_y = spans[query_of_cell, 1]
+        cell_x = lo[query_of_cell, 0] + local // np.maximum(span_y, 1)
+        cell_y = lo[query_of_cell, 1] + local % np.maximum(span_y, 1)
+        cell_ids = cell_x * self.grid_height + cell_y
+
+        slot = np.searchsorted(self.cell_keys, cell_ids)
+        slot = np.minimum(slot, len(self.cell_keys) - 1)
+        occupied = self.cell_keys[slot] == cell_ids
+        slot = slot[occupied]
+        query_of_cell = query_of_cell[occupied]
+
+        counts = self.cell_counts[slot]
+        query_ids = np.repeat(query_of_cell, counts)
+        offsets = np.arange(len(query_ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+        point_ids = self.order[np.repeat(self.cell_starts[slot], counts) + offsets]
+        return query_ids, point_ids
+
+    def range_pairs(self, mins, maxs):
+        # Axis-aligned boxes; mins/maxs are (Q, D) with D up to the index dimension
+        mins = np.asarray(mins, dtype=np.float32)
+        maxs = np.asarray(maxs, dtype=np.float32)
+        mins = mins.reshape(-1, mins.shape[-1])
+        maxs = maxs.reshape(-1, maxs.shape[-1])
+        query_ids, point_ids = self.candidate_pairs(mins[:, :2], maxs[:, :2])
+        dims = mins.shape[1]
+        points = self.coords[point_ids, :dims]
+        inside = np.all((points >= mins[query_ids]) & (points <= maxs[query_ids]), axis=1)
+        return query_ids[inside], point_ids[inside]
+
+    def radius_pairs(self, centers, radius):
+        centers = np.asarray(centers, dtype=np.float32)
+        centers = centers.reshape(-1, centers.shape[-1])
+        radius = np.broadcast_to(np.asarray(radius, dtype=np.float32), (len(centers),))
+        reach = radius[:, None]
+        query_ids, point_ids = self.candidate_pairs(centers[:, :2] - reach, centers[:, :2] + reach)
+        dims = centers.shape[1]
+        offsets = self.coords[point_ids, :dims] - centers[query_ids]
+        inside = np.einsum('ij,ij->i', offsets, offsets) <= radius[query_ids] ** 2
+        return query_ids[inside], point_ids[inside]
+
+    def oriented_box_pairs(self, centers, sizes, yaws, z_ranges=None):
+        # BEV boxes given by center (x, y), size (length, width) and yaw in
+        # degrees, as in the scene JSON; z_ranges optionally bounds the height
+        centers = np.asarray(centers, dtype=np.float32).reshape(-1, 2)
+        sizes = np.asarray(sizes, dtype=np.float32).reshape(-1, 2)
+        yaws = np.radians(np.asarray(yaws, dtype=np.float32).reshape(-1))
+        reach = np.hypot(sizes[:, 0], sizes[:, 1])[:, None] / 2
+        query_ids, point_ids = self.candidate_pairs(centers - reach, centers + reach)
+
+        offsets = self.coords[point_ids, :2] - centers[query_ids]
+        cos_yaw = np.cos(yaws)[query_ids]
+        sin_yaw = np.sin(yaws)[query_ids]
+        local_x = offsets[:, 0] * cos_yaw + offsets[:, 1] * sin_yaw
+        local_y = -offsets[:, 0] * sin_yaw + offsets[:, 1] * cos_yaw
+        half = sizes[query_ids] / 2
+        inside = (np.abs(local_x) <= half[:, 0]) & (np.abs(local_y) <= half[:, 1])
+        if z_ranges is not None:
+            z_ranges = np.asarray(z_ranges, dtype=np.float32).reshape(-1, 2)
+            z = self.coords[point_ids, 2]
+            inside &= (z >= z_ranges[query_ids, 0]) & (z <= z_ranges[query_ids, 1])
+        return query_ids[inside], point_ids[inside]
+
+    def query_range(self, mins, maxs):
+        return split_pairs(*self.range_pairs(mins, maxs), count_queries(mins))
+
+    def query_radius(self, centers, radius):
+        return split_pairs(*self.radius_pairs(centers, radius), count_queries(centers))
+
+    def query_oriented_box(self, centers, sizes, yaws, z_ranges=None):
+        return split_pairs(*self.oriented_box_pairs(centers, sizes, yaws, z_ranges), count_queries(centers))
+
+
+def count_queries(values):
+    values = np.asarray(values)
+    return 1 if values.ndim < 2 else len(values)
+
+
+def split_pairs(query_ids, point_ids, num_queries):
+    # Pairs come out grouped by query; returns one index array per query
+    bounds = np.searchsorted(query_ids, np.arange(1, num_queries))
+    return np.split(point_ids, bounds)
+
+
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def load_cloud_index(path, cell_size=DEFAULT_CELL_SIZE, view=xyz, view_args=()):
+    # Index over view(points, *view_args) of a sweep (its x/y/z by default),
+    # built once per file and view and kept in a small LRU. view and view_args
+    # are part of the cache key, so view should be a module-level function.
+    # The indexed coords are shared between callers and must not be modified.
+    key = (os.path.abspath(path), os.path.getmtime(path), cell_size, view, view_args)
+    with _index_cache_lock:
+        if key in _index_cache:
+            _index_cache.move_to_end(key)
+            return _index_cache[key]
+
+    index = SpatialIndex(view(load_point_cloud(path), *view_args), cell_size)
+    with _index_cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
@@ -0,0 +1,255 @@
+import os
+import csv
+import glob
+import time
+import struct
+import zipfile
+import numpy as np
+from fusion.fuse import detection_positions
+from fusion.scene import CAR_IDS, car_pose, local_to_world
+
+# Row columns as (dtype, per-row shape). Strings are dictionary-encoded: scene
+# and object index the chunk's scene_names and object_names, car indexes
+# CAR_NAMES (fused objects come last). Missing values are -1 or NaN.
+COLUMNS = {
+    'scene': (np.int32, ()),
+    'car': (np.int8, ()),
+    'object': (np.int16, ()),
+    'bbox': (np.int32, (4,)),
+    'confidence': (np.float32, ()),
+    'distance': (np.float32, ()),
+    'x': (np.float64, ()),
+    'y': (np.float64, ()),
+}
+CAR_NAMES = (*CAR_IDS, "fused")
+FUSED_CAR = len(CAR_IDS)
+# Rows buffered before a chunk is written, and the longest a scene's rows stay
+# buffered (seconds), so a run that dies midway still leaves its earlier scenes
+DEFAULT_CHUNK_ROWS = 65536
+DEFAULT_FLUSH_INTERVAL = 30.0
+# Size of a zip local file header before its file name and extra field
+ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def result_rows(result, scene_data):
+    # Camera detections of every car and the fused objects of one batch result,
+    # one row each. Detections get the world position fuse_detections gives them.
+    parts = []
+    for car_index, car_id in enumerate(CAR_IDS):
+        detections = result[car_id]['detections']
+        if not detections:
+            continue
+        location, yaw = car_pose(scene_data, car_id)
+        xy = local_to_world(detection_positions(detections), location, yaw)
+        parts.append({
+            'car': np.full(len(detections), car_index),
+            'object': [d['object'] for d in detections],
+            'bbox': [d['bbox'] for d in detections],
+            'confidence': [d['conf'] for d in detections],
+            'distance': [np.nan if d['distance_val'] is None else d['distance_val'] for d in detections],
+            'x': xy[:, 0],
+            'y': xy[:, 1],
+        })
+    objects = result['objects']
+    if objects:
+        parts.append({
+            'car': np.full(len(objects), FUSED_CAR),
+            'object': [o['object'] for o in objects],
+            'bbox': np.full((len(objects), 4), -1),
+            # Objects a tracker reports from its prediction have no confidence
+            'confidence': [o.get('confidence', np.nan) for o in objects],
+            'distance': np.full(len(objects), np.nan),
+            'x': [o['Location'][0] for o in objects],
+            'y': [o['Location'][1] for o in objects],
+        })
+    rows = {}
+    for name in ('car', 'object', 'bbox', 'confidence', 'distance', 'x', 'y'):
+        dtype, shape = COLUMNS[name] if name != 'object' else (object, ())
+        rows[name] = (np.concatenate([np.asarray(p[name], dtype=dtype).reshape(-1, *shape) for p in parts])
+                      if parts else np.zeros((0, *shape), dtype=dtype))
+    return rows
+
+
+def npz_memmap(path):
+    # Every array of an uncompressed .npz, memory-mapped in place: each member
+    # is a stored .npy file whose data starts right after its npy header.
+    # Scalars and empty arrays are read instead.
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: {info.filename} is compressed and cannot be memory-mapped")
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', f.read(ZIP_LOCAL_HEADER_SIZE)[26:30])
+            start = info.header_offset + ZIP_LOCAL_HEADER_SIZE + name_length + extra_length
+            f.seek(start)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-len(".npy")]
+            if not shape or 0 in shape:
+                f.seek(start)
+                arrays[name] = np.lib.format.read_array(f)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+
+def as_list(values):
+    return [values] if isinstance(values, str) else list(values)
+
+
+class ResultStore:
+    # Append-only columnar store of batch results: a folder of uncompressed .npz
+    # chunks that are never rewritten, each tagged with the run that wrote it.
+    # Reads memory-map the chunks, so a filter only pages in the columns it
+    # tests and the rows it returns. Chunks end on scene boundaries.
+    def __init__(self, path, run=None, chunk_rows=DEFAULT_CHUNK_ROWS, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.run = run or time.strftime("%Y%m%d-%H%M%S")
+        self.chunk_rows = chunk_rows
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.pending_rows = 0
+        self.last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, scene, rows):
+        # rows as returned by result_rows(), all for one scene
+        self.pending.append((scene, rows))
+        self.pending_rows += len(rows['x'])
+        if (self.pending_rows >= self.chunk_rows or
+                time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def append_result(self, result, scene_data):
+        self.append(result['scene'], result_rows(result, scene_data))
+
+    def flush(self):
+        # Writes the buffered rows as one new chunk; the name sorts in write order
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return None
+        scene_names = np.array(sorted({scene for scene, _ in self.pending}), dtype=str)
+        object_names = np.array(sorted({str(o) for _, rows in self.pending for o in rows['object']}), dtype=str)
+        columns = {'scene': np.concatenate([np.full(len(rows['x']), np.searchsorted(scene_names, scene))
+                                            for scene, rows in self.pending])}
+        for name in ('car', 'object', 'bbox', 'confidence', 'distance', 'x', 'y'):
+            columns[name] = np.concatenate([rows[name] for _, rows in self.pending])
+        columns['object'] = np.searchsorted(object_names, columns['object'].astype(str))
+        for name, (dtype, shape) in COLUMNS.items():
+            columns[name] = np.ascontiguousarray(columns[name], dtype=dtype).reshape(-1, *shape)
+
+        os.makedirs(self.path, exist_ok=True)
+        chunk_path = os.path.join(self.path, f"chunk-{time.time_ns():020d}-{os.getpid()}.npz")
+        tmp_path = f"{chunk_path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, run=np.array(self.run), scene_names=scene_names, object_names=object_names, **columns)
+            os.replace(tmp_path, chunk_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.pending = []
+        self.pending_rows = 0
+        return chunk_path
+
+    def close(self):
+        self.flush()
+
+    def chunk_paths(self):
+        return sorted(glob.glob(os.path.join(self.path, "chunk-*.npz")))
+
+    def read(self, columns=None, run=None, scene=None, car=None, object=None, where=None):
+        # Rows matching every given filter, one array per column, with run,
+        # scene, car and object decoded to strings. run, scene, car and object
+        # take a value or a list; chunks holding none of them are skipped without
+        # reading their rows. where takes a chunk's memory-mapped columns
+        # (scene, car and object still encoded) and returns a boolean row mask.
+        columns = list(columns or ('run', *COLUMNS))
+        parts = {name: [] for name in columns}
+        for chunk_path in self.chunk_paths():
+            chunk = npz_memmap(chunk_path)
+            chunk_run = str(chunk['run'])
+            if run is not None and chunk_run not in as_list(run):
+                continue
+            mask = np.ones(len(chunk['x']), dtype=bool)
+            filters = (('scene', chunk['scene_names'], scene), ('object', chunk['object_names'], object),
+                       ('car', np.array(CAR_NAMES), car))
+            skip = False
+            for name, names, values in filters:
+                if values is None:
+                    continue
+                wanted = np.flatnonzero(np.isin(names, as_list(values)))
+                skip = len(wanted) == 0
+                if skip:
+                    break
+                mask &= np.isin(chunk[name], wanted)
+            if skip:
+                continue
+            if where is not None:
+                mask &= np.asarray(where(chunk), dtype=bool)
+            rows = np.flatnonzero(mask)
+            for name in columns:
+                if name == 'run':
+                    parts[name].append(np.full(len(rows), chunk_run))
+                    continue
+                values = np.asarray(chunk[name][rows])
+                if name in ('scene', 'object'):
+                    values = chunk[f"{name}_names"][values]
+                elif name == 'car':
+                    values = np.array(CAR_NAMES)[values]
+                parts[name].append(values)
+
+        result = {}
+        for name in columns:
+            if parts[name]:
+                result[name] = np.concatenate(parts[name])
+            else:
+                dtype, shape = COLUMNS.get(name, (str, ()))
+                result[name] = np.zeros((0, *shape), dtype=str if name in ('run', 'scene', 'car', 'object')
+                                        else dtype)
+        return result
+
+
+def run_query(store, run=None, scene=None, car=None, object=None, min_confidence=None, max_distance=None,
+              csv_path=None):
+    # Prints row counts per car and class for the matching rows, optionally
+    # writing the rows themselves to CSV
+    def where(chunk):
+        mask = np.ones(len(chunk['x']), dtype=bool)
+        if min_confidence is not None:
+            mask &= chunk['confidence'] >= min_confidence
+        if max_distance is not None:
+            mask &= chunk['distance'] <= max_distance
+        return mask
+
+    start = time.perf_counter()
+    rows = store.read(run=run, scene=scene, car=car, object=object, where=where)
+    elapsed = time.perf_counter() - start
+    print(f"{len(rows['x'])} rows from {len(np.unique(rows['scene']))} scenes and "
+          f"{len(np.unique(rows['run']))} runs in {elapsed * 1000:.1f} ms")
+    for car_name in CAR_NAMES:
+        for name in np.unique(rows['object']):
+            count = int(((rows['car'] == car_name) & (rows['object'] == name)).sum())
+            if count:
+                print(f"  {car_name} {name}: {count}")
+    if csv_path:
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['run', 'scene', 'car', 'object', 'x1', 'y1', 'x2', 'y2', 'confidence', 'distance',
+                             'x', 'y'])
+            for i in range(len(rows['x'])):
+                writer.writerow([rows['run'][i], rows['scene'][i], rows['car'][i], rows['object'][i],
+                                 *rows['bbox'][i].tolist(), rows['confidence'][i], rows['distance'][i],
+                                 rows['x'][i], rows['y'][i]])
+        print(f"Rows written to {csv_path}")
+    return rows
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import resource
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager
+
+# Most recent spans kept in memory; older ones are dropped
+DEFAULT_SPAN_CAPACITY = 100000
+
+
+class SpanRecorder:
+    # In-process ring buffer of timed spans (name, start, duration, process,
+    # thread, args). Recording is a perf_counter pair and a deque append, cheap enough
+    # to leave on around every pipeline stage.
+    def __init__(self, capacity=DEFAULT_SPAN_CAPACITY):
+        self.spans = deque(maxlen=capacity)
+        self.enabled = True
+        self.origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name, **args):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - start, args)
+
+    def traced(self, name=None):
+        # Decorator form of span(), named after the function by default
+        def decorate(fn):
+            span_name = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def record(self, name, start, duration, args=None):
+        self.spans.append((name, start, duration, os.getpid(), threading.get_ident(), args or None))
+
+    def extend(self, spans):
+        # Spans recorded by another process, e.g. a batch worker. perf_counter is
+        # the system-wide monotonic clock on Linux, so start times line up.
+        self.spans.extend(spans)
+
+    def snapshot(self):
+        return list(self.spans)
+
+    def clear(self):
+        self.spans.clear()
+
+    def summary(self):
+        timer = StageTimer()
+        for name, _, duration, _, _, _ in self.snapshot():
+            timer.add(name, duration)
+        return timer.report()
+
+    def export_jsonl(self, path):
+        # One JSON object per span, times in seconds since the recorder started
+        with open(path, 'w') as f:
+            for name, start, duration, pid, thread_id, args in self.snapshot():
+                f.write(json.dumps({'name': name, 'start_s': start - self.origin, 'duration_s': duration,
+                                    'pid': pid, 'tid': thread_id, 'args': args}) + "\n")
+        return path
+
+    def export_chrome_trace(self, path):
+        # Complete ("X") events in microseconds; open in chrome://tracing or Perfetto
+        events = [{'name': name, 'ph': "X", 'ts': (start - self.origin) * 1e6, 'dur': duration * 1e6,
+                   'pid': pid, 'tid': thread_id, 'args': args or {}}
+                  for name, start, duration, pid, thread_id, args in self.snapshot()]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': "ms"}, f)
+        return path
+
+    def export(self, path):
+        # Format from the extension: .jsonl for JSON lines, anything else Chrome trace
+        if path.endswith(".jsonl"):
+            return self.export_jsonl(path)
+        return self.export_chrome_trace(path)
+
+
+# Process-wide recorder used by the pipeline, the batch CLI and the viewer
+tracer = SpanRecorder()
+span = tracer.span
+traced = tracer.traced
+
+
+class StageTimer:
+    # Accumulates wall-clock time per named pipeline stage. Stages may run on
+    # prefetch threads, so totals overlap and updates take a lock.
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # Worker processes send their timers back to the parent
+        return {'totals': self.totals, 'counts': self.counts}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.totals, self.counts = state['totals'], state['counts']
+
+    @contextmanager
+    def stage(self, name):
+        # Also recorded as a span, so stage totals and traces line up
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.add(name, duration)
+            if tracer.enabled:
+                tracer.record(name, start, duration)
+
+    def add(self, name, seconds):
+        with self.lock:
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def merge(self, other):
+        # Folds in the stages of a timer that ran elsewhere (e.g. a worker process)
+        with self.lock:
+            for name, total in other.totals.items():
+                self.totals[name] = self.totals.get(name, 0.0) + total
+                self.counts[name] = self.counts.get(name, 0) + other.counts[name]
+
+    def report(self):
+        return {
+            name: {
+                'total_s': total,
+                'count': self.counts[name],
+                'mean_ms': 1000.0 * total / self.counts[name],
+            }
+            for name, total in self.totals.items()
+        }
+
+
+@contextmanager
+def null_stage(name):
+    yield
+
+
+def peak_memory_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
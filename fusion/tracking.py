@@ -0,0 +1,209 @@
+import numpy as np
+from fusion.fuse import mutual_nearest_matches
+from fusion.timing import traced
+
+# Constant-velocity model in world x/y with one step per scene. Noise terms are
+# standard deviations: unmodelled acceleration (m/step²), position measurement
+# (m) and the speed of a newly seen object (m/step).
+PROCESS_NOISE = {"Car": 1.5, "Pedestrian": 0.5}
+MEASUREMENT_NOISE = {"Car": 2.0, "Pedestrian": 0.7}
+INITIAL_SPEED = {"Car": 3.0, "Pedestrian": 1.0}
+# 99% chi-square quantile for 2 degrees of freedom: the Mahalanobis gate around
+# each predicted position in which a detection may update the track
+GATE_CHI2 = 9.21
+# A track is confirmed after this many updates and dropped after this many
+# scenes without one. With max_coast > 0, confirmed tracks are reported from
+# their prediction for up to that many missed scenes instead of needing a
+# detection every scene; off by default, as it also keeps persistent false
+# positives alive.
+CONFIRM_HITS = 2
+MAX_MISSES = 3
+DEFAULT_MAX_COAST = 0
+# Detection feedback: with a keyframe interval N > 1, only every Nth scene is
+# searched in full. The scenes in between are searched only within the gate
+# around each prediction, widened by the object's half length so its whole
+# cluster falls inside. Tracks updated STABLE_HITS times, the last time in the
+# previous scene, whose predicted position is within STABLE_SPREAD measurement
+# standard deviations are not searched at all. They are reported at their
+# prediction. Their covariance then grows past the limit, so a stable track is
+# skipped for at most one scene in a row.
+DEFAULT_KEYFRAME_INTERVAL = 1
+STABLE_HITS = 4
+STABLE_SPREAD = 1.6
+SEARCH_MARGIN = {"Car": 3.0, "Pedestrian": 1.0}
+
+
+def transition(dt):
+    return np.array([[1.0, 0.0, dt, 0.0],
+                     [0.0, 1.0, 0.0, dt],
+                     [0.0, 0.0, 1.0, 0.0],
+                     [0.0, 0.0, 0.0, 1.0]])
+
+
+def process_covariance(dt, accel_std):
+    # Piecewise-constant white acceleration, one (4, 4) matrix per track
+    g = np.array([[dt * dt / 2, 0.0], [0.0, dt * dt / 2], [dt, 0.0], [0.0, dt]])
+    return (g @ g.T)[None] * (np.asarray(accel_std, dtype=np.float64) ** 2)[:, None, None]
+
+
+def class_values(table, classes):
+    return np.array([table.get(c, max(table.values())) for c in classes], dtype=np.float64)
+
+
+class Tracker:
+    # Multi-object tracker over successive scenes of the same place. All tracks
+    # are predicted, gated and updated together as (N, 4) states and (N, 4, 4)
+    # covariances; detections are assigned to tracks by mutual nearest
+    # Mahalanobis distance within the gate, as fuse.associate does across cars.
+    def __init__(self, max_coast=DEFAULT_MAX_COAST, max_misses=MAX_MISSES, confirm_hits=CONFIRM_HITS,
+                 gate=GATE_CHI2, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        self.max_coast = max_coast
+        self.max_misses = max(max_misses, max_coast)
+        self.confirm_hits = confirm_hits
+        self.gate = gate
+        self.keyframe_interval = keyframe_interval
+        self.next_id = 1
+        self.reset()
+
+    def reset(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.classes = np.zeros(0, dtype=object)
+        self.state = np.zeros((0, 4))
+        self.covariance = np.zeros((0, 4, 4))
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+        self.rotation = np.zeros(0)
+        self.dimension = []
+        # Scenes searched only around the predictions since the last full search
+        self.since_keyframe = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def confirmed(self):
+        return self.hits >= self.confirm_hits
+
+    def predict(self, dt=1.0):
+        f = transition(dt)
+        self.state = self.state @ f.T
+        self.covariance = f @ self.covariance @ f.T + process_covariance(dt, class_values(PROCESS_NOISE, self.classes))
+
+    def innovation_covariance(self, covariance):
+        noise = class_values(MEASUREMENT_NOISE, self.classes) ** 2
+        return covariance[:, :2, :2] + noise[:, None, None] * np.eye(2)
+
+    def gating(self, xy, classes):
+        # Squared Mahalanobis distance of every detection to every predicted
+        # position, inf outside the gate or across classes; plus innovations
+        # and inverse innovation covariances for the update
+        innovation_cov = self.innovation_covariance(self.covariance)
+        inverse = np.linalg.inv(innovation_cov)
+        innovation = xy[None, :, :] - self.state[:, None, :2]
+        distance = np.einsum('tdi,tij,tdj->td', innovation, inverse, innovation)
+        distance[(self.classes[:, None] != classes[None, :]) | ~(distance <= self.gate)] = np.inf
+        return distance, innovation, inverse
+
+    def search_plan(self, dt=1.0):
+        # Where detection has to look in the next scene, from the predictions
+        # without advancing the tracks. None means a full search (keyframes, or
+        # nothing tracked yet); otherwise world 'xy' and 'radius' of the search
+        # regions and the ids of the stable tracks that are 'skipped'. Plain
+        # lists, so the plan can be stored with the scene's result.
+        if (len(self) == 0 or self.since_keyframe is None or
+                self.since_keyframe + 1 >= self.keyframe_interval):
+            return None
+        f = transition(dt)
+        xy = (self.state @ f.T)[:, :2]
+        covariance = f @ self.covariance @ f.T + process_covariance(dt, class_values(PROCESS_NOISE, self.classes))
+        spread = np.sqrt(np.linalg.eigvalsh(covariance[:, :2, :2])[:, -1])
+        stable = (self.confirmed & (self.hits >= STABLE_HITS) & (self.misses == 0) &
+                  (spread <= STABLE_SPREAD * class_values(MEASUREMENT_NOISE, self.classes)))
+        gate_radius = np.sqrt(self.gate * np.linalg.eigvalsh(self.innovation_covariance(covariance))[:, -1])
+        radius = gate_radius + class_values(SEARCH_MARGIN, self.classes)
+        return {
+            'xy': xy[~stable].tolist(),
+            'radius': radius[~stable].tolist(),
+            'skipped': self.ids[stable].tolist(),
+        }
+
+    @traced("tracking.update")
+    def update(self, objects, dt=1.0, plan=None):
+        # Takes the fused objects of the next scene (output schema) and returns
+        # them with a "track_id", followed by confirmed tracks that were missed
+        # this scene at their predicted position ("predicted": True). plan is
+        # the search_plan the scene was detected with: its skipped tracks are
+        # reported at their prediction without counting a miss.
+        xy = np.array([o['Location'][:2] for o in objects], dtype=np.float64).reshape(-1, 2)
+        classes = np.array([o['object'] for o in objects], dtype=object)
+        skipped = np.isin(self.ids, plan['skipped'] if plan is not None else [])
+        self.since_keyframe = 0 if plan is None else self.since_keyframe + 1
+        self.predict(dt)
+
+        matches = np.zeros((0, 2), dtype=np.int64)
+        if len(self) and len(objects):
+            distance, innovation, inverse = self.gating(xy, classes)
+            matches = mutual_nearest_matches(distance)
+            t, d = matches[:, 0], matches[:, 1]
+            # Kalman update of all matched tracks at once; H selects x and y
+            gain = self.covariance[t][:, :, :2] @ inverse[t]
+            self.state[t] += np.einsum('mij,mj->mi', gain, innovation[t, d])
+            self.covariance[t] -= gain @ self.covariance[t][:, :2, :]
+
+        track_matched = np.zeros(len(self), dtype=bool)
+        track_matched[matches[:, 0]] = True
+        self.hits[track_matched] += 1
+        self.misses[track_matched] = 0
+        self.misses[~track_matched & ~skipped] += 1
+        track_of = np.full(len(objects), -1, dtype=np.int64)
+        track_of[matches[:, 1]] = matches[:, 0]
+        for t, d in matches:
+            self.rotation[t] = objects[d].get('Rotation', 0.0)
+            self.dimension[t] = objects[d].get('Dimension')
+
+        coasting = ~track_matched & self.confirmed & ((self.misses <= self.max_coast) | skipped)
+        coasted = [{
+            "object": str(self.classes[t]),
+            "Location": [float(self.state[t, 0]), float(self.state[t, 1])],
+            "Rotation": float(self.rotation[t]),
+            "Dimension": self.dimension[t],
+            "track_id": int(self.ids[t]),
+            "predicted": True,
+        } for t in np.flatnonzero(coasting)]
+
+        track_ids = np.zeros(len(objects), dtype=np.int64)
+        track_ids[matches[:, 1]] = self.ids[matches[:, 0]]
+        new = np.flatnonzero(track_of < 0)
+        track_ids[new] = self.start_tracks(xy[new], classes[new], [objects[d] for d in new])
+        self.drop_lost()
+
+        tracked = [dict(obj, track_id=int(track_id)) for obj, track_id in zip(objects, track_ids)]
+        return tracked + coasted
+
+    def start_tracks(self, xy, classes, objects):
+        ids = np.arange(self.next_id, self.next_id + len(xy), dtype=np.int64)
+        self.next_id += len(xy)
+        position_var = class_values(MEASUREMENT_NOISE, classes) ** 2
+        speed_var = class_values(INITIAL_SPEED, classes) ** 2
+        covariance = np.zeros((len(xy), 4, 4))
+        covariance[:, [0, 1], [0, 1]] = position_var[:, None]
+        covariance[:, [2, 3], [2, 3]] = speed_var[:, None]
+
+        self.ids = np.concatenate([self.ids, ids])
+        self.classes = np.concatenate([self.classes, classes])
+        self.state = np.concatenate([self.state, np.column_stack([xy, np.zeros((len(xy), 2))])])
+        self.covariance = np.concatenate([self.covariance, covariance])
+        self.hits = np.concatenate([self.hits, np.ones(len(xy), dtype=np.int64)])
+        self.misses = np.concatenate([self.misses, np.zeros(len(xy), dtype=np.int64)])
+        self.rotation = np.concatenate([self.rotation, [o.get('Rotation', 0.0) for o in objects]])
+        self.dimension.extend(o.get('Dimension') for o in objects)
+        return ids
+
+    def drop_lost(self):
+        keep = self.misses <= self.max_misses
+        if keep.all():
+            return
+        self.ids, self.classes, self.state = self.ids[keep], self.classes[keep], self.state[keep]
+        self.covariance, self.hits, self.misses = self.covariance[keep], self.hits[keep], self.misses[keep]
+        self.rotation = self.rotation[keep]
+        self.dimension = [d for d, k in zip(self.dimension, keep) if k]
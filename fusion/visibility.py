@@ -0,0 +1,177 @@
+import numpy as np
+from fusion.bev import BEV_RESOLUTION, BEV_MAX_RANGE, OBSTACLE_HEIGHT, rasterize, scene_world_points
+from fusion.fuse import OBJECT_DIMENSIONS, associate
+from fusion.evaluate import EVAL_GATES
+from fusion.projection import CAMERA_MATRIX
+from fusion.scene import CAR_IDS, car_pose, world_to_local
+from fusion.timing import traced
+
+VISIBLE = "visible"
+PARTIALLY_OCCLUDED = "partially_occluded"
+FULLY_OCCLUDED = "fully_occluded"
+OUT_OF_RANGE = "out_of_range"
+# Share of an agent's sight lines that must be clear for it to count as
+# visible; at or below OCCLUDED_FRACTION it is fully occluded
+VISIBLE_FRACTION = 0.8
+OCCLUDED_FRACTION = 0.0
+# LiDAR occluders: obstacle cells a sight line must cross to count as blocked,
+# and clearance around the sensor (own car body) and the target (its own returns)
+MIN_OCCLUDER_CELLS = 2
+SENSOR_CLEARANCE = 3.0
+TARGET_CLEARANCE = 0.5
+
+
+def footprint_corners(xy, dimensions, rotations):
+    # (N, 4, 2) BEV corners of N oriented footprints, in evaluate.box_corners order
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    half = np.asarray(dimensions, dtype=np.float64).reshape(-1, 2) / 2
+    signs = np.array([[1, 1], [-1, 1], [-1, -1], [1, -1]], dtype=np.float64)
+    local = signs[None] * half[:, None, :]
+    theta = np.radians(np.asarray(rotations, dtype=np.float64))
+    cos, sin = np.cos(theta)[:, None], np.sin(theta)[:, None]
+    return np.stack([local[..., 0] * cos - local[..., 1] * sin,
+                     local[..., 0] * sin + local[..., 1] * cos], axis=2) + xy[:, None, :]
+
+
+def sight_targets(xy, corners):
+    # (N, 9, 2) points an observer must see on each footprint: centre, corners
+    # and edge midpoints, so a partly hidden agent keeps some clear lines
+    midpoints = (corners + np.roll(corners, -1, axis=1)) / 2
+    return np.concatenate([xy[:, None, :], corners, midpoints], axis=1)
+
+
+def segments_hit(origin, targets, starts, ends):
+    # (R, S) whether the sight line origin -> targets[r] crosses segment s
+    # strictly before reaching the target; all pairs in one broadcast
+    ray = targets - origin
+    edge = ends - starts
+    offset = starts[None, :, :] - origin
+    denom = ray[:, None, 0] * edge[None, :, 1] - ray[:, None, 1] * edge[None, :, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (offset[..., 0] * edge[None, :, 1] - offset[..., 1] * edge[None, :, 0]) / denom
+        u = (offset[..., 0] * ray[:, None, 1] - offset[..., 1] * ray[:, None, 0]) / denom
+    return (np.abs(denom) > 1e-12) & (t > 0.0) & (t < 1.0 - 1e-9) & (u >= 0.0) & (u <= 1.0)
+
+
+def lidar_blocked(grid, obstacles, origin, targets, target_clearance, resolution=BEV_RESOLUTION):
+    # (R,) whether each sight line crosses at least MIN_OCCLUDER_CELLS obstacle
+    # cells of the observer's own sweep, marched at the grid resolution for all
+    # lines at once; samples next to the sensor or the target are ignored
+    lengths = np.linalg.norm(targets - origin, axis=1)
+    steps = np.arange(0.0, max(float(lengths.max(initial=0.0)), resolution), resolution)
+    distance = steps[None, :]
+    valid = (distance > SENSOR_CLEARANCE) & (distance < lengths[:, None] - target_clearance[:, None])
+    direction = (targets - origin) / np.maximum(lengths, 1e-9)[:, None]
+    samples = origin + direction[:, None, :] * distance[..., None]
+    hits = grid.lookup(obstacles, samples.reshape(-1, 2), fill=False).reshape(valid.shape) & valid
+    return hits.sum(axis=1) >= MIN_OCCLUDER_CELLS
+
+
+def agent_arrays(agents):
+    xy = np.array([a['Location'][:2] for a in agents], dtype=np.float64).reshape(-1, 2)
+    dimensions = np.array([a.get('Dimension', OBJECT_DIMENSIONS.get(a['object']))[:2] for a in agents],
+                          dtype=np.float64).reshape(-1, 2)
+    rotations = np.array([a.get('Rotation', 0.0) for a in agents], dtype=np.float64)
+    return xy, dimensions, rotations
+
+
+def car_visibility(scene_data, car_id, agents, grid=None, max_range=BEV_MAX_RANGE, camera_matrix=CAMERA_MATRIX):
+    # Visibility of each agent (data/output schema) from one car: the share of
+    # its sight lines blocked neither by another footprint (agents and the
+    # partner car) nor, when a BEV grid of the car's own sweep is given, by
+    # LiDAR obstacles. Also whether the agent's centre is in the camera's view.
+    location, yaw = car_pose(scene_data, car_id)
+    xy, dimensions, rotations = agent_arrays(agents)
+    num_agents = len(xy)
+    if num_agents == 0:
+        return {'fraction': np.zeros(0), 'label': np.zeros(0, dtype=object), 'in_camera_view': np.zeros(0, bool)}
+
+    # Occluders: every agent plus the other cars, which are not in data/output
+    others = [car_pose(scene_data, other) for other in CAR_IDS if other != car_id]
+    occluder_xy = np.concatenate([xy, [pose[0] for pose in others]]).reshape(-1, 2)
+    occluder_dims = np.concatenate([dimensions, [OBJECT_DIMENSIONS["Car"][:2]] * len(others)]).reshape(-1, 2)
+    occluder_rot = np.concatenate([rotations, [pose[1] for pose in others]])
+    corners = footprint_corners(occluder_xy, occluder_dims, occluder_rot)
+    starts = corners.reshape(-1, 2)
+    ends = np.roll(corners, -1, axis=1).reshape(-1, 2)
+    segment_owner = np.repeat(np.arange(len(corners)), 4)
+
+    targets = sight_targets(xy, corners[:num_agents])
+    samples_per_agent = targets.shape[1]
+    targets = targets.reshape(-1, 2)
+    target_owner = np.repeat(np.arange(num_agents), samples_per_agent)
+
+    # An agent never hides itself; its own far side is still part of it
+    blocked = segments_hit(location, targets, starts, ends)
+    blocked &= segment_owner[None, :] != target_owner[:, None]
+    blocked = blocked.any(axis=1)
+    if grid is not None:
+        clearance = np.linalg.norm(dimensions, axis=1) / 2 + TARGET_CLEARANCE
+        blocked |= lidar_blocked(grid, grid.obstacle_mask(OBSTACLE_HEIGHT), location, targets,
+                                 clearance[target_owner], grid.resolution)
+    fraction = 1.0 - blocked.reshape(num_agents, samples_per_agent).mean(axis=1)
+
+    in_range = np.linalg.norm(xy - location, axis=1) <= max_range
+    label = np.where(fraction >= VISIBLE_FRACTION, VISIBLE,
+                     np.where(fraction <= OCCLUDED_FRACTION, FULLY_OCCLUDED, PARTIALLY_OCCLUDED)).astype(object)
+    label[~in_range] = OUT_OF_RANGE
+
+    local = world_to_local(xy, location, yaw)
+    half_fov = np.arctan2(camera_matrix[0, 2], camera_matrix[0, 0])
+    in_camera_view = (local[:, 0] > 0) & (np.abs(np.arctan2(local[:, 1], local[:, 0])) <= half_fov) & in_range
+    return {'fraction': fraction, 'label': label, 'in_camera_view': in_camera_view}
+
+
+@traced("visibility.scene")
+def scene_visibility(scene_data, agents, base_data_dir="./data", use_lidar=True, resolution=BEV_RESOLUTION,
+                     max_range=BEV_MAX_RANGE):
+    # car_visibility for every car; with use_lidar each car's own sweep adds
+    # occluders that are not agents (buildings, parked objects, vegetation)
+    visibility = {}
+    for car_id in CAR_IDS:
+        grid = None
+        if use_lidar:
+            points, intensity, _ = scene_world_points(scene_data, base_data_dir, (car_id,), max_range)
+            if len(points):
+                grid = rasterize(points, intensity, resolution=resolution)
+        visibility[car_id] = car_visibility(scene_data, car_id, agents, grid, max_range)
+    return visibility
+
+
+def visibility_groups(visibility):
+    # Per agent: seen (visible or partly) by every car ("all"), by one car
+    # only (its id), or by none ("none")
+    seen = np.column_stack([np.isin(visibility[car_id]['label'], (VISIBLE, PARTIALLY_OCCLUDED))
+                            for car_id in CAR_IDS])
+    groups = np.full(len(seen), "none", dtype=object)
+    groups[seen.all(axis=1)] = "all"
+    single = seen.sum(axis=1) == 1
+    groups[single] = np.array(CAR_IDS, dtype=object)[np.argmax(seen[single], axis=1)]
+    return groups
+
+
+def recall_by_visibility(predicted, ground_truth, visibility, gates=EVAL_GATES):
+    # How many ground-truth agents the fused output found, split by which cars
+    # could see them. Agents only one car sees are what fusion has to recover.
+    groups = visibility_groups(visibility)
+    pred_xy, _, _ = agent_arrays(predicted)
+    gt_xy, _, _ = agent_arrays(ground_truth)
+    matches = associate(pred_xy, gt_xy, [o['object'] for o in predicted], [o['object'] for o in ground_truth],
+                        gates)
+    found = np.zeros(len(ground_truth), dtype=bool)
+    found[matches[:, 1]] = True
+    return {group: {'agents': int((groups == group).sum()), 'found': int(found[groups == group].sum())}
+            for group in ("all", *CAR_IDS, "none")}
+
+
+def summarize_visibility(scene_recalls):
+    # Sums recall_by_visibility() outputs over scenes and adds each group's recall
+    totals = {}
+    for recalls in scene_recalls:
+        for group, counts in recalls.items():
+            total = totals.setdefault(group, {'agents': 0, 'found': 0})
+            total['agents'] += counts['agents']
+            total['found'] += counts['found']
+    for total in totals.values():
+        total['recall'] = total['found'] / total['agents'] if total['agents'] else None
+    return totals
@@ -0,0 +1,112 @@
+import threading
+from collections import OrderedDict
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, key, fn, args, kwargs):
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+        self.progress = ""
+        self.result = None
+        self.error = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def report(self, progress):
+        # Called by the job function between stages; stops stale jobs early
+        if self.cancelled:
+            raise JobCancelled()
+        self.progress = progress
+
+
+class InferenceWorker:
+    # Runs model work on a background thread. At most one job per key is
+    # queued: submitting a new job cancels the older queued or running one.
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = OrderedDict()
+        self.running = None
+        self.finished = []
+        self.stopped = False
+        self.thread = threading.Thread(target=self.work_loop, name="inference-worker", daemon=True)
+        self.thread.start()
+
+    def submit(self, key, fn, *args, **kwargs):
+        job = Job(key, fn, args, kwargs)
+        with self.condition:
+            self.cancel_locked(key)
+            self.pending[key] = job
+            self.condition.notify()
+        return job
+
+    def cancel(self, key):
+        with self.condition:
+            self.cancel_locked(key)
+
+    def cancel_locked(self, key):
+        stale = self.pending.pop(key, None)
+        if stale is not None:
+            stale.cancel()
+        if self.running is not None and self.running.key == key:
+            self.running.cancel()
+
+    def poll(self):
+        # Completed, non-cancelled jobs in completion order; call from the UI thread
+        with self.condition:
+            finished, self.finished = self.finished, []
+        return [job for job in finished if not job.cancelled]
+
+    def is_busy(self, key=None):
+        with self.condition:
+            if key is None:
+                return bool(self.pending) or self.running is not None
+            return key in self.pending or (self.running is not None and self.running.key == key)
+
+    def has_work(self):
+        # True while jobs are queued, running, or finished but not yet polled
+        with self.condition:
+            return bool(self.pending) or self.running is not None or bool(self.finished)
+
+    def progress(self):
+        with self.condition:
+            return self.running.progress if self.running is not None else ""
+
+    def work_loop(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                _, job = self.pending.popitem(last=False)
+                self.running = job
+
+            try:
+                job.result = job.fn(job, *job.args, **job.kwargs)
+            except JobCancelled:
+                pass
+            except Exception as e:
+                job.error = e
+
+            with self.condition:
+                self.running = None
+                if not job.cancelled:
+                    self.finished.append(job)
+
+    def shutdown(self):
+        with self.condition:
+            for job in self.pending.values():
+                job.cancel()
+            self.pending.clear()
+            if self.running is not None:
+                self.running.cancel()
+            self.stopped = True
+            self.condition.notify()
@@ -0,0 +1,85 @@
+import numpy as np
+import cv2
+
+# YOLOv5 AutoShape defaults, reproduced for exported detectors
+YOLO_CONFIDENCE = 0.25
+YOLO_IOU = 0.45
+YOLO_MAX_DETECTIONS = 1000
+YOLO_STRIDE = 32
+LETTERBOX_FILL = 114
+
+
+def letterbox_shape(images, size, stride=YOLO_STRIDE):
+    # Common (height, width) of a batch, as AutoShape computes it: each frame
+    # scaled to size on its long side, then the largest extent rounded up to the stride
+    height = max(img.shape[0] * size / max(img.shape[:2]) for img in images)
+    width = max(img.shape[1] * size / max(img.shape[:2]) for img in images)
+    return int(np.ceil(height / stride) * stride), int(np.ceil(width / stride) * stride)
+
+
+def letterbox(img, shape):
+    # Aspect-preserving resize into shape, centred on a grey border; returns
+    # the padded image, the scale and the (x, y) padding
+    height, width = img.shape[:2]
+    gain = min(shape[0] / height, shape[1] / width)
+    new_w, new_h = int(round(width * gain)), int(round(height * gain))
+    pad_x, pad_y = (shape[1] - new_w) / 2, (shape[0] - new_h) / 2
+    resized = img
+    if (new_w, new_h) != (width, height):
+        resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    padded = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                                value=(LETTERBOX_FILL,) * 3)
+    return padded, gain, (pad_x, pad_y)
+
+
+def unletterbox(boxes, gain, pad, image_shape):
+    # xyxy boxes in letterboxed pixels back to the frame letterbox() was given,
+    # clipped to its (height, width)
+    boxes = np.array(boxes, dtype=np.float32)
+    pad_x, pad_y = pad
+    boxes[:, [0, 2]] = np.clip((boxes[:, [0, 2]] - pad_x) / gain, 0, image_shape[1])
+    boxes[:, [1, 3]] = np.clip((boxes[:, [1, 3]] - pad_y) / gain, 0, image_shape[0])
+    return boxes
+
+
+def box_iou(a, b):
+    # Pairwise IoU of (N, 4) and (M, 4) xyxy boxes
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:4] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:4] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def batched_nms(boxes, scores, classes, iou_threshold):
+    # Indices of the boxes kept by greedy per-class NMS, highest score first,
+    # like torchvision.ops.batched_nms: boxes of different classes are moved
+    # apart so they never overlap
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = classes.astype(np.float64) * (float(boxes.max()) + 1.0)
+    boxes = boxes.astype(np.float64) + offsets[:, None]
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+    while len(order):
+        best, order = order[0], order[1:]
+        keep.append(best)
+        order = order[box_iou(boxes[best, None], boxes[order])[0] <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def yolo_nms(prediction, confidence=YOLO_CONFIDENCE, iou_threshold=YOLO_IOU, max_detections=YOLO_MAX_DETECTIONS):
+    # (N, 5 + classes) raw rows of one image to (M, 6) xyxy, confidence, class
+    prediction = np.asarray(prediction, dtype=np.float32)
+    prediction = prediction[prediction[:, 4] > confidence]
+    scores = prediction[:, 5:] * prediction[:, 4:5]
+    classes = scores.argmax(axis=1)
+    best = scores[np.arange(len(scores)), classes]
+    keep = best > confidence
+    xywh, best, classes = prediction[keep, :4], best[keep], classes[keep]
+    boxes = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+    keep = batched_nms(boxes, best, classes, iou_threshold)[:max_detections]
+    return np.column_stack([boxes[keep], best[keep], classes[keep]]).astype(np.float32)
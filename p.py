@@ -3,6 +3,7 @@ import json
 import glob
 import pygame
 import sys
+from ui.redraw import RedrawScheduler
 
 class Slider:
     def __init__(self, x, y, width, min_val, max_val, initial_val, label, color=(200, 200, 200)):
@@ -19,6 +20,12 @@ class Slider:
         
         self.update_knob_pos()
     
+    @property
+    def bounds(self):
+        # Track, knob and the value label above it
+        return pygame.Rect(self.x - self.knob_radius, self.y - 30,
+                           self.width + 2 * self.knob_radius, 30 + self.knob_radius)
+    
     def update_knob_pos(self):
         val_range = self.max_val - self.min_val
         val_percent = (self.value - self.min_val) / val_range
@@ -69,6 +76,11 @@ class Checkbox:
         self.size = 16
         self.rect = pygame.Rect(x, y, self.size, self.size)
     
+    @property
+    def bounds(self):
+        # Box plus the label next to it, up to the next checkbox column
+        return pygame.Rect(self.x, self.y, 200, self.size + 4)
+    
     def draw(self, screen, font):
         pygame.draw.rect(screen, self.color, self.rect, 2)
         
@@ -175,25 +187,15 @@ def visualize_car_locations(all_json_data):
     show_labels = True
     
     clock = pygame.time.Clock()
+    redraw = RedrawScheduler(screen)
+    # Everything above the control panel is redrawn when the data view changes
+    map_rect = pygame.Rect(0, 0, screen_width, screen_height - 250)
+    params_rect = pygame.Rect(400, screen_height - 250 + 10, screen_width - 400, 45)
+    title_font = pygame.font.Font(None, 30)
+    scaled_background = None
     
-    while running:
-        need_update = False
-        
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE:
-                    show_labels = not show_labels
-            
-            for slider in sliders:
-                if slider.handle_event(event):
-                    need_update = True
-            
-            for checkbox in file_checkboxes:
-                if checkbox.handle_event(event):
-                    need_update = True
-        
+    def draw():
+        nonlocal scaled_background
         scale_x = sliders[0].value
         scale_y = sliders[1].value
         offset_x = sliders[2].value
@@ -203,9 +205,11 @@ def visualize_car_locations(all_json_data):
         
         screen.fill((0, 0, 0))
         
+        # The background is only rescaled when the image scale sliders move
         scaled_width = int(background.get_width() * image_scale_x)
         scaled_height = int(background.get_height() * image_scale_y)
-        scaled_background = pygame.transform.scale(background, (scaled_width, scaled_height))
+        if scaled_background is None or scaled_background.get_size() != (scaled_width, scaled_height):
+            scaled_background = pygame.transform.scale(background, (scaled_width, scaled_height))
         
         screen.blit(scaled_background, (0, 0))
         
@@ -231,7 +235,6 @@ def visualize_car_locations(all_json_data):
         
         pygame.draw.rect(screen, (40, 40, 40), (0, screen_height - 250, screen_width, 250))
         
-        title_font = pygame.font.Font(None, 30)
         title_text = title_font.render("Adjustment Controls (Press SPACE to toggle labels)", True, (200, 200, 200))
         screen.blit(title_text, (50, screen_height - 250 + 10))
         
@@ -255,9 +258,31 @@ def visualize_car_locations(all_json_data):
         
         for checkbox in file_checkboxes:
             checkbox.draw(screen, font)
+    
+    while running:
+        # Blocks until input arrives; nothing is redrawn unless a control changed
+        for event in redraw.events():
+            redraw.handle_event(event)
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    show_labels = not show_labels
+                    redraw.mark_dirty(map_rect)
+            
+            for slider in sliders:
+                if slider.handle_event(event):
+                    redraw.mark_dirty(map_rect)
+                    redraw.mark_dirty(params_rect)
+                    redraw.mark_dirty(slider.bounds)
+            
+            for checkbox in file_checkboxes:
+                if checkbox.handle_event(event):
+                    redraw.mark_dirty(map_rect)
+                    redraw.mark_dirty(checkbox.bounds)
         
-        pygame.display.flip()
-        clock.tick(60)
+        if running and redraw.redraw(draw):
+            clock.tick(60)
     
     pygame.quit()
     sys.exit()
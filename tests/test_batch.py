@@ -0,0 +1,79 @@
+import os
+import json
+import shutil
+import pytest
+
+pytest.importorskip("torch")
+from fusion.batch import (create_perception, iter_scene_groups, iter_scene_groups_parallel, run_batch,  # noqa: E402
+                          split_scene_groups, split_worker_shards, write_result)
+from fusion.scene import scan_scene_files, scene_name  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "data")
+INPUT_DIR = os.path.join(DATA_DIR, "input")
+
+
+def scene_names(groups):
+    return [scene_name(p) for paths, _, _ in groups for p in paths]
+
+
+def test_groups_and_shards_keep_scene_order():
+    scenes = [f"scene_{i:03d}.json" for i in range(7)]
+    groups = split_scene_groups(scenes, batch_size=4)
+    assert groups == [scenes[0:2], scenes[2:4], scenes[4:6], scenes[6:7]]
+    shards = split_worker_shards(groups * 3, workers=2)
+    assert [group for shard in shards for group in shard] == groups * 3
+    assert [len(shard) for shard in shards] == [2] * 6
+    assert split_worker_shards(groups[:1], workers=4) == [groups[:1]]
+
+
+def test_scene_groups_in_order():
+    scene_files = scan_scene_files(INPUT_DIR)
+    perception = create_perception(batch_size=4, lidar_only=True)
+    missing = os.path.join(INPUT_DIR, "scene_missing.json")
+    scene_files = scene_files[:3] + [missing] + scene_files[3:6]
+    groups = list(iter_scene_groups(perception, scene_files, DATA_DIR, batch_size=4, prefetch_depth=2))
+
+    # A scene that fails to load is reported alone and ends the group before it
+    assert [[scene_name(p) for p in paths] for paths, _, _ in groups] == [
+        ["scene_001", "scene_002"], ["scene_003"], ["scene_missing"], ["scene_004", "scene_005"], ["scene_006"]]
+    assert [error is not None for _, _, error in groups] == [False, False, True, False, False]
+    for paths, results, error in groups:
+        if error is None:
+            assert [result['scene'] for result in results] == [scene_name(p) for p in paths]
+
+
+def test_workers_match_a_single_process():
+    scene_files = scan_scene_files(INPUT_DIR)[:6]
+    perception = create_perception(batch_size=2, lidar_only=True)
+    serial = list(iter_scene_groups(perception, scene_files, DATA_DIR, batch_size=2))
+    parallel = list(iter_scene_groups_parallel(scene_files, DATA_DIR, {'batch_size': 2, 'lidar_only': True},
+                                               workers=2, threads_per_worker=1, prefetch_depth=2))
+    assert scene_names(parallel) == scene_names(serial) == [scene_name(p) for p in scene_files]
+    for (_, serial_results, _), (_, parallel_results, error) in zip(serial, parallel):
+        assert error is None
+        assert [r['objects'] for r in parallel_results] == [r['objects'] for r in serial_results]
+
+
+def test_resume_skips_finished_scenes(tmp_path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for scene_path in scan_scene_files(INPUT_DIR)[:4]:
+        shutil.copy(scene_path, input_dir)
+    out_dir = str(tmp_path / "out")
+    os.makedirs(out_dir)
+    for scene in ("scene_001", "scene_003"):
+        write_result({'scene': scene, 'objects': []}, out_dir)
+
+    results = run_batch(str(input_dir), out_dir, base_data_dir=DATA_DIR, lidar_only=True, resume=True)
+    assert [result['scene'] for result in results] == ["scene_002", "scene_004"]
+    # Finished scenes are left as they were
+    with open(os.path.join(out_dir, "scene_001.json")) as f:
+        assert json.load(f) == {'scene': "scene_001", 'objects': []}
+    assert run_batch(str(input_dir), out_dir, base_data_dir=DATA_DIR, lidar_only=True, resume=True) == []
+
+
+def test_ordered_options_rejected_with_workers(tmp_path):
+    with pytest.raises(ValueError):
+        run_batch(INPUT_DIR, str(tmp_path), lidar_only=True, workers=2, refine_poses=True)
+    with pytest.raises(ValueError):
+        run_batch(INPUT_DIR, str(tmp_path), lidar_only=True, workers=2, track=True, keyframe_interval=3)
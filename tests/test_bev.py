@@ -0,0 +1,74 @@
+import glob
+import os
+import numpy as np
+from fusion.bev import OBSTACLE_HEIGHT, build_scene_bev, rasterize
+from fusion.scene import load_scene
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "data")
+
+
+def naive_rasterize(points, intensity, sources, resolution, bounds, num_sources):
+    x_min, y_min, x_max, y_max = bounds
+    width = int(np.ceil((x_max - x_min) / resolution))
+    height = int(np.ceil((y_max - y_min) / resolution))
+    count = np.zeros((height, width), dtype=np.int32)
+    source_count = np.zeros((num_sources, height, width), dtype=np.int32)
+    max_height = np.full((height, width), np.nan)
+    min_height = np.full((height, width), np.nan)
+    intensity_sum = np.zeros((height, width))
+    for (x, y, z), value, source in zip(points, intensity, sources):
+        col = int(np.floor((x - x_min) / resolution))
+        row = int(np.floor((y - y_min) / resolution))
+        if not (0 <= row < height and 0 <= col < width):
+            continue
+        count[row, col] += 1
+        source_count[source, row, col] += 1
+        max_height[row, col] = np.fmax(max_height[row, col], z)
+        min_height[row, col] = np.fmin(min_height[row, col], z)
+        intensity_sum[row, col] += value
+    return count, source_count, max_height, min_height, intensity_sum
+
+
+def test_rasterize_matches_per_point_loop():
+    rng = np.random.default_rng(0)
+    points = rng.uniform([-5, -3, -0.5], [5, 4, 3], (2000, 3)).astype(np.float32)
+    intensity = rng.uniform(0, 1, 2000).astype(np.float32)
+    sources = rng.integers(0, 2, 2000)
+    bounds = (-4.0, -2.0, 4.0, 3.0)
+
+    grid = rasterize(points, intensity, sources, resolution=0.5, bounds=bounds, num_sources=2)
+    count, source_count, max_height, min_height, intensity_sum = naive_rasterize(
+        points, intensity, sources, 0.5, bounds, 2)
+    assert grid.shape == (10, 16)
+    np.testing.assert_array_equal(grid.count, count)
+    np.testing.assert_array_equal(grid.source_count, source_count)
+    np.testing.assert_array_equal(grid.max_height, max_height)
+    np.testing.assert_array_equal(grid.min_height, min_height)
+    np.testing.assert_allclose(grid.intensity_sum, intensity_sum, rtol=1e-5)
+    np.testing.assert_array_equal(grid.obstacle_mask(), max_height > OBSTACLE_HEIGHT)
+
+
+def test_cell_lookup():
+    points = np.array([[0.1, 0.1, 1.0], [1.9, 0.1, 0.0], [0.1, 1.1, 2.0]], dtype=np.float32)
+    grid = rasterize(points, resolution=1.0, bounds=(0.0, 0.0, 2.0, 2.0))
+    rows, cols, inside = grid.world_to_cell([[0.5, 0.5], [1.5, 1.5], [-0.5, 0.5]])
+    assert rows[:2].tolist() == [0, 1] and cols[:2].tolist() == [0, 1]
+    assert inside.tolist() == [True, True, False]
+    np.testing.assert_array_equal(grid.cell_centers([0, 1], [1, 0]), [[1.5, 0.5], [0.5, 1.5]])
+    assert grid.lookup(grid.count, [[0.5, 0.5], [1.5, 1.5], [5.0, 5.0]], fill=-1).tolist() == [1, 0, -1]
+    assert grid.lookup(grid.max_height, [[0.5, 1.5]])[0] == 2.0
+
+
+def test_empty_points():
+    grid = rasterize(np.zeros((0, 3), dtype=np.float32), resolution=0.5)
+    assert grid.shape == (1, 1)
+    assert grid.count.sum() == 0
+    assert np.isnan(grid.max_height).all()
+
+
+def test_scene_bev_keeps_both_cars():
+    scene_path = sorted(glob.glob(os.path.join(DATA_DIR, "input", "scene_*.json")))[0]
+    grid = build_scene_bev(load_scene(scene_path), DATA_DIR)
+    assert grid.source_count.shape[0] == 2
+    assert (grid.source_count.reshape(2, -1).sum(axis=1) > 0).all()
+    np.testing.assert_array_equal(grid.source_count.sum(axis=0), grid.count)
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+import pytest
+from fusion.cache import ResultCache
+
+
+def image(value):
+    return np.full((4, 6, 3), value, dtype=np.uint8)
+
+
+def output(value, size=1024):
+    # float32, so each output takes size * 4 bytes
+    return np.full(size, value, dtype=np.float32)
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_cache_mb=0.01)
+    keys = [cache.make_key("yolo", image(i)) for i in range(3)]
+    cache.put(keys[0], output(0))
+    cache.put(keys[1], output(1))
+    # Touching the first entry makes the second the least recently used
+    assert cache.get(keys[0])[0] == 0
+    cache.put(keys[2], output(2))
+    assert list(cache.entries) == [keys[0], keys[2]]
+    assert cache.total_bytes == 2 * output(0).nbytes
+    assert cache.get(keys[1]) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # An entry larger than the whole budget is still kept, alone
+    cache.put("large", output(3, size=8192))
+    assert list(cache.entries) == ["large"]
+
+
+def test_disk_tier_hits(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    key = ResultCache().make_key("intel-isl/MiDaS:v3_1", image(7))
+    ResultCache(cache_dir).put(key, output(7))
+    assert os.listdir(cache_dir) == [f"{key}.npy"]
+
+    # A new process starts with an empty memory tier and reads the file
+    cache = ResultCache(cache_dir)
+    np.testing.assert_array_equal(cache.get(key), output(7))
+    assert key in cache.entries and (cache.hits, cache.misses) == (1, 0)
+    # Later hits come from memory even when the file is gone
+    os.remove(os.path.join(cache_dir, f"{key}.npy"))
+    np.testing.assert_array_equal(cache.get(key), output(7))
+    cache.clear()
+    assert cache.get(key) is None and cache.misses == 1
+
+
+def test_unreadable_files_are_misses(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = cache.make_key("yolo", image(1))
+    (tmp_path / f"{key}.npy").write_bytes(b"truncated")
+    assert cache.get(key) is None and cache.misses == 1
+
+
+def test_keys_follow_model_and_image():
+    cache = ResultCache()
+    key = cache.make_key("yolov5s@640", image(1))
+    assert cache.make_key("yolov5s@640", image(1)) == key
+    assert cache.make_key("yolov5s@1280", image(1)) != key
+    assert cache.make_key("yolov5s@640", image(2)) != key
+    assert "/" not in cache.make_key("ultralytics/yolov5:v7.0", image(1))
+
+
+def test_config_changes_invalidate_outputs(tmp_path):
+    pytest.importorskip("torch")
+    from fusion.perception import Perception
+
+    calls = []
+
+    def run_model(images):
+        calls.append(len(images))
+        return [output(len(calls)) for _ in images]
+
+    cache = ResultCache(str(tmp_path))
+    images = [image(1), image(2)]
+    perception = Perception(cache=cache, depth_size=256)
+    perception.cached_batch(images, perception.depth_model_id, run_model)
+    perception.cached_batch(images, perception.depth_model_id, run_model)
+    assert calls == [2]
+
+    # Another input size, output resolution or backend gives other outputs
+    for options in ({'depth_size': 384}, {'depth_size': 256, 'full_res_depth': True},
+                    {'depth_size': 256, 'backend': "onnx"}):
+        other = Perception(cache=cache, **options)
+        assert other.depth_model_id != perception.depth_model_id
+        other.cached_batch(images, other.depth_model_id, run_model)
+    assert calls == [2, 2, 2, 2]
+    assert Perception(detection_tiles=2).yolo_model_id != Perception().yolo_model_id
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from fusion.evaluate import box_corners, bev_iou, clip_polygon, evaluate_scene, polygon_area, summarize
+
+
+def agent(name, x, y, rotation=0.0, dimension=(4.0, 2.0, 1.5)):
+    return {"object": name, "Location": [x, y], "Rotation": rotation, "Dimension": list(dimension)}
+
+
+def test_box_corners():
+    corners = box_corners([10.0, 5.0], [4.0, 2.0, 1.5], 90.0)
+    # Length along y after a quarter turn, counter-clockwise from the front left
+    np.testing.assert_allclose(corners, [[9.0, 7.0], [9.0, 3.0], [11.0, 3.0], [11.0, 7.0]], atol=1e-9)
+    assert polygon_area(corners) == pytest.approx(8.0)
+
+
+def test_clip_polygon():
+    square = np.array([[0.0, 0.0], [2.0, 0.0], [2.0, 2.0], [0.0, 2.0]])
+    np.testing.assert_allclose(polygon_area(clip_polygon(square, square + 1.0)), 1.0)
+    assert len(clip_polygon(square, square + 5.0)) == 0
+    # A square inside the clip is returned unchanged
+    np.testing.assert_allclose(clip_polygon(square * 0.5 + 0.5, square), square * 0.5 + 0.5)
+
+
+def test_bev_iou_known_overlaps():
+    box = agent("Car", 0.0, 0.0)
+    assert bev_iou(box, box) == pytest.approx(1.0)
+    # Shifted by half its length: overlap 2 x 2 = 4 out of a union of 12
+    assert bev_iou(box, agent("Car", 2.0, 0.0)) == pytest.approx(4.0 / 12.0)
+    assert bev_iou(box, agent("Car", 10.0, 0.0)) == 0.0
+    # A 2 x 2 square turned by 45 degrees over a 2 x 2 square: an octagon
+    square = agent("Pedestrian", 0.0, 0.0, dimension=(2.0, 2.0, 1.0))
+    turned = agent("Pedestrian", 0.0, 0.0, rotation=45.0, dimension=(2.0, 2.0, 1.0))
+    octagon = 8.0 * (np.sqrt(2.0) - 1.0)
+    assert bev_iou(square, turned) == pytest.approx(octagon / (8.0 - octagon))
+
+
+def test_evaluate_scene_counts():
+    ground_truth = [agent("Car", 0.0, 0.0), agent("Car", 20.0, 0.0), agent("Pedestrian", 5.0, 5.0),
+                    agent("Pedestrian", 30.0, 30.0, dimension=(0.5, 0.5, 1.7))]
+    predicted = [
+        # Matched car 1 m off, pedestrian within its gate
+        agent("Car", 1.0, 0.0),
+        agent("Pedestrian", 5.5, 5.0),
+        # Nothing there, and a car where only a pedestrian is
+        agent("Car", -40.0, 0.0),
+        agent("Car", 30.0, 30.0),
+    ]
+    metrics = evaluate_scene(predicted, ground_truth)
+    assert {name: (m['tp'], m['fp'], m['fn']) for name, m in metrics.items()} == {
+        "Car": (1, 2, 1), "Pedestrian": (1, 0, 1)}
+    np.testing.assert_allclose(metrics["Car"]['center_errors'], [1.0])
+    np.testing.assert_allclose(metrics["Car"]['ious'], [3.0 * 2.0 / (16.0 - 6.0)])
+
+    summary = summarize([metrics, evaluate_scene([], [agent("Car", 0.0, 0.0)])])
+    assert (summary['tp'], summary['fp'], summary['fn']) == (2, 2, 3)
+    assert summary['precision'] == pytest.approx(0.5)
+    assert summary['recall'] == pytest.approx(0.4)
+    assert summary['mean_center_error'] == pytest.approx(0.75)
+    assert summary['per_class']["Car"]['recall'] == pytest.approx(1.0 / 3.0)
+    assert summary['per_class']["Pedestrian"]['precision'] == pytest.approx(1.0)
+
+
+def test_empty_summary():
+    summary = summarize([evaluate_scene([], [])])
+    assert summary['precision'] == 0.0 and summary['recall'] == 0.0
+    assert summary['mean_center_error'] is None and summary['mean_bev_iou'] is None
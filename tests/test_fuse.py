@@ -0,0 +1,118 @@
+import numpy as np
+from fusion.fuse import (OBJECT_DIMENSIONS, SENSOR_HEIGHT, detection_positions, fuse_detections, fuse_scene,
+                         heavier_view, merge_cars, mutual_nearest_matches)
+from fusion.projection import CAMERA_MATRIX
+from fusion.scene import world_to_local
+
+SCENE = {
+    "CarA_Location": [0.0, 0.0, 0.0], "CarA_Rotation": 0.0,
+    "CarB_Location": [30.0, 20.0, 0.0], "CarB_Rotation": -90.0,
+}
+
+
+def detection(scene_data, car_id, world_xy, name="Pedestrian", conf=0.9, lidar=True):
+    # Camera detection whose LiDAR range and box put its centre at world_xy
+    location = scene_data[f"{car_id}_Location"][:2]
+    local = world_to_local(world_xy, location, scene_data[f"{car_id}_Rotation"])[0]
+    bearing = np.arctan2(local[1], local[0])
+    u = CAMERA_MATRIX[0, 2] + CAMERA_MATRIX[0, 0] * np.tan(bearing)
+    distance = np.hypot(*local) - min(OBJECT_DIMENSIONS[name][:2]) / 2
+    return {'bbox': [u - 10, 500, u + 10, 600], 'object': name, 'conf': conf,
+            'distance_val': distance if lidar else None, 'distance_source': "lidar" if lidar else None}
+
+
+def test_detection_positions_from_lidar_range():
+    target = np.array([[12.0, -3.0]])
+    positions = detection_positions([detection(SCENE, "CarA", target)])
+    np.testing.assert_allclose(positions, target, atol=1e-6)
+
+
+def test_detection_positions_from_ground_plane():
+    fy = CAMERA_MATRIX[1, 1]
+    cx, cy = CAMERA_MATRIX[0, 2], CAMERA_MATRIX[1, 2]
+    # Box bottom where the ground 10 m straight ahead projects
+    bottom = cy + fy * SENSOR_HEIGHT / 10.0
+    boxes = [{'bbox': [cx - 5, bottom - 50, cx + 5, bottom], 'object': "Pedestrian", 'conf': 0.5,
+              'distance_val': None},
+             {'bbox': [cx - 5, 0, cx + 5, cy - 10], 'object': "Pedestrian", 'conf': 0.5, 'distance_val': None}]
+    positions = detection_positions(boxes)
+    offset = OBJECT_DIMENSIONS["Pedestrian"][0] / 2
+    np.testing.assert_allclose(positions[0], [10.0 + offset, 0.0], atol=1e-6)
+    assert np.isnan(positions[1]).all()
+
+
+def test_matched_detections_merge():
+    pedestrian = np.array([[15.0, 5.0]])
+    car = np.array([[20.0, -4.0]])
+    only_b = np.array([[35.0, 5.0]])
+    detections = {
+        "CarA": [detection(SCENE, "CarA", pedestrian, conf=0.9), detection(SCENE, "CarA", car, "Car", 0.6)],
+        "CarB": [detection(SCENE, "CarB", pedestrian + [0.4, 0.0], conf=0.3),
+                 detection(SCENE, "CarB", car + [0.5, 0.5], "Car", 0.6),
+                 detection(SCENE, "CarB", only_b, conf=0.7)],
+    }
+    fused = fuse_detections(SCENE, detections)
+    assert len(fused['xy']) == 3
+    order = np.argsort(fused['xy'][:, 0])
+    xy, classes, seen_by = fused['xy'][order], fused['object'][order], fused['seen_by'][order]
+    # Merged positions are confidence-weighted
+    np.testing.assert_allclose(xy[0], pedestrian[0] + [0.1, 0.0], atol=1e-6)
+    np.testing.assert_allclose(xy[1], car[0] + [0.25, 0.25], atol=1e-6)
+    np.testing.assert_allclose(xy[2], only_b[0], atol=1e-6)
+    assert list(classes) == ["Pedestrian", "Car", "Pedestrian"]
+    assert seen_by.tolist() == [[True, True], [True, True], [False, True]]
+
+
+def test_different_classes_and_far_detections_stay_apart():
+    detections = {
+        "CarA": [detection(SCENE, "CarA", [[15.0, 5.0]], "Pedestrian"),
+                 detection(SCENE, "CarA", [[25.0, -8.0]], "Pedestrian")],
+        "CarB": [detection(SCENE, "CarB", [[15.0, 5.5]], "Car"),
+                 detection(SCENE, "CarB", [[25.0, -6.0]], "Pedestrian")],
+    }
+    assert len(fuse_scene(SCENE, detections)) == 4
+
+
+def test_other_car_is_not_an_object():
+    detections = {"CarA": [detection(SCENE, "CarA", [[30.5, 20.0]], "Car")], "CarB": []}
+    assert fuse_scene(SCENE, detections) == []
+
+
+def test_output_schema():
+    objects = fuse_scene(SCENE, {"CarA": [detection(SCENE, "CarA", [[12.0, 2.0]], "Car")], "CarB": []})
+    assert objects == [{"object": "Car", "Location": objects[0]["Location"], "Rotation": 0.0,
+                        "Dimension": OBJECT_DIMENSIONS["Car"], "confidence": 0.9}]
+    np.testing.assert_allclose(objects[0]["Location"], [12.0, 2.0], atol=1e-6)
+    assert fuse_scene(SCENE, {}) == []
+
+
+def test_mutual_nearest_matches_is_greedy():
+    rng = np.random.default_rng(0)
+    cost = rng.uniform(0, 10, (12, 9))
+    cost[cost > 7] = np.inf
+
+    expected = set()
+    remaining = cost.copy()
+    while np.isfinite(remaining).any():
+        row, col = np.unravel_index(np.argmin(remaining), remaining.shape)
+        expected.add((int(row), int(col)))
+        remaining[row, :] = np.inf
+        remaining[:, col] = np.inf
+    assert set(map(tuple, mutual_nearest_matches(cost.copy()).tolist())) == expected
+
+
+def test_merge_cars_carries_indices_and_weights():
+    xy_a = np.array([[0.0, 0.0], [10.0, 0.0]])
+    xy_b = np.array([[20.0, 0.0], [1.0, 0.0]])
+    classes = np.array(["Car", "Car"], dtype=object)
+    merged = merge_cars(xy_a, xy_b, classes, classes, np.array([3.0, 2.0]), np.array([5.0, 1.0]))
+    np.testing.assert_allclose(merged['xy'], [[0.25, 0.0], [10.0, 0.0], [20.0, 0.0]])
+    assert merged['index'].tolist() == [[0, 1], [1, -1], [-1, 0]]
+    assert merged['seen_by'].tolist() == [[True, True], [True, False], [False, True]]
+    np.testing.assert_array_equal(merged['weights'], [[3.0, 1.0], [2.0, 0.0], [0.0, 5.0]])
+    assert list(heavier_view(merged, ["a0", "a1"], ["b0", "b1"])) == ["a0", "a1", "b0"]
+
+    empty = merge_cars(np.zeros((0, 2)), np.zeros((0, 2)), np.zeros(0, dtype=object), np.zeros(0, dtype=object),
+                       np.zeros(0), np.zeros(0))
+    assert empty['xy'].shape == (0, 2) and empty['seen_by'].shape == (0, 2)
+    assert len(heavier_view(empty, [], [])) == 0
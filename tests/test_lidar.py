@@ -0,0 +1,78 @@
+import glob
+import os
+import numpy as np
+import pytest
+from fusion.lidar import load_point_cloud, parse_ply, sidecar_path
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "data")
+
+
+def naive_parse(path):
+    # Line-by-line reference parser for ASCII PLY files with float properties
+    with open(path) as f:
+        names = []
+        count = 0
+        for line in f:
+            tokens = line.split()
+            if tokens[:2] == ['element', 'vertex']:
+                count = int(tokens[2])
+            elif tokens[0] == 'property':
+                names.append(tokens[2])
+            elif tokens[0] == 'end_header':
+                break
+        rows = [[float(value) for value in next(f).split()] for _ in range(count)]
+    return names, np.array(rows, dtype=np.float32)
+
+
+def write_binary_ply(path, points, fmt):
+    header = (f"ply\nformat {fmt} 1.0\ncomment test\nelement vertex {len(points)}\n"
+              "property float x\nproperty float y\nproperty float z\nproperty uchar I\nend_header\n")
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(points.tobytes())
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(DATA_DIR, "Lidar*", "*.ply")))[:4])
+def test_ascii_matches_naive_parser(path):
+    names, expected = naive_parse(path)
+    points = parse_ply(path)
+    assert points.dtype.names == tuple(names)
+    assert len(points) == len(expected)
+    for i, name in enumerate(names):
+        np.testing.assert_array_equal(points[name], expected[:, i])
+
+
+@pytest.mark.parametrize("fmt,byte_order", [("binary_little_endian", "<"), ("binary_big_endian", ">")])
+def test_binary(tmp_path, fmt, byte_order):
+    dtype = np.dtype([('x', byte_order + 'f4'), ('y', byte_order + 'f4'), ('z', byte_order + 'f4'), ('I', 'u1')])
+    expected = np.zeros(5, dtype=dtype)
+    for name in ('x', 'y', 'z'):
+        expected[name] = np.arange(5) * 1.5 - 2
+    expected['I'] = np.arange(5) * 40
+    path = tmp_path / "sweep.ply"
+    write_binary_ply(path, expected, fmt)
+
+    points = parse_ply(path)
+    assert points.dtype.isnative
+    for name in dtype.names:
+        np.testing.assert_array_equal(points[name], expected[name])
+
+
+def test_truncated_ascii_body(tmp_path):
+    path = tmp_path / "short.ply"
+    path.write_text("ply\nformat ascii 1.0\nelement vertex 3\nproperty float x\nproperty float y\nend_header\n"
+                    "1 2\n3 4\n")
+    with pytest.raises(ValueError):
+        parse_ply(path)
+
+
+def test_sidecar_cache(tmp_path):
+    path = tmp_path / "sweep.ply"
+    path.write_text("ply\nformat ascii 1.0\nelement vertex 2\nproperty float x\nproperty float y\n"
+                    "property float z\nend_header\n1 2 3\n4 5 6\n")
+    first = load_point_cloud(str(path))
+    assert os.path.exists(sidecar_path(str(path)))
+    second = load_point_cloud(str(path))
+    assert isinstance(second, np.memmap)
+    np.testing.assert_array_equal(first, second)
+    np.testing.assert_array_equal(second['z'], [3, 6])
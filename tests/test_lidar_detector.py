@@ -0,0 +1,92 @@
+import numpy as np
+from fusion.fuse import SENSOR_HEIGHT
+from fusion.lidar_detector import (HEADING_STEPS, detect_objects, fit_ground_plane, fit_oriented_boxes,
+                                   normalize_rotation)
+
+
+def box_points(rng, center, size, heading, height, count):
+    # Points filling an oriented box standing on the road, in the sensor frame
+    local = rng.uniform(-0.5, 0.5, (count, 2)) * size
+    cos, sin = np.cos(heading), np.sin(heading)
+    xy = np.column_stack([local[:, 0] * cos - local[:, 1] * sin, local[:, 0] * sin + local[:, 1] * cos]) + center
+    z = rng.uniform(0.0, height, count) - SENSOR_HEIGHT
+    return np.column_stack([xy, z])
+
+
+def synthetic_sweep(seed=0):
+    rng = np.random.default_rng(seed)
+    ground = np.column_stack([rng.uniform(-40, 40, (6000, 2)), rng.normal(-SENSOR_HEIGHT, 0.02, 6000)])
+    car = box_points(rng, [15.0, 5.0], [4.8, 2.1], np.radians(30), 1.5, 600)
+    pedestrian = box_points(rng, [10.0, -6.0], [0.4, 0.4], 0.0, 1.7, 80)
+    # A canopy that does not reach down to the road
+    canopy = box_points(rng, [-12.0, 8.0], [3.0, 3.0], 0.0, 0.5, 200) + [0.0, 0.0, 2.5]
+    coords = np.concatenate([ground, car, pedestrian, canopy]).astype(np.float32)
+    points = np.zeros(len(coords), dtype=[('x', 'f4'), ('y', 'f4'), ('z', 'f4'), ('I', 'f4')])
+    points['x'], points['y'], points['z'] = coords.T
+    return points
+
+
+def test_ground_plane():
+    rng = np.random.default_rng(1)
+    xy = rng.uniform(-30, 30, (5000, 2))
+    # Road rising 2% along x below the sensor, plus a wall
+    road = np.column_stack([xy, 0.02 * xy[:, 0] - SENSOR_HEIGHT + rng.normal(0, 0.01, 5000)])
+    wall = np.column_stack([np.full(1500, 12.0), rng.uniform(-30, 30, 1500), rng.uniform(-1.7, 3.0, 1500)])
+    normal, offset = fit_ground_plane(np.concatenate([road, wall]))
+    heights = road @ normal + offset
+    assert np.abs(heights).max() < 0.1
+    assert normal[2] > 0.99
+
+
+def test_oriented_box_fit():
+    rng = np.random.default_rng(2)
+    step = 90.0 / HEADING_STEPS
+    first = box_points(rng, [5.0, 2.0], [4.0, 1.6], np.radians(2 * step), 1.0, 400)[:, :2]
+    second = box_points(rng, [-8.0, 3.0], [0.5, 2.5], 0.0, 1.0, 200)[:, :2]
+    labels = np.repeat([0, 1], [len(first), len(second)])
+    centers, sizes, headings = fit_oriented_boxes(np.concatenate([first, second]), labels, 2)
+    np.testing.assert_allclose(centers, [[5.0, 2.0], [-8.0, 3.0]], atol=0.1)
+    np.testing.assert_allclose(sizes, [[4.0, 1.6], [2.5, 0.5]], atol=0.15)
+    np.testing.assert_allclose(normalize_rotation(np.degrees(headings)), [2 * step, 90.0], atol=1e-6)
+
+
+def test_detects_car_and_pedestrian():
+    detected = detect_objects(synthetic_sweep())
+    assert sorted(detected['object']) == ["Car", "Pedestrian"]
+    car = list(detected['object']).index("Car")
+    pedestrian = list(detected['object']).index("Pedestrian")
+    np.testing.assert_allclose(detected['xy'][car], [15.0, 5.0], atol=0.3)
+    np.testing.assert_allclose(detected['xy'][pedestrian], [10.0, -6.0], atol=0.3)
+    assert abs(normalize_rotation(np.degrees(detected['heading'][car])) - 30.0) <= 90.0 / HEADING_STEPS
+    assert detected['height'][car] > 1.3
+
+
+def test_empty_sweep():
+    points = np.zeros(0, dtype=[('x', 'f4'), ('y', 'f4'), ('z', 'f4')])
+    detected = detect_objects(points)
+    assert len(detected['xy']) == 0 and len(detected['object']) == 0
+
+
+def test_normalize_rotation():
+    np.testing.assert_allclose(normalize_rotation([0.0, 90.0, -90.0, 135.0, 270.0, -180.0]),
+                               [0.0, 90.0, 90.0, -45.0, 90.0, 0.0])
+
+
+def test_flat_sweep():
+    # At least half the returns at the lowest height used to leave no RANSAC seeds
+    points = np.zeros(100, dtype=[('x', 'f4'), ('y', 'f4'), ('z', 'f4')])
+    points['x'] = np.linspace(4.0, 30.0, 100)
+    points['z'] = -SENSOR_HEIGHT
+    assert len(detect_objects(points)['object']) == 0
+
+    normal, offset = fit_ground_plane(np.column_stack([np.linspace(4.0, 30.0, 10), np.zeros(10), np.full(10, -1.7)]))
+    np.testing.assert_allclose(normal, [0.0, 0.0, 1.0], atol=1e-6)
+    np.testing.assert_allclose(offset, SENSOR_HEIGHT, atol=1e-6)
+
+
+def test_search_regions():
+    # Only the region around the pedestrian is searched; the car is skipped
+    detected = detect_objects(synthetic_sweep(), regions=([[10.0, -6.0]], [2.0]))
+    assert list(detected['object']) == ["Pedestrian"]
+    np.testing.assert_allclose(detected['xy'][0], [10.0, -6.0], atol=0.3)
+    assert len(detect_objects(synthetic_sweep(), regions=(np.zeros((0, 2)), []))['object']) == 0
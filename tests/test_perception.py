@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+from fusion.perception import box_means, find_hub_checkout, hub_load  # noqa: E402
+
+
+def sliced_means(depth_map, boxes, frame_size=None):
+    # The per-box ROI slice and mean that box_means replaces
+    height, width = depth_map.shape[:2]
+    scale_x, scale_y = (1.0, 1.0) if frame_size is None else (width / frame_size[0], height / frame_size[1])
+    means = []
+    for xmin, ymin, xmax, ymax in boxes:
+        roi = depth_map[int(ymin * scale_y):max(int(ymin * scale_y) + 1, int(ymax * scale_y)),
+                        int(xmin * scale_x):max(int(xmin * scale_x) + 1, int(xmax * scale_x))]
+        means.append(np.mean(roi) if roi.size else np.nan)
+    return np.array(means)
+
+
+@pytest.mark.parametrize("frame_size", [None, (1920, 1080)])
+def test_box_means_match_slicing(frame_size):
+    rng = np.random.default_rng(0)
+    depth_map = rng.uniform(0, 50, (144, 256)).astype(np.float32)
+    width, height = frame_size or (256, 144)
+    corners = rng.uniform(0, [width, height], (200, 2))
+    boxes = np.column_stack([corners, corners + rng.uniform(0, [width / 3, height / 3], (200, 2))])
+    # Degenerate and edge boxes: zero size, a sliver, the whole frame
+    boxes = np.concatenate([boxes, [[10, 10, 10, 10], [5.5, 7.2, 5.9, 60.0], [0, 0, width, height]]])
+    np.testing.assert_allclose(box_means(depth_map, boxes, frame_size), sliced_means(depth_map, boxes, frame_size),
+                               rtol=1e-5)
+
+
+def test_box_means_outside_map_is_nan():
+    depth_map = np.ones((10, 20), dtype=np.float32)
+    means = box_means(depth_map, [[25, 2, 30, 5], [2, 12, 4, 15], [0, 0, 4, 4]])
+    assert np.isnan(means[:2]).all()
+    assert means[2] == 1.0
+    assert box_means(depth_map, np.zeros((0, 4))).shape == (0,)
+
+
+def test_box_means_read_only_map():
+    # Read-only maps reuse a memoized summed-area table
+    depth_map = np.arange(12, dtype=np.float32).reshape(3, 4)
+    depth_map.flags.writeable = False
+    boxes = [[0, 0, 2, 2], [1, 1, 4, 3]]
+    first = box_means(depth_map, boxes)
+    np.testing.assert_allclose(first, sliced_means(depth_map, boxes))
+    np.testing.assert_array_equal(box_means(depth_map, boxes), first)
+
+
+def write_checkout(weights_dir, name, value):
+    checkout = weights_dir / name
+    checkout.mkdir(parents=True)
+    (checkout / "hubconf.py").write_text(f"def tiny(**kwargs):\n    return {value!r}, kwargs\n")
+
+
+def test_hub_load_uses_pinned_checkout(tmp_path):
+    write_checkout(tmp_path, "owner_repo_v1.0", "old")
+    write_checkout(tmp_path, "owner_repo_v2.0", "pinned")
+    write_checkout(tmp_path, "owner_repo_master", "branch")
+    assert find_hub_checkout(str(tmp_path), "owner/repo:v2.0") == str(tmp_path / "owner_repo_v2.0")
+    assert find_hub_checkout(str(tmp_path), "owner/repo:v3.0") is None
+
+    previous_dir = torch.hub.get_dir()
+    assert hub_load("owner/repo:v2.0", "tiny", str(tmp_path), offline=True, size=1) == ("pinned", {'size': 1})
+    assert torch.hub.get_dir() == previous_dir
+
+
+def test_hub_load_offline_lists_other_checkouts(tmp_path):
+    write_checkout(tmp_path, "owner_repo_v1.0", "old")
+    previous_dir = torch.hub.get_dir()
+    with pytest.raises(FileNotFoundError, match="owner_repo_v1.0"):
+        hub_load("owner/repo:v2.0", "tiny", str(tmp_path), offline=True)
+    assert torch.hub.get_dir() == previous_dir
@@ -0,0 +1,115 @@
+import os
+import time
+import threading
+import pytest
+from fusion.pipeline import Prefetcher, prefetch, scene_input_stream, stage
+from fusion.scene import scan_scene_files, scene_name
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "data")
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def counting(count, produced, closed=None):
+    try:
+        for i in range(count):
+            produced.append(i)
+            yield i
+    finally:
+        if closed is not None:
+            closed.set()
+
+
+@pytest.mark.parametrize("depth", [1, 3])
+def test_prefetch_runs_at_most_depth_ahead(depth):
+    produced = []
+    items = prefetch(counting(100, produced), depth)
+    assert next(items) == 0
+    # depth items wait in the queue and one more in the blocked put
+    wait_until(lambda: len(produced) == depth + 2)
+    time.sleep(0.05)
+    assert len(produced) == depth + 2
+    assert next(items) == 1
+    wait_until(lambda: len(produced) == depth + 3)
+    items.close()
+
+
+def test_prefetch_keeps_order():
+    assert list(prefetch(iter(range(50)), 2)) == list(range(50))
+    assert list(prefetch(prefetch(iter(range(50)), 1), 3)) == list(range(50))
+    # Depth 0 iterates inline
+    assert list(prefetch(iter(range(5)), 0)) == list(range(5))
+
+
+def test_producer_errors_reach_the_consumer():
+    def failing():
+        yield 1
+        yield 2
+        raise OSError("truncated sweep")
+
+    items = prefetch(failing(), 2)
+    seen = []
+    with pytest.raises(OSError, match="truncated sweep"):
+        for item in items:
+            seen.append(item)
+    # Items produced before the error are all delivered first
+    assert seen == [1, 2]
+
+
+def test_closing_the_consumer_stops_the_producer():
+    produced, closed = [], threading.Event()
+    items = prefetch(counting(1000, produced, closed), 2)
+    next(items)
+    items.close()
+    assert closed.wait(5.0)
+    assert len(produced) < 1000
+
+
+def test_stage_passes_failures_along():
+    def parse(value):
+        if value == "bad":
+            raise ValueError(value)
+        return value.upper()
+
+    items = [("a", "a", None), ("b", "bad", None), ("c", None, KeyError("c")), ("d", "d", None)]
+    results = list(stage(parse, items))
+    assert [(path, value) for path, value, _ in results] == [("a", "A"), ("b", None), ("c", None), ("d", "D")]
+    assert [type(error) for _, _, error in results] == [type(None), ValueError, KeyError, type(None)]
+
+
+def test_scene_input_stream_order():
+    scene_files = scan_scene_files(os.path.join(DATA_DIR, "input"))[:4]
+    missing = os.path.join(DATA_DIR, "input", "scene_missing.json")
+    stream = list(scene_input_stream(scene_files[:2] + [missing] + scene_files[2:], DATA_DIR, use_camera=False))
+    assert [scene_name(path) for path, _, _ in stream] == [
+        "scene_001", "scene_002", "scene_missing", "scene_003", "scene_004"]
+    assert [error is None for _, _, error in stream] == [True, True, False, True, True]
+    assert all(inputs['sweeps'] is not None for _, inputs, error in stream if error is None)
+
+
+def test_prefetcher_keeps_the_newest_loads():
+    release = threading.Event()
+    prefetcher = Prefetcher(depth=2)
+    try:
+        calls = []
+
+        def load(key):
+            release.wait(5.0)
+            calls.append(key)
+            return key * 10
+
+        for key in (1, 2, 3):
+            prefetcher.submit(key, load, key)
+        assert list(prefetcher.futures) == [2, 3]
+        release.set()
+        assert prefetcher.get(3, load, 3) == 30
+        # Dropped loads are computed inline
+        assert prefetcher.get(1, load, 1) == 10
+        assert calls.count(3) == 1
+    finally:
+        prefetcher.shutdown()
@@ -0,0 +1,66 @@
+import numpy as np
+from fusion.projection import CAMERA_MATRIX, FOCAL_LENGTH, IMAGE_CELL_SIZE, LidarProjection, image_coords
+from fusion.spatial import SpatialIndex
+
+
+def sweep(coords):
+    coords = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+    points = np.zeros(len(coords), dtype=[('x', 'f4'), ('y', 'f4'), ('z', 'f4')])
+    points['x'], points['y'], points['z'] = coords.T
+    return points
+
+
+def projection(pixels):
+    # (u, v, range) rows straight into the image-plane index
+    index = SpatialIndex(np.asarray(pixels, dtype=np.float32).reshape(-1, 3), cell_size=IMAGE_CELL_SIZE)
+    return LidarProjection(index)
+
+
+def test_image_coords():
+    coords = image_coords(sweep([
+        [10.0, 1.0, 0.5],
+        [20.0, -2.0, -1.0],
+        # Behind the camera, closer than MIN_DEPTH, and outside the frame
+        [-10.0, 0.0, 0.0],
+        [0.3, 0.0, 0.0],
+        [5.0, 10.0, 0.0],
+    ]))
+    cx, cy = CAMERA_MATRIX[0, 2], CAMERA_MATRIX[1, 2]
+    expected = [
+        [cx + FOCAL_LENGTH * 0.1, cy - FOCAL_LENGTH * 0.05, np.hypot(10.0, 1.0)],
+        [cx - FOCAL_LENGTH * 0.1, cy + FOCAL_LENGTH * 0.05, np.hypot(20.0, 2.0)],
+    ]
+    np.testing.assert_allclose(coords, expected, rtol=1e-5)
+
+
+def test_box_distances_take_the_nearest_cluster():
+    lidar = projection([
+        # A person 10 m away with a wall behind it inside the same box
+        [100, 100, 10.0], [110, 120, 10.4], [120, 140, 10.2], [105, 150, 25.0], [115, 130, 25.3],
+        # Two returns in the second box: the median is their mean
+        [500, 500, 7.0], [510, 510, 7.6],
+        # Outside every box
+        [900, 900, 3.0],
+    ])
+    boxes = [[90, 90, 130, 160], [490, 490, 520, 520], [1000, 100, 1100, 200]]
+    distances = lidar.box_distances(boxes)
+    np.testing.assert_allclose(distances[:2], [10.2, 7.3], rtol=1e-5)
+    # No returns in the last box
+    assert np.isnan(distances[2])
+    assert len(lidar.box_distances(np.zeros((0, 4)))) == 0
+
+
+def test_boxes_without_points():
+    lidar = LidarProjection.from_points(sweep(np.zeros((0, 3))))
+    assert len(lidar) == 0
+    assert np.isnan(lidar.box_distances([[0, 0, 100, 100]])).all()
+    assert not lidar.sparse_depth_image().any()
+
+
+def test_sparse_depth_image():
+    lidar = projection([[10.2, 20.7, 8.0], [10.9, 20.1, 6.0], [30.0, 40.0, 12.0]])
+    depth = lidar.sparse_depth_image()
+    assert depth.shape == (1080, 1920)
+    # Nearest return per pixel, zero elsewhere
+    assert depth[20, 10] == 6.0 and depth[40, 30] == 12.0
+    assert np.count_nonzero(depth) == 2
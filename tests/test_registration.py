@@ -0,0 +1,113 @@
+import glob
+import json
+import os
+import numpy as np
+import pytest
+from fusion.registration import (ICP_METHODS, PoseRefiner, apply_transform, corrected_scene, icp, rigid_transform,
+                                 transform_parameters, voxel_downsample)
+from fusion.spatial import SpatialIndex
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "data")
+SCENE_FILES = sorted(glob.glob(os.path.join(DATA_DIR, "input", "scene_*.json")))
+# Pose error injected into CarB: metres along world x and y, degrees
+OFFSET = (1.0, -0.8, 2.0)
+
+
+def perturbed(scene_data, offset=OFFSET):
+    scene_data = dict(scene_data)
+    x, y = scene_data["CarB_Location"][:2]
+    scene_data["CarB_Location"] = [x + offset[0], y + offset[1]]
+    scene_data["CarB_Rotation"] = scene_data["CarB_Rotation"] + offset[2]
+    return scene_data
+
+
+def synthetic_target(seed=0):
+    # Two walls at an angle and a few poles, as returns above the road
+    rng = np.random.default_rng(seed)
+    wall_a = np.column_stack([rng.uniform(-20, 20, 1500), np.full(1500, 8.0)])
+    wall_b = np.column_stack([np.full(1000, -15.0), rng.uniform(-10, 8, 1000)])
+    poles = np.repeat(rng.uniform(-12, 12, (12, 2)), 20, axis=0) + rng.normal(0, 0.05, (240, 2))
+    xy = np.concatenate([wall_a, wall_b, poles])
+    return np.column_stack([xy, rng.uniform(0.5, 3.0, len(xy))]).astype(np.float32)
+
+
+def test_transform_parameters_round_trip():
+    transform = rigid_transform(1.5, -2.0, 30.0)
+    np.testing.assert_allclose(transform_parameters(transform), (1.5, -2.0, 30.0))
+    np.testing.assert_allclose(transform_parameters(np.linalg.inv(transform) @ transform), (0.0, 0.0, 0.0),
+                               atol=1e-12)
+
+
+def test_voxel_downsample_averages_voxels():
+    points = np.array([[0.1, 0.1, 0.2], [0.2, 0.2, 0.4], [1.0, 1.0, 0.3]], dtype=np.float32)
+    reduced = voxel_downsample(points, voxel_size=0.5, voxel_height=1.0)
+    np.testing.assert_allclose(sorted(map(tuple, reduced)), [(0.15, 0.15, 0.3), (1.0, 1.0, 0.3)], atol=1e-6)
+
+
+@pytest.mark.parametrize("method", ICP_METHODS)
+def test_icp_recovers_synthetic_offset(method):
+    target = synthetic_target()
+    truth = rigid_transform(*OFFSET)
+    rng = np.random.default_rng(1)
+    source = apply_transform(np.linalg.inv(truth), target[rng.permutation(len(target))[:2000]])
+    source[:, :2] += rng.normal(0, 0.02, (len(source), 2))
+
+    fit = icp(source, SpatialIndex(target, cell_size=0.5), method=method)
+    np.testing.assert_allclose(transform_parameters(fit['transform']), OFFSET, atol=0.05)
+    assert fit['fitness'] > 0.9
+
+
+@pytest.mark.parametrize("method", ICP_METHODS)
+def test_pose_refiner_recovers_injected_offset(method):
+    refiner = PoseRefiner(method)
+    for i, scene_path in enumerate(SCENE_FILES[:3]):
+        with open(scene_path) as f:
+            scene_data = json.load(f)
+        registration = refiner.register(perturbed(scene_data), DATA_DIR)
+        assert registration['accepted']
+        assert registration['warm_start'] == (i > 0)
+        dx, dy, dyaw = registration['correction']
+        np.testing.assert_allclose((dx, dy), (-OFFSET[0], -OFFSET[1]), atol=0.1)
+        assert abs(dyaw + OFFSET[2]) < 0.1
+
+        corrected = corrected_scene(perturbed(scene_data), registration)
+        np.testing.assert_allclose(corrected["CarB_Location"], scene_data["CarB_Location"][:2], atol=0.1)
+        assert abs(corrected["CarB_Rotation"] - scene_data["CarB_Rotation"]) < 0.1
+        assert corrected["CarA_Location"] == scene_data["CarA_Location"]
+
+
+def test_pose_refiner_rejects_poor_fits():
+    with open(SCENE_FILES[0]) as f:
+        scene_data = perturbed(json.load(f))
+    refiner = PoseRefiner(min_fitness=1.1)
+    registration = refiner.register(scene_data, DATA_DIR)
+    assert not registration['accepted']
+    assert registration['correction'] == (0.0, 0.0, 0.0)
+    assert corrected_scene(scene_data, registration)["CarB_Location"] == scene_data["CarB_Location"]
+    # A rejected fit is not used as the next warm start
+    assert not refiner.register(scene_data, DATA_DIR)['warm_start']
+
+
+def test_target_normals_are_computed_once_per_sweep(monkeypatch):
+    import fusion.registration as registration
+    calls = []
+    original = registration.bev_normals
+
+    def counting_normals(index, *args):
+        calls.append(index)
+        return original(index, *args)
+
+    monkeypatch.setattr(registration, "bev_normals", counting_normals)
+    with open(SCENE_FILES[0]) as f:
+        scene_data = perturbed(json.load(f))
+    # A voxel size no other test uses, so the target index is built here
+    fits = [PoseRefiner(voxel_size=0.35).register(scene_data, DATA_DIR) for _ in range(2)]
+    assert len(calls) == 1
+    assert fits[0] == fits[1]
+    PoseRefiner("point_to_point", voxel_size=0.35).register(scene_data, DATA_DIR)
+    assert len(calls) == 1
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        PoseRefiner("point_to_line")
@@ -0,0 +1,92 @@
+import os
+import numpy as np
+import pytest
+from fusion.spatial import SpatialIndex, load_cloud_index
+
+
+@pytest.fixture
+def cloud():
+    rng = np.random.default_rng(0)
+    return rng.uniform([-40, -30, -2], [40, 30, 3], (3000, 3)).astype(np.float32)
+
+
+def as_sets(groups):
+    return [set(group.tolist()) for group in groups]
+
+
+def test_range_matches_brute_force(cloud):
+    index = SpatialIndex(cloud, cell_size=2.0)
+    rng = np.random.default_rng(1)
+    mins = rng.uniform([-50, -40, -3], [30, 20, 1], (40, 3)).astype(np.float32)
+    maxs = mins + rng.uniform(0.5, 15, (40, 3)).astype(np.float32)
+
+    expected = [set(np.flatnonzero(np.all((cloud >= lo) & (cloud <= hi), axis=1)).tolist())
+                for lo, hi in zip(mins, maxs)]
+    assert as_sets(index.query_range(mins, maxs)) == expected
+    # 2D boxes only bound x/y
+    expected_2d = [set(np.flatnonzero(np.all((cloud[:, :2] >= lo) & (cloud[:, :2] <= hi), axis=1)).tolist())
+                   for lo, hi in zip(mins[:, :2], maxs[:, :2])]
+    assert as_sets(index.query_range(mins[:, :2], maxs[:, :2])) == expected_2d
+
+
+def test_radius_matches_brute_force(cloud):
+    index = SpatialIndex(cloud, cell_size=1.5)
+    rng = np.random.default_rng(2)
+    centers = rng.uniform([-45, -35, -2], [45, 35, 3], (40, 3)).astype(np.float32)
+    radii = rng.uniform(0.5, 6, 40).astype(np.float32)
+
+    offsets = cloud[None, :, :] - centers[:, None, :]
+    inside = np.einsum('qnd,qnd->qn', offsets, offsets) <= radii[:, None] ** 2
+    assert as_sets(index.query_radius(centers, radii)) == [set(np.flatnonzero(row).tolist()) for row in inside]
+
+
+def test_oriented_box_matches_brute_force(cloud):
+    index = SpatialIndex(cloud)
+    rng = np.random.default_rng(3)
+    centers = rng.uniform([-40, -30], [40, 30], (30, 2))
+    sizes = rng.uniform(1, 12, (30, 2))
+    yaws = rng.uniform(-180, 180, 30)
+    z_ranges = np.column_stack([np.full(30, -1.0), np.full(30, 1.5)])
+
+    expected, expected_z = [], []
+    for center, size, yaw, z_range in zip(centers, sizes, yaws, z_ranges):
+        theta = np.radians(yaw)
+        offsets = cloud[:, :2] - center
+        local_x = offsets[:, 0] * np.cos(theta) + offsets[:, 1] * np.sin(theta)
+        local_y = -offsets[:, 0] * np.sin(theta) + offsets[:, 1] * np.cos(theta)
+        inside = (np.abs(local_x) <= size[0] / 2) & (np.abs(local_y) <= size[1] / 2)
+        expected.append(set(np.flatnonzero(inside).tolist()))
+        in_height = (cloud[:, 2] >= z_range[0]) & (cloud[:, 2] <= z_range[1])
+        expected_z.append(set(np.flatnonzero(inside & in_height).tolist()))
+
+    # Points within float32 rounding of a box edge may land either side
+    def differences(found, wanted):
+        return sum(len(a ^ b) for a, b in zip(found, wanted))
+
+    assert differences(as_sets(index.query_oriented_box(centers, sizes, yaws)), expected) <= 1
+    assert differences(as_sets(index.query_oriented_box(centers, sizes, yaws, z_ranges)), expected_z) <= 1
+
+
+def test_queries_outside_and_empty_index(cloud):
+    index = SpatialIndex(cloud)
+    groups = index.query_radius([[500.0, 500.0, 0.0], [0.0, 0.0, 0.0]], 1.0)
+    assert len(groups) == 2 and len(groups[0]) == 0
+
+    empty = SpatialIndex(np.zeros((0, 3), dtype=np.float32))
+    assert [len(group) for group in empty.query_range([[-1, -1], [0, 0]], [[1, 1], [2, 2]])] == [0, 0]
+    assert [len(group) for group in empty.query_radius([[0, 0, 0]], 5.0)] == [0]
+
+
+def test_load_cloud_index_is_cached(tmp_path):
+    path = tmp_path / "sweep.ply"
+    path.write_text("ply\nformat ascii 1.0\nelement vertex 3\nproperty float x\nproperty float y\n"
+                    "property float z\nend_header\n0 0 0\n1 1 1\n5 5 5\n")
+    index = load_cloud_index(str(path))
+    assert load_cloud_index(str(path)) is index
+    assert load_cloud_index(str(path), cell_size=1.0) is not index
+    assert as_sets(index.query_radius([0.5, 0.5, 0.5], 1.0)) == [{0, 1}]
+
+    # A rewritten sweep gets a new index
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    assert load_cloud_index(str(path)) is not index
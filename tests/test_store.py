@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+from fusion.store import ResultStore, npz_memmap, result_rows, run_query
+
+SCENE = {
+    "CarA_Location": [0.0, 0.0, 0.0], "CarA_Rotation": 0.0,
+    "CarB_Location": [30.0, 20.0, 0.0], "CarB_Rotation": -90.0,
+}
+
+
+def result(scene, num_a=2, num_b=1, num_objects=2):
+    def detections(count, offset):
+        return [{'object': "Pedestrian" if i % 2 else "Car", 'bbox': [100 + i, 500, 140 + i, 700 + offset],
+                 'conf': 0.5 + 0.1 * i, 'distance_val': None if i == 1 else 10.0 + i,
+                 'distance_source': None if i == 1 else "lidar"} for i in range(count)]
+    return {
+        'scene': scene,
+        "CarA": {'detections': detections(num_a, 0)},
+        "CarB": {'detections': detections(num_b, 10)},
+        'objects': [{'object': "Car", 'Location': [float(i), 2.0 * i], 'confidence': 0.9 - 0.1 * i}
+                    for i in range(num_objects)],
+    }
+
+
+def test_rows_of_a_result():
+    rows = result_rows(result("scene_001"), SCENE)
+    assert list(rows['car']) == [0, 0, 1, 2, 2]
+    assert list(rows['object']) == ["Car", "Pedestrian", "Car", "Car", "Car"]
+    assert np.isnan(rows['distance'][1]) and rows['distance'][0] == 10.0
+    assert (rows['bbox'][3:] == -1).all()
+    np.testing.assert_array_equal(rows['x'][3:], [0.0, 1.0])
+    np.testing.assert_allclose(rows['confidence'][3:], [0.9, 0.8])
+
+    empty = result_rows(result("scene_002", 0, 0, 0), SCENE)
+    assert all(len(values) == 0 for values in empty.values())
+    assert empty['bbox'].shape == (0, 4)
+
+
+def test_append_flush_read_round_trip(tmp_path):
+    expected = {}
+    with ResultStore(str(tmp_path), run="night-1", chunk_rows=7, flush_interval=np.inf) as store:
+        for i, counts in enumerate([(2, 1, 2), (0, 0, 0), (3, 2, 1), (1, 0, 0), (0, 0, 3)]):
+            scene = f"scene_{i:03d}"
+            expected[scene] = result_rows(result(scene, *counts), SCENE)
+            store.append_result(result(scene, *counts), SCENE)
+    # 5 + 0 + 6 rows reach chunk_rows, the last 1 + 3 are written on close
+    assert len(store.chunk_paths()) == 2
+    assert all(isinstance(array, np.memmap) for name, array in npz_memmap(store.chunk_paths()[0]).items()
+               if name in ('x', 'bbox'))
+
+    rows = ResultStore(str(tmp_path)).read()
+    assert len(rows['x']) == sum(len(r['x']) for r in expected.values())
+    assert set(rows['run']) == {"night-1"}
+    for scene, scene_rows in expected.items():
+        mask = rows['scene'] == scene
+        np.testing.assert_array_equal(rows['x'][mask], scene_rows['x'])
+        np.testing.assert_array_equal(rows['bbox'][mask], scene_rows['bbox'])
+        np.testing.assert_allclose(rows['confidence'][mask], scene_rows['confidence'].astype(np.float32))
+        np.testing.assert_array_equal(rows['object'][mask], scene_rows['object'].astype(str))
+        np.testing.assert_array_equal(rows['car'][mask], np.array(["CarA", "CarB", "fused"])[scene_rows['car']])
+
+
+def test_filters_and_runs(tmp_path):
+    for run in ("night-1", "night-2"):
+        with ResultStore(str(tmp_path), run=run) as store:
+            store.append_result(result("scene_000"), SCENE)
+            store.append_result(result("scene_001", 3, 2, 1), SCENE)
+    store = ResultStore(str(tmp_path))
+    assert len(store.chunk_paths()) == 2
+
+    rows = store.read(columns=['run', 'scene', 'car'], run="night-2", car=["CarA", "CarB"], scene="scene_001")
+    assert set(rows) == {'run', 'scene', 'car'}
+    assert len(rows['car']) == 5 and set(rows['run']) == {"night-2"}
+    peds = store.read(object="Pedestrian", where=lambda chunk: chunk['confidence'] >= 0.6)
+    assert len(peds['x']) == 6 and (peds['confidence'] >= 0.6).all()
+
+    # Values no chunk holds give typed empty columns
+    none = store.read(object="Bicycle")
+    assert len(none['x']) == 0 and none['bbox'].shape == (0, 4) and none['x'].dtype == np.float64
+    assert len(store.read(run="night-3")['scene']) == 0
+
+
+def test_empty_store(tmp_path):
+    store = ResultStore(str(tmp_path / "missing"))
+    assert store.flush() is None
+    store.close()
+    assert store.chunk_paths() == []
+    assert len(store.read()['x']) == 0
+
+
+def test_query_csv(tmp_path, capsys):
+    with ResultStore(str(tmp_path / "store"), run="night-1") as store:
+        store.append_result(result("scene_000", 3, 2, 1), SCENE)
+    csv_path = tmp_path / "rows.csv"
+    rows = run_query(ResultStore(str(tmp_path / "store")), car="CarA", min_confidence=0.6, max_distance=20.0,
+                     csv_path=str(csv_path))
+    # The NaN distance of the second detection fails max_distance
+    assert len(rows['x']) == 1
+    lines = csv_path.read_text().splitlines()
+    assert lines[0].startswith("run,scene,car,object") and len(lines) == 2
+    assert "1 rows" in capsys.readouterr().out
+
+
+def test_compressed_chunks_are_rejected(tmp_path):
+    path = tmp_path / "chunk.npz"
+    np.savez_compressed(path, x=np.arange(10.0))
+    with pytest.raises(ValueError):
+        npz_memmap(str(path))
+
+
+def test_fused_confidence_reaches_queries(tmp_path):
+    scene = result("scene_000", 0, 0, 3)
+    # A coasted track has no confidence
+    scene['objects'].append({'object': "Car", 'Location': [9.0, 9.0], 'predicted': True})
+    with ResultStore(str(tmp_path), run="night-1") as store:
+        store.append_result(scene, SCENE)
+    rows = run_query(ResultStore(str(tmp_path)), car="fused", min_confidence=0.75)
+    np.testing.assert_allclose(rows['confidence'], [0.9, 0.8])
+
+
+def test_scenes_flushed_after_interval(tmp_path):
+    store = ResultStore(str(tmp_path), run="night-1", flush_interval=0.0)
+    store.append_result(result("scene_000"), SCENE)
+    store.append_result(result("scene_001"), SCENE)
+    # Without close(), as after a crash, both scenes are already on disk
+    assert len(store.chunk_paths()) == 2
+    assert set(ResultStore(str(tmp_path)).read()['scene']) == {"scene_000", "scene_001"}
@@ -0,0 +1,105 @@
+import numpy as np
+from fusion.tracking import MAX_MISSES, Tracker
+
+
+def agent(name, x, y):
+    return {"object": name, "Location": [x, y], "Rotation": 0.0, "Dimension": [1.0, 1.0, 1.0]}
+
+
+def ids_by_position(tracked):
+    return {tuple(np.round(o["Location"], 3)): o["track_id"] for o in tracked if not o.get("predicted")}
+
+
+def test_ids_carry_over_moving_objects():
+    tracker = Tracker()
+    first = tracker.update([agent("Car", 0.0, 0.0), agent("Pedestrian", 10.0, 5.0)])
+    car_id, pedestrian_id = first[0]["track_id"], first[1]["track_id"]
+    assert car_id != pedestrian_id
+
+    for step in range(1, 6):
+        # Listed in a different order every scene; the car drives at 2 m/step
+        tracked = tracker.update([agent("Pedestrian", 10.0 + 0.5 * step, 5.0), agent("Car", 2.0 * step, 0.0)])
+        assert [o["track_id"] for o in tracked] == [pedestrian_id, car_id]
+    # The velocity was learnt, so the prediction sits on the next position
+    np.testing.assert_allclose(tracker.state[tracker.ids == car_id, 2:][0], [2.0, 0.0], atol=0.2)
+
+
+def test_neighbouring_objects_keep_their_ids():
+    tracker = Tracker()
+    tracker.update([agent("Pedestrian", 0.0, 0.0), agent("Pedestrian", 0.0, 4.0)])
+    tracked = tracker.update([agent("Pedestrian", 0.5, 0.0), agent("Pedestrian", 0.5, 4.0)])
+    ids = ids_by_position(tracked)
+    tracked = tracker.update([agent("Pedestrian", 1.0, 3.9), agent("Pedestrian", 1.0, 0.1)])
+    assert ids_by_position(tracked) == {(1.0, 0.1): ids[(0.5, 0.0)], (1.0, 3.9): ids[(0.5, 4.0)]}
+
+
+def test_class_and_gate_start_new_tracks():
+    tracker = Tracker()
+    first_id = tracker.update([agent("Car", 0.0, 0.0)])[0]["track_id"]
+    # Same place, other class
+    assert tracker.update([agent("Pedestrian", 0.0, 0.0)])[0]["track_id"] != first_id
+    # Same class, far outside the gate
+    assert tracker.update([agent("Car", 60.0, 0.0)])[0]["track_id"] != first_id
+
+
+def test_coasting_and_dropping():
+    tracker = Tracker(max_coast=1)
+    track_id = tracker.update([agent("Car", 0.0, 0.0)])[0]["track_id"]
+    tracker.update([agent("Car", 1.0, 0.0)])
+    coasted = tracker.update([])
+    assert len(coasted) == 1 and coasted[0]["predicted"] and coasted[0]["track_id"] == track_id
+    assert coasted[0]["Location"][0] > 1.0
+    # Only one scene of coasting; the track is kept until MAX_MISSES and can be picked up again
+    assert tracker.update([]) == []
+    assert tracker.update([agent("Car", 4.0, 0.0)])[0]["track_id"] == track_id
+
+    for _ in range(MAX_MISSES + 1):
+        tracker.update([])
+    assert len(tracker) == 0
+    assert tracker.update([agent("Car", 5.0, 0.0)])[0]["track_id"] != track_id
+
+
+def test_no_coasting_by_default():
+    tracker = Tracker()
+    tracker.update([agent("Car", 0.0, 0.0)])
+    tracker.update([agent("Car", 0.0, 0.0)])
+    assert tracker.update([]) == []
+    assert len(tracker) == 1
+
+
+def test_stable_tracks_are_not_searched():
+    tracker = Tracker(keyframe_interval=3)
+    assert tracker.search_plan() is None
+    for step in range(4):
+        tracker.update([agent("Car", 2.0 * step, 0.0), agent("Pedestrian", 10.0, 5.0)])
+    # The scene after a full search only looks around the predictions
+    plan = tracker.search_plan()
+    assert sorted(plan['skipped']) == sorted(tracker.ids.tolist())
+    assert plan['xy'] == [] and plan['radius'] == []
+
+    # Nothing detected where nothing was searched: the stable tracks are
+    # reported at their prediction and do not count a miss
+    skipped = tracker.update([], plan=plan)
+    assert sorted(o["track_id"] for o in skipped) == sorted(plan['skipped'])
+    assert all(o["predicted"] for o in skipped)
+    car = next(o for o in skipped if o["object"] == "Car")
+    np.testing.assert_allclose(car["Location"], [8.0, 0.0], atol=0.5)
+    assert (tracker.misses == 0).all()
+
+    # Having been skipped, both are searched again, within their gate
+    plan = tracker.search_plan()
+    assert plan['skipped'] == []
+    np.testing.assert_allclose(sorted(plan['xy']), [[10.0, 0.0], [10.0, 5.0]], atol=0.5)
+    tracked = tracker.update([agent("Car", 10.0, 0.0)], plan=plan)
+    assert [o["track_id"] for o in tracked] == [car["track_id"]]
+    # Every third scene is searched in full again
+    assert tracker.search_plan() is None
+
+
+def test_new_tracks_are_searched():
+    tracker = Tracker(keyframe_interval=2)
+    tracker.update([agent("Pedestrian", 0.0, 0.0)])
+    plan = tracker.search_plan()
+    assert plan['skipped'] == []
+    np.testing.assert_allclose(plan['xy'], [[0.0, 0.0]])
+    assert plan['radius'][0] > 1.0
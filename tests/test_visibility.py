@@ -0,0 +1,93 @@
+import numpy as np
+from fusion.bev import rasterize
+from fusion.visibility import (FULLY_OCCLUDED, OUT_OF_RANGE, PARTIALLY_OCCLUDED, VISIBLE, car_visibility,
+                               footprint_corners, recall_by_visibility, segments_hit, summarize_visibility,
+                               visibility_groups)
+
+# CarA at the origin looking along +x, CarB far off to the side
+SCENE = {
+    "CarA_Location": [0.0, 0.0, 0.0], "CarA_Rotation": 0.0,
+    "CarB_Location": [0.0, 60.0, 0.0], "CarB_Rotation": -90.0,
+}
+
+
+def agent(name, x, y, length=1.0, width=1.0, rotation=0.0):
+    return {"object": name, "Location": [x, y], "Rotation": rotation, "Dimension": [length, width, 1.5]}
+
+
+def test_footprint_corners():
+    corners = footprint_corners([[1.0, 2.0]], [[4.0, 2.0]], [90.0])
+    np.testing.assert_allclose(corners[0], [[0.0, 4.0], [0.0, 0.0], [2.0, 0.0], [2.0, 4.0]], atol=1e-9)
+
+
+def test_segments_hit_matches_per_pair_test():
+    rng = np.random.default_rng(0)
+    origin = np.zeros(2)
+    targets = rng.uniform(-10, 10, (50, 2))
+    starts = rng.uniform(-10, 10, (30, 2))
+    ends = rng.uniform(-10, 10, (30, 2))
+
+    def crosses(target, start, end):
+        # Solve origin + t (target - origin) = start + u (end - start)
+        matrix = np.column_stack([target - origin, start - end])
+        if abs(np.linalg.det(matrix)) < 1e-12:
+            return False
+        t, u = np.linalg.solve(matrix, start - origin)
+        return 0 < t < 1 and 0 <= u <= 1
+
+    expected = np.array([[crosses(t, s, e) for s, e in zip(starts, ends)] for t in targets])
+    np.testing.assert_array_equal(segments_hit(origin, targets, starts, ends), expected)
+
+
+def test_agents_hidden_behind_each_other():
+    agents = [
+        agent("Car", 10.0, 0.0, 4.8, 2.2),
+        # Straight behind the car, narrower than it
+        agent("Pedestrian", 20.0, 0.0, 0.4, 0.4),
+        # Half behind the car's edge
+        agent("Pedestrian", 20.0, 2.8, 0.4, 0.4),
+        agent("Pedestrian", 20.0, -5.0, 0.4, 0.4),
+        agent("Pedestrian", 200.0, 0.0, 0.4, 0.4),
+        # Behind the camera
+        agent("Pedestrian", -10.0, 0.0, 0.4, 0.4),
+    ]
+    visibility = car_visibility(SCENE, "CarA", agents)
+    assert list(visibility['label']) == [VISIBLE, FULLY_OCCLUDED, PARTIALLY_OCCLUDED, VISIBLE, OUT_OF_RANGE,
+                                         VISIBLE]
+    assert visibility['fraction'][0] == 1.0 and visibility['fraction'][1] == 0.0
+    assert 0.0 < visibility['fraction'][2] < 1.0
+    assert list(visibility['in_camera_view']) == [True, True, True, True, False, False]
+
+
+def test_partner_car_occludes():
+    agents = [agent("Pedestrian", 0.0, 70.0, 0.4, 0.4)]
+    assert car_visibility(SCENE, "CarA", agents)['label'][0] == FULLY_OCCLUDED
+
+
+def test_lidar_obstacles_occlude():
+    agents = [agent("Pedestrian", 20.0, 0.0, 0.4, 0.4)]
+    # A wall of tall returns, a metre thick, between the car and the pedestrian
+    rng = np.random.default_rng(0)
+    wall = np.column_stack([rng.uniform([9.5, -3.0], [10.5, 3.0], (2000, 2)), np.full(2000, 2.0)])
+    grid = rasterize(wall, resolution=0.2, bounds=(-5.0, -10.0, 30.0, 10.0))
+    assert car_visibility(SCENE, "CarA", agents)['label'][0] == VISIBLE
+    assert car_visibility(SCENE, "CarA", agents, grid)['label'][0] == FULLY_OCCLUDED
+
+
+def test_recall_by_visibility():
+    visibility = {
+        "CarA": {'label': np.array([VISIBLE, VISIBLE, FULLY_OCCLUDED, OUT_OF_RANGE], dtype=object)},
+        "CarB": {'label': np.array([PARTIALLY_OCCLUDED, FULLY_OCCLUDED, VISIBLE, OUT_OF_RANGE], dtype=object)},
+    }
+    assert list(visibility_groups(visibility)) == ["all", "CarA", "CarB", "none"]
+
+    ground_truth = [agent("Car", 0.0, 0.0), agent("Pedestrian", 10.0, 0.0), agent("Pedestrian", 20.0, 0.0),
+                    agent("Car", 30.0, 0.0)]
+    predicted = [agent("Car", 0.5, 0.0), agent("Pedestrian", 20.2, 0.0), agent("Car", 10.0, 0.0)]
+    recalls = recall_by_visibility(predicted, ground_truth, visibility)
+    assert recalls == {"all": {'agents': 1, 'found': 1}, "CarA": {'agents': 1, 'found': 0},
+                       "CarB": {'agents': 1, 'found': 1}, "none": {'agents': 1, 'found': 0}}
+
+    totals = summarize_visibility([recalls, recalls])
+    assert totals["all"] == {'agents': 2, 'found': 2, 'recall': 1.0}
+    assert totals["CarA"]["recall"] == 0.0
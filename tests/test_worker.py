@@ -0,0 +1,85 @@
+import time
+import threading
+import pytest
+from fusion.worker import InferenceWorker
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def worker():
+    worker = InferenceWorker()
+    yield worker
+    worker.shutdown()
+
+
+def blocking_job(started, release, value):
+    def run(job):
+        started.set()
+        release.wait(5.0)
+        return value
+    return run
+
+
+def test_superseded_running_job_is_never_delivered(worker):
+    started, release = threading.Event(), threading.Event()
+    old = worker.submit("scene", blocking_job(started, release, "scene_001"))
+    assert started.wait(5.0)
+    new = worker.submit("scene", lambda job: "scene_002")
+    # The old job runs to completion without checking in, and still is dropped
+    release.set()
+    wait_until(lambda: not worker.is_busy())
+    assert old.cancelled and old.result == "scene_001"
+    assert [job.result for job in worker.poll()] == ["scene_002"]
+    assert new.result == "scene_002"
+    assert worker.poll() == []
+
+
+def test_superseded_queued_job_never_runs(worker):
+    started, release = threading.Event(), threading.Event()
+    ran = []
+    worker.submit("bev", blocking_job(started, release, "bev"))
+    assert started.wait(5.0)
+    worker.submit("scene", lambda job: ran.append("scene_001") or "scene_001")
+    worker.submit("scene", lambda job: ran.append("scene_002") or "scene_002")
+    release.set()
+    wait_until(lambda: not worker.is_busy())
+    assert ran == ["scene_002"]
+    assert sorted(job.result for job in worker.poll()) == ["bev", "scene_002"]
+
+
+def test_cancelled_job_stops_at_its_next_stage(worker):
+    started, release = threading.Event(), threading.Event()
+    stages = []
+
+    def run(job):
+        job.report("depth")
+        stages.append("depth")
+        started.set()
+        release.wait(5.0)
+        job.report("detection")
+        stages.append("detection")
+        return "done"
+
+    job = worker.submit("scene", run)
+    assert started.wait(5.0)
+    worker.cancel("scene")
+    release.set()
+    wait_until(lambda: not worker.is_busy())
+    assert stages == ["depth"] and job.result is None
+    assert worker.poll() == [] and not worker.has_work()
+
+
+def test_errors_are_delivered(worker):
+    def fail(job):
+        raise RuntimeError("no sweep")
+
+    worker.submit("scene", fail)
+    wait_until(lambda: worker.has_work() and not worker.is_busy())
+    finished = worker.poll()
+    assert len(finished) == 1 and isinstance(finished[0].error, RuntimeError)
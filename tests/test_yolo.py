@@ -0,0 +1,64 @@
+import numpy as np
+from fusion.yolo import LETTERBOX_FILL, batched_nms, letterbox, letterbox_shape, unletterbox, yolo_nms
+
+
+def raw_row(box, objectness, class_scores):
+    # One raw YOLOv5 output row: centre x, y, width, height, objectness, class scores
+    x1, y1, x2, y2 = box
+    return [(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1, objectness, *class_scores]
+
+
+def test_letterbox_shape():
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    assert letterbox_shape([frame], 640) == (384, 640)
+    # Frames of other shapes in a batch share the largest extents
+    assert letterbox_shape([frame, np.zeros((640, 480, 3), dtype=np.uint8)], 640) == (640, 640)
+
+
+def test_letterbox_round_trip():
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    frame[400:700, 600:900] = 255
+    padded, gain, pad = letterbox(frame, (640, 640))
+    assert padded.shape == (640, 640, 3)
+    assert gain == 640 / 1920 and pad == (0.0, 140.0)
+    # The border is grey, the frame lands between the borders
+    assert (padded[:140] == LETTERBOX_FILL).all() and (padded[500:] == LETTERBOX_FILL).all()
+    assert padded[140 + 550 * 640 // 1920, 750 * 640 // 1920].tolist() == [255, 255, 255]
+
+    box = np.array([[600.0, 400.0, 900.0, 700.0]])
+    boxed = box * gain + [pad[0], pad[1], pad[0], pad[1]]
+    np.testing.assert_allclose(unletterbox(boxed, gain, pad, frame.shape), box, atol=1e-3)
+    # Boxes reaching into the border are clipped to the frame
+    np.testing.assert_allclose(unletterbox([[-10.0, 100.0, 700.0, 600.0]], gain, pad, frame.shape),
+                               [[0.0, 0.0, 1920.0, 1080.0]])
+
+
+def test_yolo_nms_suppression():
+    prediction = np.array([
+        raw_row([100, 100, 200, 300], 0.9, [0.9, 0.1]),
+        # Same object and class, lower score: suppressed
+        raw_row([105, 100, 205, 300], 0.8, [0.9, 0.1]),
+        # Same place, other class: kept
+        raw_row([100, 100, 200, 300], 0.9, [0.1, 0.7]),
+        # Below the confidence threshold after multiplying by objectness
+        raw_row([400, 400, 450, 450], 0.3, [0.5, 0.1]),
+        # Far away: kept
+        raw_row([600, 100, 650, 200], 0.6, [0.8, 0.0]),
+    ], dtype=np.float32)
+    detections = yolo_nms(prediction)
+    assert detections.shape == (3, 6)
+    np.testing.assert_allclose(detections[:, 4], [0.81, 0.63, 0.48], rtol=1e-5)
+    np.testing.assert_array_equal(detections[:, 5], [0, 1, 0])
+    np.testing.assert_allclose(detections[0, :4], [100, 100, 200, 300])
+    assert len(yolo_nms(prediction, max_detections=2)) == 2
+    assert yolo_nms(np.zeros((0, 7), dtype=np.float32)).shape == (0, 6)
+
+
+def test_batched_nms_threshold():
+    boxes = np.array([[0, 0, 10, 10], [0, 0, 10, 12], [0, 0, 10, 20]], dtype=np.float32)
+    scores = np.array([0.9, 0.8, 0.7])
+    classes = np.zeros(3, dtype=np.int64)
+    # IoU with the best box: 10/12 and 10/20
+    np.testing.assert_array_equal(batched_nms(boxes, scores, classes, 0.5), [0, 2])
+    np.testing.assert_array_equal(batched_nms(boxes, scores, classes, 0.9), [0, 1, 2])
+    np.testing.assert_array_equal(batched_nms(boxes, scores, classes, 0.4), [0])
@@ -7,6 +7,11 @@ class Button:
         self.color = color
         self.hover_color = hover_color
         self.is_hovered = False
+        self.dirty = True
+        
+    @property
+    def bounds(self):
+        return self.rect
         
     def draw(self, surface, font):
         current_color = self.hover_color if self.is_hovered else self.color
@@ -17,7 +22,10 @@ class Button:
         surface.blit(text_surf, text_rect)
     
     def check_hover(self, mouse_pos):
-        self.is_hovered = self.rect.collidepoint(mouse_pos)
+        is_hovered = bool(self.rect.collidepoint(mouse_pos))
+        if is_hovered != self.is_hovered:
+            self.dirty = True
+        self.is_hovered = is_hovered
         return self.is_hovered
     
     def check_click(self, mouse_pos, mouse_click):
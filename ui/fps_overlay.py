@@ -0,0 +1,45 @@
+import time
+
+class FpsOverlay:
+    # Frame rate and time spent in draw(), averaged and refreshed a few times
+    # per second so the overlay text itself does not change every frame
+    def __init__(self, refresh_interval=0.5):
+        self.refresh_interval = refresh_interval
+        self.visible = True
+        self.frames = 0
+        self.draw_time = 0.0
+        self.window_start = time.perf_counter()
+        self.draw_start = None
+        self.text = "FPS --"
+
+    def begin_draw(self):
+        self.draw_start = time.perf_counter()
+
+    def end_draw(self):
+        # Returns True when the overlay text changed and needs repainting
+        now = time.perf_counter()
+        if self.draw_start is not None:
+            self.draw_time += now - self.draw_start
+            self.draw_start = None
+        self.frames += 1
+        elapsed = now - self.window_start
+        if elapsed >= self.refresh_interval:
+            fps = self.frames / elapsed
+            draw_ms = 1000.0 * self.draw_time / self.frames
+            self.text = f"FPS {fps:.1f} | draw {draw_ms:.2f} ms"
+            self.frames = 0
+            self.draw_time = 0.0
+            self.window_start = now
+            return self.visible
+        return False
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def draw(self, surface, font, color=(180, 220, 180)):
+        if not self.visible:
+            return None
+        text = font.render(self.text, True, color)
+        rect = text.get_rect(topright=(surface.get_width() - 20, surface.get_height() - 28))
+        surface.blit(text, rect)
+        return rect
@@ -0,0 +1,69 @@
+import pygame
+
+# SDL2 builds report WINDOWEXPOSED, SDL1 builds VIDEOEXPOSE
+EXPOSE_EVENTS = {pygame.VIDEOEXPOSE, getattr(pygame, 'WINDOWEXPOSED', pygame.VIDEOEXPOSE)}
+
+class RedrawScheduler:
+    # Retained-mode redraw: widgets and views mark rects dirty, the frame is
+    # repainted clipped to those rects and only they are pushed to the display.
+    # With nothing dirty and no background work the loop sleeps on the event queue.
+    def __init__(self, screen, poll_interval_ms=50):
+        self.screen = screen
+        self.poll_interval_ms = poll_interval_ms
+        self.dirty_rects = []
+        self.full_redraw = True
+
+    def mark_dirty(self, rect):
+        if rect is not None and not self.full_redraw:
+            self.dirty_rects.append(pygame.Rect(rect))
+
+    def mark_all(self):
+        self.full_redraw = True
+        self.dirty_rects = []
+
+    def collect(self, widgets):
+        # Widgets set .dirty when their look changes and expose their area as .bounds
+        for widget in widgets:
+            if widget.dirty:
+                self.mark_dirty(widget.bounds)
+                widget.dirty = False
+
+    def is_dirty(self):
+        return self.full_redraw or bool(self.dirty_rects)
+
+    def handle_event(self, event):
+        if event.type in EXPOSE_EVENTS:
+            self.mark_all()
+
+    def events(self, busy=False):
+        # Returns pending events; blocks until input arrives when idle, and
+        # waits at most poll_interval_ms while background work needs polling
+        events = pygame.event.get()
+        if events or self.is_dirty():
+            return events
+        if busy:
+            event = pygame.event.wait(self.poll_interval_ms)
+        else:
+            event = pygame.event.wait()
+        if event.type == pygame.NOEVENT:
+            return []
+        return [event] + pygame.event.get()
+
+    def redraw(self, draw):
+        # Calls draw() clipped to the dirty area and updates only that area.
+        # Returns False when nothing was dirty.
+        if not self.is_dirty():
+            return False
+        if self.full_redraw:
+            self.screen.set_clip(None)
+            draw()
+            pygame.display.flip()
+        else:
+            area = self.dirty_rects[0].unionall(self.dirty_rects[1:])
+            self.screen.set_clip(area)
+            draw()
+            self.screen.set_clip(None)
+            pygame.display.update(self.dirty_rects)
+        self.full_redraw = False
+        self.dirty_rects = []
+        return True
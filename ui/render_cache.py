@@ -0,0 +1,68 @@
+from collections import OrderedDict
+import pygame
+
+class CachedFont:
+    # Drop-in for pygame.font.Font.render that keeps rendered text surfaces,
+    # so Button/Slider/panel labels are only rasterized when the string changes
+    def __init__(self, font, max_entries=256):
+        self.font = font
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+
+    def render(self, text, antialias, color, background=None):
+        key = (text, antialias, tuple(color), None if background is None else tuple(background))
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.font.render(text, antialias, color, background)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.max_entries:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+    def __getattr__(self, name):
+        return getattr(self.font, name)
+
+class RenderCache:
+    # Fonts, text and scaled panel images reused across frames. Scaled images
+    # are keyed by (source surface, size), so they are rebuilt only when a new
+    # surface is shown or the panel geometry changes.
+    def __init__(self, max_scaled=32):
+        self.fonts = {}
+        self.scaled = OrderedDict()
+        self.max_scaled = max_scaled
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, name='Arial', size=16, bold=False):
+        key = (name, size, bold)
+        font = self.fonts.get(key)
+        if font is None:
+            font = CachedFont(pygame.font.SysFont(name, size, bold=bold))
+            self.fonts[key] = font
+        return font
+
+    def scale(self, surface, size):
+        # The entry holds the source surface, so its id cannot be reused while cached
+        key = (id(surface), size)
+        entry = self.scaled.get(key)
+        if entry is not None and entry[0] is surface:
+            self.scaled.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        scaled = pygame.transform.scale(surface, size)
+        self.scaled[key] = (surface, scaled)
+        if len(self.scaled) > self.max_scaled:
+            self.scaled.popitem(last=False)
+        return scaled
+
+    def fit(self, surface, rect):
+        # Largest aspect-preserving scale of surface inside rect, centered
+        img_w, img_h = surface.get_size()
+        scale = min(rect.width / img_w, rect.height / img_h)
+        new_w, new_h = int(img_w * scale), int(img_h * scale)
+        scaled = self.scale(surface, (new_w, new_h))
+        return scaled, (rect.x + (rect.width - new_w) // 2, rect.y + (rect.height - new_h) // 2)
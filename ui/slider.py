@@ -11,6 +11,18 @@ class Slider:
         self.slider_width = 10
         self.slider_color = (100, 200, 100)
         self.track_color = (80, 80, 80)
+        self.label_rect = None
+        self.dirty = True
+    
+    @property
+    def bounds(self):
+        # Track plus the value label drawn above it, with room for the label to grow
+        label_width = self.rect.width
+        label_height = 20
+        if self.label_rect is not None:
+            label_width = max(label_width, self.label_rect.width + 40)
+            label_height = max(label_height, self.label_rect.height)
+        return self.rect.union(pygame.Rect(self.rect.x, self.rect.y - 20, label_width, label_height))
     
     def draw(self, surface, font):
         pygame.draw.rect(surface, self.track_color, self.rect)
@@ -21,9 +33,16 @@ class Slider:
         pygame.draw.rect(surface, self.slider_color, slider_rect)
         
         label_text = font.render(f"{self.label}: {self.value:.2f}", True, (220, 220, 220))
-        surface.blit(label_text, (self.rect.x, self.rect.y - 20))
+        self.label_rect = surface.blit(label_text, (self.rect.x, self.rect.y - 20))
     
     def update(self, mouse_pos, mouse_pressed):
+        previous = (self.value, self.active)
+        changed = self.track(mouse_pos, mouse_pressed)
+        if (self.value, self.active) != previous:
+            self.dirty = True
+        return changed
+    
+    def track(self, mouse_pos, mouse_pressed):
         if mouse_pressed[0]:
             if self.rect.collidepoint(mouse_pos):
                 self.active = True